@@ -1,8 +1,18 @@
-from playwright.sync_api import Playwright, sync_playwright, TimeoutError
+from playwright.async_api import async_playwright
 from sys import argv   # To handle command-line arguments
-import subprocess      # To run shell commands and manage external processes directly from within the Python script
+import asyncio         # To drive the async Playwright API
+import time            # To time batch runs
 import logging         # For logging messages
 
+import anime_daemon    # Client for the warm resolver daemon
+from anime_index import AnimeIndex, LATEST_MAX_AGE   # Show index and short-lived download-link cache
+import anime_pipeline  # Overlapping resolve and download stages
+import gogo            # Shared GOGOAnime navigation steps
+import gogo_http       # Browserless resolver, tried before any browser
+from instrument import METRICS, instrumented   # Run-wide spans, counters and the JSON run report
+import navigation      # Request blocking and per-step wait histograms
+import postprocess     # Verifies, tags and files finished downloads
+
 
 # Configure logging to display messages with timestamps and log levels
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,151 +27,225 @@ def argv_check() -> bool:
         print("Please provide the name of the anime")
         exit(1)   # Non-zero status indicates an error or abnormal termination
     elif len(argv) < 3:   # Check if episode number is provided
-        print("Please provide the episode number")
+        print("Please provide the episode number (or a range such as 1-24, 1,3,5 or latest:5)")
+        exit(1)
+
+    try:
+        if not argv[2].lower().startswith('latest:'):
+            gogo.parse_episodes(argv[2])   # Validate the episode number or range
+    except ValueError:
+        print("Invalid episode number. Please provide a valid integer, a range such as 1-24, or latest:N.")
+        exit(1)
+
+    if len(argv) < 4:   # Check if browser mode is provided
+        print('Specify the browser mode: 1 for Headless; 0 for Headed')
         exit(1)
-    elif len(argv) < 4:   # Check if browser mode is provided
-        try:
-            int(argv[2])   # Validate if episode number is an integer
-            print('Specify the browser mode: 1 for Headless; 0 for Headed')
-        except ValueError:
-            print("Invalid episode number. Please provide a valid integer.")
-        finally:
-            exit(1)
     else:
         if argv[3] not in ['0', '1']:   # Validate browser mode (0 or 1)
             print("Invalid browser mode. Use 1 for headless or 0 for headed.")
             exit(1)
         mode = bool(int(argv[3]))   # Convert browser mode to boolean (1 -> True, 0 -> False)
-    
-    return mode   # Return the browser mode
-    
-# The colons (:) are used to specify the expected data types of the function's parameters
-def run(
-        playwright: Playwright,  # playwright parameter is expected to be an instance of the Playwright class
-        anime: str,
-        episode_no: int,
-        browser_mode: bool
-    ) -> str:
-    """
-    Extracts the download link for the specified episode of an anime using Playwright.
-    
-    Args:
-        playwright (Playwright): An instance of the Playwright class.
-        anime (str): The name of the anime.
-        episode_no (int): The episode number.
-        browser_mode (bool): Determines the browser mode (headless or headed)
-    
-    Returns:
-        str: Extracted download link
-    """
-    # Define paths for browser user data and extensions
-    userDataDir = 'F:\\UserData\\Chrome'   # Directory for Chrome user data
-    extension_path = r'F:\\UserData\\uBlock Origin'   # Path to uBlock Origin extension (extracted)
-    
-    # List of arguments for the args parameter of the lauch_persistent_context method
-    arg_list=[f'--disable-extensions-except={extension_path}', f'--load-extension={extension_path}']   # disable all extensions except uBlock Origin and load it
-
-    if browser_mode:   # Add --headless flag if browser_mode is True (1)
-        arg_list.append('--headless')
-
-    # Launch a persistent browser with the specified behavior
-    browser = playwright.chromium.launch_persistent_context(
-        userDataDir,
-        headless=False,   # Default to headed mode, but --headless in args take precedence
-        channel='msedge', # Use the official Edge browser instead of the bundled chromium browser
-        args=arg_list     # Pass the list of arguments to the browser instance
-    )
-    
-    page = browser.pages[0]   # Use the first available page in the browser
 
-    try:
-        # Navigate to the GOGOAnime website
-        logging.info('🌐 Setting sail to the GOGOAnime website... Hold on tight!')
-        page.goto("https://ww19.gogoanimes.fi/")
-        logging.info('🚀 Website successfully loaded! Ready for the adventure to begin!')
-
-        # Search for the anime
-        page.locator('[placeholder="search"]').click()
-        logging.info("🧐 Inputting search query... Let's find that anime!")
-        page.locator('[placeholder="search"]').fill(f"{anime}")
-        page.locator('[onclick="do_search();"]').click()
-        logging.info('🌀 Sifting through the vast animeverse...')
-        logging.info('🎯 Aha! Found the one you were looking for! Great choice!🔥')
-
-        # Select the first search result
-        page.locator('ul > li:nth-child(1) > p.name > a').click()
-        logging.info('📜 Loading the episode list... Almost there!')
-        logging.info("✅ Episode list loaded! Let’s see what we have!")
-
-        # Locate and click on the specified episode
-        logging.info(f"🔍 Locating episode {episode_no}... It’s got to be here somewhere!")
-        page.locator(f"#episode_related > li:nth-last-child({episode_no}) > a > div.name").click()
-        logging.info('🙌 Episode found! The quest continues!')
-        
-        # Extract the URL for the download directory
-        download_url = page.locator("div.favorites_book > ul > li.dowloads > a").get_attribute('href')
-    except TimeoutError:
-        logging.error('⏰ Uh-oh! The operation timed out!')
-        logging.info('🛑 Closing the browser...Time to regroup and try again later!')
-        browser.close()
+    if len(argv) > 4 and argv[4] not in anime_pipeline.DOWNLOADERS:   # Optional downloader
+        print(f"Invalid downloader. Use one of: {', '.join(anime_pipeline.DOWNLOADERS)}")
         exit(1)
     
-    try:
-        # Navigate to the download directory
-        logging.info('⏳ Navigating to the download directory... Please wait, the treasure is almost yours!')
-        page.goto(download_url)
-    except TimeoutError:   # Ignore timeout error
-        pass
-    
-    try:
-        # Extract the 1080P download link
-        logging.info('🔑 Extracting the 1080P download link... The magic is happening!')
-        link_element = page.locator("#content-download > div:nth-child(1) > div:nth-child(6) > a")
-        href = link_element.get_attribute('href')
-        logging.info('🎉 Yatta! Download link successfully extracted! You did it!')
-        logging.info('🎬 Your anime adventure is about to begin! Grab your snacks! 🍿')
-        logging.info('👋 Until next time, stay awesome and keep watching!')
-    except TimeoutError:
-        # Log an error if the download link cannot be extracted and return None
-        logging.error('🕒 Oops! The download link is playing hard to get. Try again later!')
-        return None
-    except Exception as e:
-        # Log any other unexpected errors
-        logging.error(f'❌ An unexpected error occurred: {e}')
-        return None
-    finally:
-        # Close the browser regardless of whether the link extraction succeeds or fails
-        browser.close()
-        logging.info('🛑 Browser closed')
-    
+    return mode   # Return the browser mode
     
-    return href   # Return the extracted download link
-
-
-# Store the return value (bool) from the argv_check function in a variable
-mode = argv_check()
-
-# Call the main automation function and store its return value in the url variable
-with sync_playwright() as playwright:
-    url = run(
-             playwright,         # Pass the Playwright instance to the `run` function
-             anime=argv[1],      # Anime name from command-line arguments
-             episode_no=argv[2], # Episode number from command-line arguments
-             browser_mode=mode   # Browser mode (headless or headed) from the argv_check function
-        )
-
-# Exit the program if no download URL is extracted, otherwise continue
-if url is None:
-    exit(1)   
-else:
-    pass
+class EpisodeResolver:
+    """
+    Resolves episodes for the download pipeline, cheapest way first: plain HTTP, then the warm resolver
+    daemon, then one local browser that is only launched if an episode needs it.
 
-# Define paths for Internet Download Manager (IDM) and destination folder
-idm_path = r'"C:\Program Files (x86)\Internet Download Manager\IDMan.exe"'
-destination_folder = 'F:/Anime'
+    An episode the pipeline asks for is resolved together with the next few it hasn't asked for yet, and
+    their links wait here until they are: over HTTP as one `HttpResolver.resolve_batch` (one search,
+    `workers` episodes at once), and for the episodes that need a browser as one `gogo.resolve_batch`
+    (one search, several tabs), since pages that need a browser usually all do.
+    """
 
-# Construct the IDM shell command to download the anime episode from the extracted link
-idm = f'{idm_path} /d "{url}" /p "{destination_folder}" /f "{argv[1]}"-EP"{argv[2]}".mp4'
+    def __init__(self, anime: str, browser_mode: bool, index: AnimeIndex, tabs: int = 4):
+        self.anime = anime
+        self.browser_mode = browser_mode
+        self.index = index
+        self.tabs = tabs
+        self.http = gogo_http.HttpResolver(index=index)
+        self.http_batches = []   # stage timings per HTTP batch, for gogo_http.stage_report
+        self.batches = []   # (timings, launch seconds) per browser batch, for gogo.timing_report
+        self._lock = asyncio.Lock()   # the local browser works one batch at a time
+        self._todo = []    # episodes the pipeline hasn't asked for and no batch has taken, in its order
+        self._http = {}    # episode -> task of the HTTP batch resolving it
+        self._browser_batched = set()   # episodes taken by a browser batch
+        self._links = {}   # episode -> link, resolved ahead by a browser batch
+        self._playwright = None
+        self._browser = None
+
+    async def _page(self):
+        launch = 0.0
+        if self._browser is None:
+            logging.info('🐢 Launching a browser for the episodes that need one...')
+            start = time.perf_counter()
+            self._playwright = await async_playwright().start()
+            self._browser = await gogo.launch(self._playwright, self.browser_mode)
+            launch = time.perf_counter() - start
+        page = self._browser.pages[0]
+        await gogo.open_home(page)
+        return page, launch
+
+    async def episodes(self, spec: str) -> list:
+        """
+        Expands an episode selection; 'latest:N' needs the current episode count from the site.
+        """
+        if not spec.strip().lower().startswith('latest:'):
+            episodes = gogo.parse_episodes(spec)
+        else:
+            try:
+                urls = await asyncio.to_thread(self.http.open_show, self.anime, LATEST_MAX_AGE)
+            except (gogo_http.NeedsBrowser, gogo_http.requests.RequestException):
+                async with self._lock:
+                    page, _ = await self._page()
+                    urls, _ = await gogo.show_urls(page, self.anime, self.index, fresh=True)
+            episodes = gogo.parse_episodes(spec, len(urls))
+        self._todo = list(episodes)
+        return episodes
+
+    async def __call__(self, episode_no: int) -> str:
+        if episode_no in self._todo:
+            self._todo.remove(episode_no)
+        http_failed = True   # nothing resolved over HTTP, so the episodes nobody has tried yet will need the browser too
+        if episode_no not in self._browser_batched:
+            if episode_no not in self._http:
+                batch = [episode_no] + self._todo[:self.http.workers - 1]
+                del self._todo[:self.http.workers - 1]
+                task = asyncio.ensure_future(self._http_batch(batch))
+                self._http.update(dict.fromkeys(batch, task))
+            links, browser = await self._http[episode_no]
+            if episode_no in links:
+                return links[episode_no]
+            if episode_no not in browser:   # past the last episode; resolve_batch already said so
+                return None
+            http_failed = not links
+
+        async with self._lock:
+            if episode_no in self._links:   # resolved by the batch this call was waiting on
+                return self._links.pop(episode_no)
+            # Episodes HTTP already handed over, then ones nobody has tried yet if HTTP got nowhere
+            handed_over = [ep for ep, task in self._http.items()
+                           if task.done() and not task.exception() and ep in task.result()[1]
+                           and ep not in self._browser_batched and ep != episode_no]
+            batch = [episode_no] + handed_over[:self.tabs - 1]
+            if http_failed:
+                extra = self.tabs - len(batch)
+                batch += self._todo[:extra]
+                del self._todo[:extra]
+            self._browser_batched.update(batch)
+            links = await self._batch(",".join(map(str, batch)))
+            self._links.update({ep: links.get(ep) for ep in batch})
+            return self._links.pop(episode_no)
+
+    async def _http_batch(self, batch: list) -> tuple:
+        """
+        Resolves a batch over HTTP.
+
+        Returns:
+            tuple: ({episode: link}, [episodes that need the browser]); an episode in neither doesn't exist.
+        """
+        spec = ",".join(map(str, batch))
+        try:
+            links, browser, timings = await asyncio.to_thread(self.http.resolve_batch, self.anime, spec)
+        except (gogo_http.NeedsBrowser, gogo_http.requests.RequestException) as e:
+            logging.info(f'🧭 Episodes {spec} need the browser: {e}')
+            return {}, batch
+        self.http_batches.append(timings)
+        return links, browser
+
+    async def _batch(self, spec: str) -> dict:
+        """
+        Resolves a batch of episodes with the daemon if one is running, else in the local browser.
+        """
+        try:
+            response = await asyncio.to_thread(anime_daemon.request_batch, self.anime, spec)
+            if "error" in response:
+                logging.error(f"❌ The resolver daemon couldn't resolve episodes {spec}: {response['error']}")
+                return {}
+            logging.info(f'⚡ Episodes {spec} served by the warm resolver daemon!')
+            self.batches.append((response["timings"], 0.0))
+            return response["links"]
+        except OSError:
+            pass   # no daemon running
+
+        page, launch = await self._page()
+        links, timings = await gogo.resolve_batch(page, self.anime, spec, self.tabs, self.index)
+        self.batches.append((timings, launch))
+        return links
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            await self._playwright.stop()
+            logging.info('🛑 Browser closed')
+
+
+async def download_episodes(anime: str, spec: str, browser_mode: bool, downloader, folder: str, post_pool=None) -> dict:
+    """
+    Resolves and downloads episodes through the two-stage pipeline, so each episode starts downloading
+    as soon as its link is ready while the next ones are still being resolved.
 
-# Execute the IDM shell command from within the Python script
-subprocess.run(idm, shell=True)
\ No newline at end of file
+    Returns:
+        dict: Episode number -> "done", "unresolved" or "failed: <error>"
+    """
+    with AnimeIndex() as index:
+        resolver = EpisodeResolver(anime, browser_mode, index)
+        try:
+            episodes = await resolver.episodes(spec)
+            results, timings = await anime_pipeline.run_pipeline(
+                episodes, resolver, downloader, folder, filename=lambda ep: f"{anime}-EP{ep}.mp4", postprocess=post_pool)
+        finally:
+            await resolver.close()
+
+    for line in anime_pipeline.pipeline_report(timings).splitlines():
+        logging.info(line)
+    for timings in resolver.http_batches:
+        for line in gogo_http.stage_report(timings).splitlines():
+            logging.info(line)
+    for timings, launch in resolver.batches:
+        for line in gogo.timing_report(timings, launch).splitlines():
+            logging.info(line)
+    if resolver._browser is not None:   # only browser navigation records waits
+        for line in navigation.WAITS.report().splitlines():
+            logging.info(line)
+    return results
+
+
+def main(anime: str, spec: str, browser_mode: bool, downloader: str = 'idm', folder: str = 'F:/Anime', post: bool = True) -> int:
+    """
+    Downloads the selected episodes with the named downloader and returns the exit status. With `post`,
+    episodes are verified and tagged as they finish (needs ffmpeg; IDM downloads are left alone).
+    """
+    # Episodes are resolved and downloaded in overlapping stages: a plain number is a batch of one
+    try:
+        with instrumented('anime'), postprocess.optional(post and downloader != 'idm') as post_pool:
+            results = asyncio.run(download_episodes(anime, spec, browser_mode, anime_pipeline.DOWNLOADERS[downloader](),
+                                                    folder, post_pool))
+            if post_pool:
+                for line in post_pool.report().splitlines():
+                    logging.info(line)
+    except KeyboardInterrupt:
+        logging.info('🛑 Stopped. Partial downloads are kept and resume on the next run.')
+        return 1
+    for line in METRICS.report().splitlines():
+        logging.info(line)
+
+    # Fail if nothing was downloaded
+    if not any(result == "done" for result in results.values()):
+        return 1
+    logging.info('🎬 Your anime adventure is about to begin! Grab your snacks! 🍿')
+    logging.info('👋 Until next time, stay awesome and keep watching!')
+    return 0
+
+
+if __name__ == "__main__":
+    # Store the return value (bool) from the argv_check function in a variable
+    mode = argv_check()
+
+    # Optional 4th argument picks the downloader: idm (default, Windows), ytdlp or builtin (anywhere)
+    exit(main(argv[1], argv[2], mode, argv[4] if len(argv) > 4 else 'idm', argv[5] if len(argv) > 5 else 'F:/Anime'))
@@ -0,0 +1,197 @@
+from playwright.async_api import async_playwright, TimeoutError
+from sys import argv
+import asyncio
+import json
+import logging
+import socket
+
+from anime_index import AnimeIndex
+from instrument import instrumented
+import gogo
+import navigation
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+class PagePool:
+    """
+    Pages of one long-lived browser context, each kept parked on the home page between requests.
+
+    Args:
+        context (BrowserContext): The warm persistent context.
+        size (int): Number of pages, i.e. how many requests are served at once.
+        tabs (int): Extra tabs a batch request may open while it runs.
+    """
+
+    def __init__(self, context, size, tabs=4):
+        self.context = context
+        self.size = size
+        self.tabs = tabs
+        self._idle = asyncio.Queue()
+        self._cold = set()      # pages whose re-warm failed; homed again on their next use
+        self._tasks = set()     # background re-warms, referenced so they aren't garbage-collected
+
+    async def start(self):
+        pages = list(self.context.pages[:self.size])
+        while len(pages) < self.size:
+            pages.append(await self.context.new_page())
+        await asyncio.gather(*(gogo.open_home(page) for page in pages))
+        for page in pages:
+            self._idle.put_nowait(page)
+
+    async def acquire(self):
+        """
+        Take an idle page, homing it first if its last re-warm failed.
+
+        Raises:
+            Exception: If the page still can't reach the home page; it goes back to the pool, cold.
+        """
+        page = await self._idle.get()
+        if page in self._cold:
+            self._cold.discard(page)
+            try:
+                if page.is_closed():
+                    page = await self.context.new_page()
+                await gogo.open_home(page)
+            except BaseException:
+                self._cold.add(page)
+                self._idle.put_nowait(page)
+                raise
+        return page
+
+    async def release(self, page):
+        """
+        Send the page back to the home page (replacing it if it broke) and return it to the pool.
+
+        The page always goes back, even if it couldn't be re-warmed: a lost page would leave every later
+        request waiting in `acquire` forever once they had all leaked.
+        """
+        try:
+            try:
+                await gogo.open_home(page)
+            except Exception as e:
+                logging.warning(f'♻️ Replacing a broken page: {e}')
+                await page.close()
+                page = await self.context.new_page()
+                await gogo.open_home(page)
+        except Exception as e:
+            logging.warning(f'♻️ Could not re-warm a page, homing it on its next use: {e}')
+            self._cold.add(page)
+        finally:
+            self._idle.put_nowait(page)
+
+    def release_soon(self, page):
+        """
+        Release the page in a background task, so re-warming doesn't add to the request's latency.
+        """
+        task = asyncio.create_task(self.release(page))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+async def handle(reader, writer, pool, index):
+    """
+    Serve one JSON-lines request and close the connection.
+
+    {"anime": ..., "episode": 7}       -> {"link": ...} or {"error": ...}
+    {"anime": ..., "episodes": "1-12"} -> {"links": {"1": ..., ...}, "timings": {...}} or {"error": ...}
+    """
+    try:
+        request = json.loads(await reader.readline())
+        page = await pool.acquire()
+        try:
+            if "episodes" in request:
+                links, timings = await gogo.resolve_batch(page, request["anime"], request["episodes"], pool.tabs, index)
+                response = {"links": links, "timings": timings}
+            else:
+                link = await gogo.resolve(page, request["anime"], int(request["episode"]), index)
+                response = {"link": link} if link else {"error": "download link not found"}
+        except TimeoutError:
+            response = {"error": "timed out"}
+        finally:
+            pool.release_soon(page)   # re-warmed after the reply
+    except (ValueError, KeyError) as e:
+        response = {"error": f"bad request: {e}"}
+    except Exception as e:   # anything else still gets a reply: the client would otherwise read an empty line
+        logging.exception('❌ Request failed')
+        response = {"error": f"{type(e).__name__}: {e}"}
+
+    writer.write((json.dumps(response) + "\n").encode())
+    await writer.drain()
+    writer.close()
+
+
+async def serve(pages=2, headless=True, host=HOST, port=PORT):
+    """
+    Launch the browser once, warm `pages` pages and serve requests until interrupted.
+    """
+    index = AnimeIndex()
+    async with async_playwright() as playwright:
+        context = await gogo.launch(playwright, headless)
+        pool = PagePool(context, pages)
+        await pool.start()
+
+        server = await asyncio.start_server(lambda r, w: handle(r, w, pool, index), host, port)
+        logging.info(f'🔥 Resolver daemon warm with {pages} pages, listening on {host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await context.close()
+            index.close()
+            for line in navigation.WAITS.report().splitlines():
+                logging.info(line)
+
+
+def _send(message, host, port, timeout):
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(message) + "\n").encode())
+        with sock.makefile("r", encoding="utf-8") as f:
+            reply = f.readline()
+    try:
+        return json.loads(reply)
+    except ValueError:   # the daemon closed the connection without a (complete) reply
+        return {"error": "no reply from the resolver daemon"}
+
+
+def request(anime, episode_no, host=HOST, port=PORT, timeout=120):
+    """
+    Ask a running daemon for an episode's download link.
+
+    Returns:
+        dict: {"link": ...} or {"error": ...}
+
+    Raises:
+        OSError: If no daemon is listening.
+    """
+    return _send({"anime": anime, "episode": episode_no}, host, port, timeout)
+
+
+def request_batch(anime, spec, host=HOST, port=PORT, timeout=900):
+    """
+    Ask a running daemon to resolve a batch of episodes (see `gogo.parse_episodes` for `spec`).
+
+    Returns:
+        dict: {"links": {episode: link}, "timings": {...}} or {"error": ...}; episode keys are ints.
+
+    Raises:
+        OSError: If no daemon is listening.
+    """
+    response = _send({"anime": anime, "episodes": spec}, host, port, timeout)
+    if "links" in response:   # JSON object keys come back as strings
+        response["links"] = {int(ep): link for ep, link in response["links"].items()}
+        response["timings"]["episodes"] = {int(ep): t for ep, t in response["timings"]["episodes"].items()}
+    return response
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pages = int(argv[1]) if len(argv) > 1 else 2
+    headless = argv[2] != '0' if len(argv) > 2 else True   # 1 for Headless; 0 for Headed
+    metrics_port = int(argv[3]) if len(argv) > 3 else None   # Prometheus metrics at http://127.0.0.1:<port>/metrics
+    try:
+        with instrumented('anime_daemon', metrics_port=metrics_port):
+            asyncio.run(serve(pages, headless))
+    except KeyboardInterrupt:
+        logging.info('🛑 Resolver daemon stopped')
@@ -0,0 +1,162 @@
+from sys import argv
+import re
+import sqlite3
+import threading
+import time
+
+from extract_cache import ExtractCache
+
+# How old an episode table may be before 'latest:N' walks the episode list again, in seconds
+LATEST_MAX_AGE = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shows (
+    name       TEXT PRIMARY KEY,    -- normalized anime name, see `normalize`
+    show_url   TEXT NOT NULL,       -- category page the search led to
+    updated_at REAL NOT NULL        -- UNIX time the episode list was last walked
+);
+
+CREATE TABLE IF NOT EXISTS episodes (
+    name    TEXT NOT NULL,
+    episode INTEGER NOT NULL,
+    url     TEXT NOT NULL,
+    PRIMARY KEY (name, episode)
+);
+"""
+
+
+def normalize(anime):
+    """
+    Normalize an anime name so 'One Piece', 'one-piece' and ' ONE  PIECE ' share an index entry.
+    """
+    return re.sub(r"[^a-z0-9]+", " ", str(anime).lower()).strip()
+
+
+class AnimeIndex:
+    """
+    Local index of GOGOAnime shows: normalized name -> show page and episode number -> episode page URL,
+    plus a short-lived cache of extracted download links.
+
+    Show pages and episode URLs practically never change, so a repeat lookup skips the search and the
+    episode list. Download links are signed and expire, so they live in an ExtractCache "anime_link"
+    entry whose lifetime follows the link's own expiry. Callers invalidate a show when a selector fails
+    on a page the index pointed them to.
+
+    Args:
+        path (str): SQLite database path, created on first use.
+        cache (ExtractCache): Cache for download links; by default one in the same database file.
+    """
+
+    def __init__(self, path="anime_index.sqlite", cache=None):
+        self.path = path
+        self._own_cache = cache is None
+        self.cache = cache or ExtractCache(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+        if self._own_cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def show_url(self, anime):
+        """
+        Show page the last search for `anime` led to, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT show_url FROM shows WHERE name = ?", (normalize(anime),)).fetchone()
+        return row[0] if row else None
+
+    def episodes(self, anime, max_age=None):
+        """
+        Indexed episode page URLs (index 0 is episode 1), or None if the show is unknown or its table
+        is older than `max_age` seconds.
+        """
+        name = normalize(anime)
+        with self._lock:
+            row = self._conn.execute("SELECT updated_at FROM shows WHERE name = ?", (name,)).fetchone()
+            if row is None or (max_age is not None and time.time() - row[0] > max_age):
+                return None
+            rows = self._conn.execute(
+                "SELECT url FROM episodes WHERE name = ? ORDER BY episode", (name,)).fetchall()
+        return [url for (url,) in rows] or None
+
+    def store(self, anime, show_url, episode_urls):
+        """
+        Record a freshly walked episode list, replacing whatever was indexed for the show.
+        """
+        name = normalize(anime)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO shows (name, show_url, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET show_url = excluded.show_url, updated_at = excluded.updated_at",
+                (name, show_url, time.time()))
+            self._conn.execute("DELETE FROM episodes WHERE name = ?", (name,))
+            self._conn.executemany("INSERT INTO episodes (name, episode, url) VALUES (?, ?, ?)",
+                                   [(name, n, url) for n, url in enumerate(episode_urls, start=1)])
+
+    def invalidate(self, anime):
+        """
+        Forget a show's page, episode table and cached download links, e.g. after a selector failed on an
+        indexed page: links extracted from pages that moved would otherwise be served until they expire.
+        """
+        name = normalize(anime)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM episodes WHERE name = ?", (name,))
+            self._conn.execute("DELETE FROM shows WHERE name = ?", (name,))
+        self.cache.invalidate_prefix(self._link_prefix(anime), "anime_link")
+
+    @staticmethod
+    def _link_prefix(anime):
+        return f"gogo:{normalize(anime)}#"
+
+    @classmethod
+    def _link_key(cls, anime, episode_no):
+        return f"{cls._link_prefix(anime)}{int(episode_no)}"
+
+    def link(self, anime, episode_no):
+        """
+        Cached download link for an episode, or None if there is none or it has expired.
+        """
+        info = self.cache.get(self._link_key(anime, episode_no), "anime_link")
+        return info["url"] if info else None
+
+    def put_link(self, anime, episode_no, link):
+        self.cache.put(self._link_key(anime, episode_no), {"url": link}, "anime_link")
+
+    def drop_link(self, anime, episode_no):
+        self.cache.invalidate(self._link_key(anime, episode_no), "anime_link")
+
+    def shows(self):
+        """
+        (name, show URL, episode count, UNIX time of the last walk) for every indexed show.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT s.name, s.show_url, COUNT(e.episode), s.updated_at FROM shows s "
+                "LEFT JOIN episodes e ON e.name = s.name GROUP BY s.name ORDER BY s.name").fetchall()
+
+
+if __name__ == "__main__":
+    # python anime_index.py [list|forget <anime>] [db]
+    command = argv[1] if len(argv) > 1 else "list"
+    if command == "forget" and len(argv) > 2:
+        with AnimeIndex(*argv[3:4]) as index:
+            index.invalidate(argv[2])
+            print(f"Forgot {normalize(argv[2])!r}")
+    elif command == "list":
+        with AnimeIndex(*argv[2:3]) as index:
+            for name, show_url, count, updated_at in index.shows():
+                print(f"{name:<40} {count:>5} episodes  {time.strftime('%Y-%m-%d %H:%M', time.localtime(updated_at))}  {show_url}")
+    else:
+        print("Usage: python anime_index.py [list | forget <anime>] [db]")
+        exit(1)
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from download_manager import download_item
+from instrument import METRICS
+import segmented
+
+IDM_PATH = r'"C:\Program Files (x86)\Internet Download Manager\IDMan.exe"'
+
+
+class IdmDownloader:
+    """
+    Hand each link to Internet Download Manager (Windows).
+
+    IDM downloads in its own process, so this stage only measures the hand-off; the download itself
+    overlaps with everything else by construction.
+    """
+
+    name = "idm"
+
+    def __init__(self, idm_path=IDM_PATH):
+        self.idm_path = idm_path
+
+    async def download(self, url, folder, filename, cancel):
+        # /n turns off IDM's confirmation dialog, so the download starts right away
+        process = await asyncio.create_subprocess_shell(
+            f'{self.idm_path} /d "{url}" /p "{folder}" /f "{filename}" /n')
+        try:
+            await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+
+class YtDlpDownloader:
+    """
+    Download each link with yt-dlp (see download_manager.download_item), with `connections` range
+    requests per file for progressive formats.
+    """
+
+    name = "ytdlp"
+
+    def __init__(self, connections=8, ydl_opts=None):
+        self.connections = connections
+        self.ydl_opts = ydl_opts or {"quiet": True, "no_warnings": True, "noprogress": True}
+
+    async def download(self, url, folder, filename, cancel):
+        def abort_if_cancelled(progress):
+            if cancel.is_set():
+                raise InterruptedError("download cancelled")
+
+        opts = {**self.ydl_opts, "outtmpl": os.path.join(folder, filename.replace("%", "%%")),
+                "progress_hooks": [abort_if_cancelled]}
+        await asyncio.to_thread(download_item, url, opts, self.connections)
+
+
+class BuiltinDownloader:
+    """
+    Download each link with the segmented range-request downloader; works anywhere Python does.
+    """
+
+    name = "builtin"
+
+    def __init__(self, connections=8):
+        self.connections = connections
+
+    async def download(self, url, folder, filename, cancel):
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, filename)
+        await asyncio.to_thread(segmented.download, url, path, self.connections, cancel=cancel)
+
+
+DOWNLOADERS = {cls.name: cls for cls in (IdmDownloader, YtDlpDownloader, BuiltinDownloader)}
+
+
+async def run_pipeline(episodes, resolve, downloader, folder, filename, resolvers=2, downloads=2, buffer=2,
+                       postprocess=None):
+    """
+    Resolve episode links and download them in two overlapping stages joined by a bounded queue.
+
+    Episode N+1 is resolved while episode N downloads, so the wall time tends towards the slower
+    stage instead of the sum of both. The queue holds at most `buffer` resolved links: when downloads
+    fall behind, resolvers wait instead of piling up signed links that may expire before their turn.
+    Cancelling the pipeline (e.g. Ctrl+C) stops both stages; the built-in downloader keeps its partial
+    segments for a resume.
+
+    With `postprocess` (a postprocess.PostProcessor), episodes are downloaded into `folder/.incoming` and
+    handed to the pool as each finishes, to be verified, tagged and moved into `folder` while the next
+    downloads run; an episode is only "done" once that succeeds. IDM downloads in its own process, out
+    of reach, so its episodes aren't post-processed.
+
+    Args:
+        episodes (list): Episode numbers, in the order they should be worked through.
+        resolve (callable): async fn(episode) -> download link or None.
+        downloader: One of DOWNLOADERS, or anything with an async download(url, folder, filename, cancel).
+        folder (str): Destination folder.
+        filename (callable): fn(episode) -> file name.
+        resolvers (int): Episodes resolved at once.
+        downloads (int): Episodes downloaded at once.
+        buffer (int): Resolved links allowed to wait for a download slot.
+        postprocess (PostProcessor): Post-download stage, optional.
+
+    Returns:
+        tuple: ({episode number: "done" | "unresolved" | "failed: <error>"},
+            {"resolve": s, "download": s, "post": s, "wall": s, "episodes": {episode number: {stage: seconds}}})
+    """
+    if getattr(downloader, "name", None) == IdmDownloader.name:
+        postprocess = None
+    incoming = os.path.join(folder, ".incoming") if postprocess else folder
+    todo = asyncio.Queue()
+    for ep in episodes:
+        todo.put_nowait(ep)
+    ready = asyncio.Queue(maxsize=buffer)
+    cancel = threading.Event()   # seen by downloads running in threads, which asyncio can't interrupt
+    results = {}
+    timings = {"resolve": 0.0, "download": 0.0, "post": 0.0, "episodes": {ep: {} for ep in episodes}}
+    post_tasks = []
+
+    async def resolve_worker():
+        while not todo.empty():
+            ep = todo.get_nowait()
+            started = time.perf_counter()
+            try:
+                link = await resolve(ep)
+            except Exception as e:   # one bad episode shouldn't sink the batch
+                logging.error(f'❌ Episode {ep} could not be resolved: {e}')
+                link = None
+            elapsed = time.perf_counter() - started
+            timings["resolve"] += elapsed
+            timings["episodes"][ep]["resolve"] = elapsed
+            METRICS.record("pipeline.resolve", elapsed, link is not None)
+            if link is None:
+                results[ep] = "unresolved"
+                METRICS.count("pipeline.unresolved")
+                continue
+            await ready.put((ep, link))   # blocks while the download stage is behind
+
+    async def post(ep):
+        job = {"files": [os.path.join(incoming, filename(ep))], "destination": os.path.join(folder, filename(ep)),
+               "metadata": {"title": os.path.splitext(filename(ep))[0], "track": ep}}
+        started = time.perf_counter()
+        try:
+            await asyncio.wrap_future(postprocess.submit(job))
+            results[ep] = "done"
+        except Exception as e:
+            logging.error(f'❌ Episode {ep} failed post-processing: {e}')
+            results[ep] = f"failed: {e}"
+        elapsed = time.perf_counter() - started
+        timings["post"] += elapsed
+        timings["episodes"][ep]["post"] = elapsed
+        METRICS.count("pipeline.done" if results[ep] == "done" else "pipeline.failed")
+
+    async def download_worker():
+        while True:
+            item = await ready.get()
+            if item is None:
+                return
+            ep, link = item
+            logging.info(f'⬇️ Downloading episode {ep} with {getattr(downloader, "name", "the downloader")}...')
+            started = time.perf_counter()
+            try:
+                await downloader.download(link, incoming, filename(ep), cancel)
+                results[ep] = "done"
+            except Exception as e:
+                logging.error(f'❌ Episode {ep} failed to download: {e}')
+                results[ep] = f"failed: {e}"
+            elapsed = time.perf_counter() - started
+            timings["download"] += elapsed
+            timings["episodes"][ep]["download"] = elapsed
+            METRICS.record("pipeline.download", elapsed, results[ep] == "done")
+            if postprocess and results[ep] == "done":
+                results[ep] = "processing"
+                post_tasks.append(asyncio.create_task(post(ep)))   # this worker moves on to the next download
+                continue
+            METRICS.count("pipeline.done" if results[ep] == "done" else "pipeline.failed")
+
+    start = time.perf_counter()
+    resolve_tasks = [asyncio.create_task(resolve_worker()) for _ in range(max(1, resolvers))]
+    download_tasks = [asyncio.create_task(download_worker()) for _ in range(max(1, downloads))]
+    try:
+        await asyncio.gather(*resolve_tasks)
+        for _ in download_tasks:
+            await ready.put(None)   # one stop marker per download worker, queued behind the real work
+        await asyncio.gather(*download_tasks)
+        await asyncio.gather(*post_tasks)
+    finally:
+        tasks = resolve_tasks + download_tasks + post_tasks
+        if not all(task.done() for task in tasks):
+            logging.info('🛑 Pipeline cancelled, stopping resolvers and downloads...')
+            cancel.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        timings["wall"] = time.perf_counter() - start
+
+    return results, timings
+
+
+def pipeline_report(timings):
+    """
+    Compare the pipeline's wall time with running the stages back to back.
+
+    Returns:
+        str: A short multi-line report.
+    """
+    sequential = timings["resolve"] + timings["download"] + timings.get("post", 0.0)
+    overlap = sequential / timings["wall"] if timings["wall"] else 0
+    post = f", post-processing: {timings['post']:.1f}s" if timings.get("post") else ""
+    return (f"⏱️ Resolve stage: {timings['resolve']:.1f}s, download stage: {timings['download']:.1f}s{post} "
+            f"(summed over episodes)\n"
+            f"⏱️ Pipeline wall time: {timings['wall']:.1f}s vs {sequential:.1f}s back to back "
+            f"({overlap:.1f}x)")
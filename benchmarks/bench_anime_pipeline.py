@@ -0,0 +1,94 @@
+"""
+Compare resolving every episode before downloading any with the overlapping resolve/download pipeline.
+
+Resolution is faked with a fixed delay per episode (what a browser or HTTP walk costs); downloads use
+the built-in segmented downloader against the local media server, throttled per connection. Finishes
+with a cancellation check: a cancelled pipeline stops promptly and leaves its partial segments behind.
+
+Usage: python benchmarks/bench_anime_pipeline.py [episodes] [resolve_seconds] [size_bytes] [bandwidth_per_connection]
+"""
+from pathlib import Path
+from sys import argv
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import anime_pipeline   # noqa: E402
+from media_server import media_bytes, start_server   # noqa: E402
+
+
+def fake_resolver(base_url, size, delay):
+    async def resolve(ep):
+        await asyncio.sleep(delay)
+        return f"{base_url}/media/ep{ep}.mp4?size={size}"
+    return resolve
+
+
+async def back_to_back(episodes, resolve, downloader, folder):
+    start = time.perf_counter()
+    links = {ep: await resolve(ep) for ep in episodes}
+    resolved = time.perf_counter()
+    for ep, link in links.items():
+        await downloader.download(link, folder, f"ep{ep}.mp4", threading.Event())
+    return resolved - start, time.perf_counter() - resolved
+
+
+def intact(folder, episodes, size):
+    return sum(open(os.path.join(folder, f"ep{ep}.mp4"), "rb").read() == media_bytes(f"/media/ep{ep}.mp4", size)
+               for ep in episodes)
+
+
+async def main(n_episodes, delay, size, bandwidth):
+    server, base_url = start_server(latency=0.01, bandwidth=bandwidth)
+    episodes = list(range(1, n_episodes + 1))
+    resolve = fake_resolver(base_url, size, delay)
+    downloader = anime_pipeline.BuiltinDownloader(connections=4)
+    print(f"{n_episodes} episodes, {delay:.1f}s to resolve each, {size / 2 ** 20:.0f} MiB each "
+          f"at {bandwidth / 2 ** 20:.1f} MiB/s per connection, 4 connections")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            resolve_time, download_time = await back_to_back(episodes, resolve, downloader, tmp)
+            print(f"back to back   {resolve_time + download_time:6.2f}s  (resolve {resolve_time:.2f}s, "
+                  f"download {download_time:.2f}s)  {intact(tmp, episodes, size)}/{n_episodes} intact")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results, timings = await anime_pipeline.run_pipeline(
+                episodes, resolve, downloader, tmp, filename=lambda ep: f"ep{ep}.mp4", resolvers=1, downloads=1)
+            assert set(results.values()) == {"done"}, results
+            print(f"pipeline 1/1   {timings['wall']:6.2f}s  {intact(tmp, episodes, size)}/{n_episodes} intact")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results, timings = await anime_pipeline.run_pipeline(
+                episodes, resolve, downloader, tmp, filename=lambda ep: f"ep{ep}.mp4", resolvers=2, downloads=2)
+            print(f"pipeline 2/2   {timings['wall']:6.2f}s  {intact(tmp, episodes, size)}/{n_episodes} intact")
+            print(anime_pipeline.pipeline_report(timings))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            task = asyncio.create_task(anime_pipeline.run_pipeline(
+                episodes, resolve, downloader, tmp, filename=lambda ep: f"ep{ep}.mp4"))
+            await asyncio.sleep(delay + 0.5)
+            start = time.perf_counter()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            parts = [f for f in os.listdir(tmp) if ".part" in f]
+            print(f"cancelled mid-download: stopped in {time.perf_counter() - start:.2f}s, "
+                  f"{len(parts)} partial segments kept for a resume")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    n_episodes = int(argv[1]) if len(argv) > 1 else 6
+    delay = float(argv[2]) if len(argv) > 2 else 1.0
+    size = int(argv[3]) if len(argv) > 3 else 4 * 1024 * 1024
+    bandwidth = int(argv[4]) if len(argv) > 4 else 1024 * 1024
+    asyncio.run(main(n_episodes, delay, size, bandwidth))
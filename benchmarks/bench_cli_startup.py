@@ -0,0 +1,83 @@
+"""
+Startup cost of `python -m scripts` when the arguments are wrong: how much gets imported before the
+error is printed, measured with `python -X importtime` on top of what a bare interpreter imports. Fails if a command imports one of the HEAVY
+modules before validating its arguments, or if its import time goes over its threshold.
+For comparison it also times the old way, running player_wiki.py without arguments.
+
+Usage: python benchmarks/bench_cli_startup.py [runs]
+"""
+from pathlib import Path
+from sys import argv
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY = ("pandas", "numpy", "openpyxl", "lxml", "yt_dlp", "selenium", "playwright", "bs4", "requests")
+
+# Command -> (arguments that fail validation, threshold in ms for imports beyond a bare interpreter's).
+# The thresholds are 2-3x the usual measurement, which is noisy; the anime check imports gogo (and
+# asyncio) to parse the episodes, and tv imports the HLS modules before looking the channel up.
+CASES = {
+    "help": (["--help"], 40),
+    "scrape": (["scrape", "--workers", "many"], 120),
+    "download": (["download", "https://example.com/watch", "--rate", "fast"], 150),
+    "anime": (["anime", "Naruto", "1-x"], 150),
+    "tv": (["tv", "nosuchchannel"], 150),
+    "wiki": (["wiki", "Lionel_Messi", "0", "table.json"], 40),
+}
+
+
+def importtime(command):
+    """
+    Run `command` under -X importtime.
+
+    Returns:
+        tuple: (total import time in ms, wall time in ms, names of the modules imported)
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", *command], cwd=ROOT, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    total, modules = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        if not name.startswith("  "):   # top-level imports; nested ones are already in their cumulative time
+            total += int(cumulative)
+    return total / 1000, wall, modules
+
+
+def measure(command, runs):
+    samples = [importtime(command) for _ in range(runs)]
+    return (statistics.median(s[0] for s in samples), statistics.median(s[1] for s in samples),
+            sorted({m.split(".")[0] for s in samples for m in s[2]} & set(HEAVY)))
+
+
+if __name__ == "__main__":
+    runs = int(argv[1]) if len(argv) > 1 else 5
+
+    baseline, _, _ = measure(["-c", "pass"], runs)
+    print(f"Bare interpreter: {baseline:.1f}ms of imports (site, encodings, ...), subtracted below")
+
+    failures = []
+    print(f"{'command':10} {'imports':>9} {'limit':>7} {'wall':>8}  heavy modules imported")
+    for name, (arguments, limit) in CASES.items():
+        imports, wall, heavy = measure(["-m", "scripts", *arguments], runs)
+        imports -= baseline
+        print(f"{name:10} {imports:7.1f}ms {limit:5d}ms {wall:6.0f}ms  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{name} imports {', '.join(heavy)} before validating its arguments")
+        if imports > limit:
+            failures.append(f"{name} import time {imports:.0f}ms is over its {limit}ms threshold")
+
+    imports, wall, heavy = measure(["player_wiki.py"], runs)
+    imports -= baseline
+    print(f"{'old wiki':10} {imports:7.1f}ms {'':>7} {wall:6.0f}ms  {', '.join(heavy) or '-'}  (python player_wiki.py)")
+
+    for failure in failures:
+        print("❌", failure)
+    sys.exit(1 if failures else 0)
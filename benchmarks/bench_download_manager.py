@@ -0,0 +1,52 @@
+"""
+Benchmark the parallel download manager against the local fake media server.
+
+Usage: python benchmarks/bench_download_manager.py [files] [size_bytes] [bandwidth_per_connection]
+"""
+from pathlib import Path
+from sys import argv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from download_manager import run_downloads   # noqa: E402
+from media_server import media_bytes, start_server   # noqa: E402
+
+
+def bench(urls, size, jobs, label):
+    with tempfile.TemporaryDirectory() as tmp:
+        ydl_opts = {
+            "outtmpl": os.path.join(tmp, "%(title)s.%(ext)s"),
+            "download_archive": os.path.join(tmp, "archive.txt"),
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+        }
+        start = time.perf_counter()
+        counts = run_downloads(urls, ydl_opts, jobs=jobs, backoff=0.1, queue_path=os.path.join(tmp, "queue.sqlite"))
+        elapsed = time.perf_counter() - start
+
+        files = sorted(f for f in os.listdir(tmp) if f.endswith(".mp4"))
+        intact = sum(open(os.path.join(tmp, f), "rb").read() == media_bytes(f"/media/{f}", size) for f in files)
+    print(f"{label:<10} {elapsed:6.2f}s  {intact}/{len(urls)} files intact  {counts}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    n_files = int(argv[1]) if len(argv) > 1 else 8
+    size = int(argv[2]) if len(argv) > 2 else 2 * 1024 * 1024
+    bandwidth = int(argv[3]) if len(argv) > 3 else 4 * 1024 * 1024
+
+    # Every 7th request fails once, so the retry path is exercised too
+    server, base_url = start_server(latency=0.05, bandwidth=bandwidth, fail_every=7)
+    urls = [f"{base_url}/media/file{i}.mp4?size={size}" for i in range(n_files)]
+    try:
+        serial = bench(urls, size, 1, "1 job")
+        parallel = bench(urls, size, 4, "4 jobs")
+        print(f"speedup    {serial / parallel:6.1f}x")
+    finally:
+        server.shutdown()
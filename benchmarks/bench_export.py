@@ -0,0 +1,68 @@
+"""
+Time and peak memory of exporting the video catalog: the old pandas path (whole sheet as a DataFrame,
+written through WorkbookSession) against the streaming exporters for .xlsx, .csv and .parquet.
+
+Usage: python benchmarks/bench_export.py [sizes...]   (default: 10000 50000)
+"""
+from pathlib import Path
+from sys import argv
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_export import export   # noqa: E402
+from video_store import VideoStore   # noqa: E402
+from pandas_workbook import WorkbookSession   # noqa: E402
+
+
+def videos(start, count):
+    return [{"video_id": f"vid{i:08d}", "title": f"Video number {i} with a typical title", "upload_date": "2024-01-01",
+             "duration": 754 + i % 600} for i in range(start, start + count)]
+
+
+def measure(fn):
+    """
+    (seconds, peak MiB allocated by Python while `fn` ran)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def pandas_export(store, path):
+    session = WorkbookSession(path, load=False)
+    session.replace("Channel", store.sheet("Channel"))
+    session.save()
+
+
+def bench(size, tmp):
+    with VideoStore(os.path.join(tmp, f"bench_{size}.sqlite")) as store:
+        for start in range(0, size, 10000):
+            store.add("Channel", videos(start, min(10000, size - start)))
+        cases = {
+            "pandas xlsx": lambda: pandas_export(store, os.path.join(tmp, f"pandas_{size}.xlsx")),
+            "stream xlsx": lambda: export(store, os.path.join(tmp, f"stream_{size}.xlsx")),
+            "stream csv": lambda: export(store, os.path.join(tmp, f"stream_{size}.csv")),
+        }
+        if importlib.util.find_spec("pyarrow"):
+            cases["stream parquet"] = lambda: export(store, os.path.join(tmp, f"stream_{size}.parquet"))
+        results = {name: measure(fn) for name, fn in cases.items()}
+
+    print(f"{size:>7} rows  " + "  ".join(f"{name} {seconds:6.2f}s {peak:7.1f} MiB"
+                                          for name, (seconds, peak) in results.items()))
+
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in argv[1:]] or [10000, 50000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            bench(size, tmp)
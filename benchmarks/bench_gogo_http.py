@@ -0,0 +1,102 @@
+"""
+Check and time the browserless GOGOAnime resolver against saved pages served locally.
+
+Resolves one episode and a whole season over plain HTTP, prints per-stage timings, checks every link
+against the fixtures and checks that JavaScript-only download pages are handed to the browser path.
+Then compares cold and repeat lookups through the show index and link cache, and checks that an
+index pointing at moved pages is invalidated and rebuilt.
+
+Usage: python benchmarks/bench_gogo_http.py [latency_seconds] [episodes]
+"""
+from pathlib import Path
+from sys import argv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from anime_index import AnimeIndex   # noqa: E402
+import gogo_http   # noqa: E402
+from gogo_server import GogoHandler, start_server   # noqa: E402
+
+
+def expected(ep):
+    return f"https://cdn.example/fixture-show-ep{ep}-1080p.mp4"
+
+
+def resolver(base_url, workers=4, index=None):
+    return gogo_http.HttpResolver(base_url, ajax_url=base_url + "ajax/load-list-episode", workers=workers, index=index)
+
+
+def timed_requests(fn):
+    before = GogoHandler.requests
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start, GogoHandler.requests - before
+
+
+def bench_index(base_url, episodes):
+    with tempfile.TemporaryDirectory() as tmp, AnimeIndex(os.path.join(tmp, "index.sqlite")) as index:
+        resolve = lambda ep: resolver(base_url, index=index).resolve("Fixture Show", ep)   # noqa: E731
+        (link, _), cold, cold_requests = timed_requests(lambda: resolve(3))
+        (link, _), warm, warm_requests = timed_requests(lambda: resolve(4))
+        (cached, _), hit, hit_requests = timed_requests(lambda: resolve(4))
+        assert (link, cached) == (expected(4), expected(4))
+        print(f"cold lookup       {cold:6.3f}s  {cold_requests} requests (search, show page, episode list, episode, download)")
+        print(f"indexed show      {warm:6.3f}s  {warm_requests} requests (episode, download)")
+        print(f"cached link       {hit:6.3f}s  {hit_requests} requests")
+
+        spec = f"1-{episodes}"
+        _, cold, cold_requests = timed_requests(lambda: resolver(base_url, index=index).resolve_batch("fixture-show", spec))
+        _, warm, warm_requests = timed_requests(lambda: resolver(base_url, index=index).resolve_batch("fixture  SHOW", spec))
+        print(f"batch {spec}, first run   {cold:6.3f}s  {cold_requests} requests")
+        print(f"batch {spec}, repeat run  {warm:6.3f}s  {warm_requests} requests "
+              f"(only the JavaScript episodes, which never reach the cache)")
+
+        # The site moves its episode pages: indexed URLs 404, the show is invalidated and walked again
+        GogoHandler.moved = True
+        try:
+            index.drop_link("Fixture Show", 7)   # as if the cached link had expired
+            link, _ = resolver(base_url, index=index).resolve("Fixture Show", 7)
+            assert link == expected(7) and index.episodes("fixture show")[0].endswith("fixture-show-v2-episode-1")
+            links, browser, _ = resolver(base_url, index=index).resolve_batch("Fixture Show", "latest:3")
+            assert set(links) | set(browser) == set(range(episodes - 2, episodes + 1))
+            print("moved episode pages: index invalidated and rebuilt")
+        finally:
+            GogoHandler.moved = False
+
+
+if __name__ == "__main__":
+    latency = float(argv[1]) if len(argv) > 1 else 0.05
+    episodes = int(argv[2]) if len(argv) > 2 else 24
+
+    server, base_url = start_server(latency=latency, episodes=episodes, js_every=5)
+    print(f"{episodes} episodes, {latency * 1000:.0f} ms per request, every 5th download page needs JavaScript")
+    try:
+        link, timings = resolver(base_url).resolve("fixture show", 3)
+        assert link == expected(3), link
+        print(f"single episode: {sum(timings.values()):.2f}s")
+        print(gogo_http.stage_report(timings))
+
+        try:
+            resolver(base_url).resolve("fixture show", 5)
+            raise AssertionError("a JavaScript download page was accepted")
+        except gogo_http.NeedsBrowser as e:
+            print(f"episode 5 falls back to the browser: {e}")
+
+        for workers in (1, 4, 8):
+            start = time.perf_counter()
+            links, browser, timings = resolver(base_url, workers).resolve_batch("fixture show", f"1-{episodes}")
+            elapsed = time.perf_counter() - start
+            assert all(link == expected(ep) for ep, link in links.items())
+            assert browser == [ep for ep in range(1, episodes + 1) if ep % 5 == 0], browser
+            print(f"batch 1-{episodes}, {workers} worker(s): {elapsed:.2f}s, "
+                  f"{len(links)} over HTTP, {len(browser)} left for the browser")
+        print(gogo_http.stage_report(timings))
+        print()
+        bench_index(base_url, episodes)
+    finally:
+        server.shutdown()
@@ -0,0 +1,97 @@
+"""
+Several simulated players on one channel of the local HLS origin, each polling its playlist and
+fetching new segments like a player would: directly from the origin vs through hls_relay.py.
+Through the relay upstream traffic should stay at one copy however many players there are.
+Also checks the recording and the time-shift playlist.
+
+Usage: python benchmarks/bench_hls_relay.py [players] [seconds] [latency_seconds]
+"""
+from pathlib import Path
+from sys import argv
+from urllib.request import urlopen
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import hls_probe   # noqa: E402
+import hls_relay   # noqa: E402
+from hls_server import HlsHandler, start_server   # noqa: E402
+
+VARIANT = "720p"
+
+
+def player(playlist_url, seconds, stats):
+    """
+    Poll `playlist_url` every target/2 and download each segment once, starting at the live edge.
+    """
+    seen, deadline = set(), time.time() + seconds
+    while time.time() < deadline:
+        with urlopen(playlist_url, timeout=10) as response:
+            text = response.read().decode()
+            final_url = response.url
+        segments, _ = hls_probe.parse_media(text, final_url)
+        if not seen:
+            segments = segments[-hls_probe.LIVE_EDGE_SEGMENTS:]
+        for url, _ in segments:
+            if url not in seen:
+                seen.add(url)
+                start = time.perf_counter()
+                with urlopen(url, timeout=10) as response:
+                    stats["bytes"] += len(response.read())
+                stats["waits"].append(time.perf_counter() - start)
+        time.sleep(hls_probe.playlist_tag(text, "EXT-X-TARGETDURATION", 1) / 2)
+
+
+def watch(playlist_url, players, seconds):
+    stats = [{"bytes": 0, "waits": []} for _ in range(players)]
+    threads = [threading.Thread(target=player, args=(playlist_url, seconds, s)) for s in stats]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    waits = sorted(w for s in stats for w in s["waits"])
+    return sum(s["bytes"] for s in stats), waits[len(waits) // 2] if waits else 0
+
+
+if __name__ == "__main__":
+    players = int(argv[1]) if len(argv) > 1 else 8
+    seconds = float(argv[2]) if len(argv) > 2 else 6
+    latency = float(argv[3]) if len(argv) > 3 else 0.05
+
+    origin, base_url = start_server(latency=latency)
+    record_dir = tempfile.mkdtemp()
+    relay = hls_relay.Relay(lambda name: f"{base_url}/{name}/{VARIANT}/index.m3u8", record_dir=record_dir,
+                            record_limit=20, idle_timeout=5)
+    server = hls_relay.serve(relay, "127.0.0.1", 0)
+    relay_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        HlsHandler.requests = 0
+        served, median = watch(f"{base_url}/news/{VARIANT}/index.m3u8", players, seconds)
+        print(f"{players} players direct:      {HlsHandler.requests:4d} origin requests, "
+              f"{served / 1e6:6.1f} MB from origin, median segment wait {median * 1000:.0f} ms")
+
+        HlsHandler.requests = 0
+        served, median = watch(f"{relay_url}/news/live.m3u8", players, seconds)
+        status = relay.status()["news"]
+        print(f"{players} players via relay:   {HlsHandler.requests:4d} origin requests, "
+              f"{status['upstream_bytes'] / 1e6:6.1f} MB from origin, median segment wait {median * 1000:.0f} ms "
+              f"({served / 1e6:.1f} MB served locally, {status['clients']} client(s))")
+        assert status["upstream_bytes"] < served / (players - 1) if players > 1 else True, "relay refetched segments"
+
+        recording = os.path.join(record_dir, "news", "recording.m3u8")
+        recorded, _ = hls_probe.parse_media(open(recording).read(), recording)
+        with urlopen(f"{relay_url}/news/timeshift.m3u8", timeout=10) as response:
+            timeshift, _ = hls_probe.parse_media(response.read().decode(), response.url)
+        print(f"Recorded {len(recorded)} segments, time-shift playlist spans {sum(d for _, d in timeshift):.0f}s")
+        assert recorded and len(timeshift) >= len(recorded), "recording or time-shift playlist missing segments"
+        with urlopen(timeshift[0][0], timeout=10) as response:
+            assert response.read(), "oldest time-shift segment not served"
+    finally:
+        server.shutdown()
+        relay.stop()
+        origin.shutdown()
@@ -0,0 +1,61 @@
+"""
+Overhead of the instrument.py hooks the scripts call on their hot paths (a counter per downloaded chunk,
+a span per request), single-threaded and from several threads at once, plus a round trip through the
+JSON run report and the Prometheus endpoint.
+
+Usage: python benchmarks/bench_instrument.py [calls]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from sys import argv
+from urllib.request import urlopen
+import json
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from instrument import Metrics, instrumented, METRICS, serve_metrics   # noqa: E402
+
+
+def per_call(fn, calls, threads=1):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in pool.map(lambda _: [fn() for _ in range(calls // threads)], range(threads)):
+            pass
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def spanned(metrics):
+    with metrics.span("bench.span"):
+        pass
+
+
+if __name__ == "__main__":
+    calls = int(argv[1]) if len(argv) > 1 else 200_000
+
+    metrics = Metrics()
+    for threads in (1, 8):
+        count = per_call(lambda: metrics.count("bench.bytes", 262_144), calls, threads)
+        span = per_call(lambda: spanned(metrics), calls, threads)
+        # For scale: a 256 KiB chunk, counted once, takes ~200 µs to arrive even at 10 Gb/s
+        print(f"{threads} thread(s): count {count:.2f} µs/call, span {span:.2f} µs/call")
+    assert metrics.snapshot()["counters"]["bench.bytes"] == 2 * calls * 262_144, "counter lost updates"
+
+    report = Path(tempfile.mkdtemp()) / "run.json"
+    METRICS.reset()
+    with instrumented("bench", report=str(report)) as run:
+        with run.span("bench.outer"):
+            run.count("http.requests", 3)
+    data = json.loads(report.read_text())
+    print(f"Run report: {data['spans']['bench.outer']['count']} span, counters {data['counters']}, status {data['status']}")
+
+    server = serve_metrics(0)
+    try:
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            exposition = response.read().decode()
+        assert "scripts_http_requests_total 3" in exposition, exposition
+        print(f"Prometheus endpoint: {len(exposition.splitlines())} lines")
+    finally:
+        server.shutdown()
@@ -0,0 +1,70 @@
+"""
+Extract the club career table for a batch of players from the fixture server: one player at a time
+with a fresh connection each (the old script's way, minus re-running it per player), then
+concurrently over a pooled session with a cold cache, a warm cache (every page revalidated with a
+304), and after the pages change.
+
+Usage: python benchmarks/bench_player_wiki.py [players] [latency_seconds]
+"""
+from pathlib import Path
+from sys import argv
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import player_wiki   # noqa: E402
+from wiki_server import WikiHandler, start_server   # noqa: E402
+
+FIXTURE_PLAYERS = ("Player_One", "Player_Two", "Player_Three")
+# Matched against captions and header cells: Player_Three's stats table has no caption and isn't the
+# first table on its page, so neither the caption text nor a fixed index would find all three
+TABLE = "national cup"
+
+
+def timed(label, fn):
+    WikiHandler.requests = WikiHandler.not_modified = 0
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:32} {time.perf_counter() - start:6.2f}s  {WikiHandler.requests:3d} requests, "
+          f"{WikiHandler.not_modified:3d} answered 304")
+    return result
+
+
+if __name__ == "__main__":
+    count = int(argv[1]) if len(argv) > 1 else 24
+    latency = float(argv[2]) if len(argv) > 2 else 0.1
+
+    players = [f"{FIXTURE_PLAYERS[i % 3]}_{i}" for i in range(count)] + ["Nobody_Here"]
+    server, base_url = start_server(latency=latency)
+    try:
+        def one_at_a_time():
+            frames = []
+            for player in players:
+                response = requests.get(base_url + player, headers=player_wiki.HEADERS, timeout=15)
+                if response.ok:
+                    frames.append(player_wiki.player_table(player, response.text, TABLE))
+            return frames
+
+        serial = timed(f"{count} players one at a time", one_at_a_time)
+
+        cache = player_wiki.PageCache(tempfile.mkdtemp())
+        fetcher = player_wiki.WikiFetcher(base_url, cache=cache, workers=8)
+        cold, errors = timed("pooled, cold cache", lambda: player_wiki.player_tables(players, TABLE, fetcher))
+        warm, _ = timed("pooled, warm cache", lambda: player_wiki.player_tables(players, TABLE, fetcher))
+        WikiHandler.edited = True
+        edited, _ = timed("pooled, pages edited", lambda: player_wiki.player_tables(players, TABLE, fetcher))
+        WikiHandler.edited = False
+
+        print(f"{len(cold)} rows, {cold['player'].nunique()} players, failed: {', '.join(errors)}")
+        print(cold[cold["Season"] == "Career total"].drop(columns="Season").head(3).to_string(index=False))
+        assert len(cold) == sum(len(frame) for frame in serial) == len(warm) == len(edited)
+        assert list(errors) == ["Nobody_Here"], "missing page not reported"
+        assert fetcher.stats["not_modified"] == count, "warm cache pages were downloaded again"
+        assert "Placeholder Athletic" in set(cold["Club"]), "Player_Three's table not found"
+    finally:
+        server.shutdown()
@@ -0,0 +1,142 @@
+"""
+Benchmark the post-download processing pool (postprocess.py) against real media from the local media server.
+
+Test clips are generated with ffmpeg's lavfi sources (H.264 video, AAC audio), so ffmpeg and ffprobe
+must be on the PATH; the benchmark skips without them.
+
+1. Anime pipeline: download the episodes, then verify, tag and file them one by one, against the
+   pipeline handing each finished download to the pool while the next ones download.
+2. Download manager: items that pass are filed into the library, checksummed and archived; a truncated
+   file fails verification, is downloaded again and finally given up on, never reaching the archive.
+3. Merge: separate video and audio streams plus a WebP thumbnail become one tagged MP4 with cover art.
+
+Usage: python benchmarks/bench_postprocess.py [episodes] [seconds_per_clip] [bandwidth_per_connection]
+"""
+from pathlib import Path
+from sys import argv
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import anime_pipeline   # noqa: E402
+from download_manager import run_downloads   # noqa: E402
+from media_server import start_server   # noqa: E402
+import postprocess   # noqa: E402
+
+
+def clip(path, seconds, video=True, audio=True):
+    args = ["ffmpeg", "-v", "error", "-y"]
+    if video:
+        args += ["-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=25:duration={seconds}"]
+    if audio:
+        args += ["-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}"]
+    if video:
+        args += ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"]
+    if audio:
+        args += ["-c:a", "aac"]
+    subprocess.run(args + ["-movflags", "+faststart", path], check=True)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def library(folder):
+    return sorted(f for f in os.listdir(folder) if f.endswith(".mp4"))
+
+
+async def bench_pipeline(base_url, episodes):
+    downloader = anime_pipeline.BuiltinDownloader(connections=2)
+
+    async def resolve(ep):
+        return f"{base_url}/media/ep{ep}.mp4"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        _, timings = await anime_pipeline.run_pipeline(
+            episodes, resolve, downloader, os.path.join(tmp, ".incoming"), filename=lambda ep: f"ep{ep}.mp4")
+        downloaded = time.perf_counter() - start
+        for ep in episodes:
+            postprocess.process({"files": [os.path.join(tmp, ".incoming", f"ep{ep}.mp4")],
+                                 "destination": os.path.join(tmp, f"ep{ep}.mp4"), "metadata": {"track": ep}})
+        serial = time.perf_counter() - start
+        print(f"pipeline, then post   {serial:6.2f}s  (downloads {downloaded:.2f}s, post {serial - downloaded:.2f}s)  "
+              f"{len(library(tmp))}/{len(episodes)} filed")
+
+    with tempfile.TemporaryDirectory() as tmp, postprocess.PostProcessor() as pool:
+        results, timings = await anime_pipeline.run_pipeline(
+            episodes, resolve, downloader, tmp, filename=lambda ep: f"ep{ep}.mp4", postprocess=pool)
+        assert set(results.values()) == {"done"}, results
+        assert not os.listdir(os.path.join(tmp, ".incoming"))
+        print(f"pipeline with pool    {timings['wall']:6.2f}s  {len(library(tmp))}/{len(episodes)} filed  "
+              f"({serial / timings['wall']:.2f}x)")
+        print(anime_pipeline.pipeline_report(timings))
+        print(pool.report())
+
+
+def bench_download_manager(base_url, episodes):
+    urls = [f"{base_url}/media/ep{ep}.mp4" for ep in episodes] + [f"{base_url}/media/truncated.mp4"]
+    with tempfile.TemporaryDirectory() as tmp, postprocess.PostProcessor() as pool:
+        archive = os.path.join(tmp, "archive.txt")
+        ydl_opts = {"outtmpl": os.path.join(tmp, "%(title)s.%(ext)s"), "download_archive": archive,
+                    "quiet": True, "no_warnings": True, "noprogress": True}
+        start = time.perf_counter()
+        counts = run_downloads(urls, ydl_opts, jobs=2, max_attempts=2, backoff=0.1,
+                               queue_path=os.path.join(tmp, "queue.sqlite"), connections=2, postprocessor=pool)
+        elapsed = time.perf_counter() - start
+        with open(archive) as f:
+            archived = f.read().split("\n")[:-1]
+        checked = subprocess.run(["sha256sum", "-c", "--quiet", postprocess.MANIFEST], cwd=tmp).returncode == 0 \
+            if os.name != "nt" else None
+        print(f"download manager      {elapsed:6.2f}s  {counts}, {len(library(tmp))} filed, {len(archived)} archived, "
+              f"manifest {'verified' if checked else 'not checked' if checked is None else 'MISMATCH'}")
+        assert counts == {"done": len(episodes), "failed": 1}, counts
+        assert len(archived) == len(episodes) and "truncated.mp4" not in library(tmp)
+        print(pool.report())
+
+
+def bench_merge(seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        video, audio, thumbnail = (os.path.join(tmp, name) for name in ("v.mp4", "a.m4a", "thumb.webp"))
+        clip(video, seconds, audio=False)
+        clip(audio, seconds, video=False)
+        subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=320x180", "-frames:v", "1",
+                        thumbnail], check=True)
+        result = postprocess.process({"files": [video, audio], "thumbnail": thumbnail, "duration": seconds,
+                                      "destination": os.path.join(tmp, "Show", "ep1.mp4"),
+                                      "metadata": {"title": "Episode 1", "artist": "Fixture"}})
+        merged = postprocess.probe(result["path"])
+        print(f"merge                 {sum(result['timings'].values()):6.2f}s  {merged['video']} video + "
+              f"{merged['audio']} audio, {merged['duration']:.1f}s, CPU {result['cpu']:.2f}s  "
+              + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["timings"].items()))
+        assert merged["video"] == 1 and merged["audio"] == 1 and not os.path.exists(video)
+
+
+if __name__ == "__main__":
+    if not postprocess.available():
+        print("skipped: ffmpeg and ffprobe are needed to generate and check the test media")
+        exit(0)
+    n_episodes = int(argv[1]) if len(argv) > 1 else 6
+    seconds = int(argv[2]) if len(argv) > 2 else 20
+    bandwidth = int(argv[3]) if len(argv) > 3 else 2 * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = clip(os.path.join(tmp, "clip.mp4"), seconds)
+    # Cut short with the index at the front: the header still claims the full duration
+    media = {f"/media/ep{ep}.mp4": data for ep in range(1, n_episodes + 1)}
+    media["/media/truncated.mp4"] = data[:len(data) * 2 // 3]
+    episodes = list(range(1, n_episodes + 1))
+    print(f"{n_episodes} clips of {seconds}s ({len(data) / 2 ** 20:.1f} MiB) at {bandwidth / 2 ** 20:.1f} MiB/s "
+          f"per connection")
+
+    server, base_url = start_server(latency=0.01, bandwidth=bandwidth, files=media)
+    try:
+        asyncio.run(bench_pipeline(base_url, episodes))
+        bench_download_manager(base_url, episodes)
+        bench_merge(seconds)
+    finally:
+        server.shutdown()
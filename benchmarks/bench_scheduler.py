@@ -0,0 +1,112 @@
+"""
+Check the request scheduler against stand-ins that throttle.
+
+1. gogo_http against the fixture server answering 429 (Retry-After: 1) beyond 30 requests/s or 6 requests
+   in flight: a 48-episode batch with 16 workers, first sent straight through (no pacing, no retries),
+   then through an adaptive Scheduler. Unscheduled, throttled episodes drop to the browser fallback;
+   scheduled, every episode resolves.
+2. yt_scraper against FakeYoutubeDL failing every 7th request with yt-dlp's "HTTP Error 429": every
+   channel is saved, where one failure used to end the run.
+3. The circuit breaker against a port nobody listens on: after the threshold, calls fail at once
+   without touching the network.
+
+Usage: python benchmarks/bench_scheduler.py [latency_seconds]
+"""
+from pathlib import Path
+from sys import argv
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_youtube import FakeYoutubeDL   # noqa: E402
+from gogo_server import GogoHandler, start_server   # noqa: E402
+import gogo_http   # noqa: E402
+from scheduler import SCHEDULER, CircuitOpen, Scheduler   # noqa: E402
+from yt_scraper import fetch_channels_to_workbook   # noqa: E402
+
+EPISODES = 48
+
+
+def bench_gogo(latency):
+    unscheduled = Scheduler(rate=None, concurrency=1000, max_concurrency=1000, attempts=1, failure_threshold=10 ** 6)
+    for name, scheduler in (("unscheduled", unscheduled), ("scheduled", Scheduler())):
+        server, base_url = start_server(latency=latency, episodes=EPISODES, rate_limit=30, burst=10, max_in_flight=6)
+        try:
+            resolver = gogo_http.HttpResolver(base_url, ajax_url=base_url + "ajax/load-list-episode", workers=16,
+                                              scheduler=scheduler)
+            requests, throttled = GogoHandler.requests, GogoHandler.throttled
+            start = time.perf_counter()
+            try:
+                links, browser, _ = resolver.resolve_batch("Fixture Show", f"1-{EPISODES}")
+            except gogo_http.requests.RequestException as e:   # the search or episode list itself was refused
+                links, browser = {}, [f"all ({e})"]
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+        print(f"gogo {name:12} {elapsed:6.2f}s  {len(links):2}/{EPISODES} resolved, {len(browser):2} sent to the browser, "
+              f"{GogoHandler.requests - requests:3} requests, {GogoHandler.throttled - throttled:3} answered 429")
+        if scheduler is not unscheduled:
+            assert len(links) == EPISODES, browser
+            print("   " + scheduler.report())
+
+
+def bench_scraper(latency):
+    FakeYoutubeDL.latency, FakeYoutubeDL.videos_per_channel, FakeYoutubeDL.throttle_every = latency, 5, 7
+    channels = {f"Channel {i}": (f"https://www.youtube.com/@fake{i}/videos", 5) for i in range(8)}
+    attempts = SCHEDULER.attempts
+    try:
+        for name, tries in (("no retries", 1), ("scheduled", attempts)):
+            SCHEDULER.attempts = tries
+            with tempfile.TemporaryDirectory() as tmp:
+                throttled = FakeYoutubeDL.throttled
+                start = time.perf_counter()
+                results = fetch_channels_to_workbook(
+                    channels, os.path.join(tmp, "channels.xlsx"), ydl_factory=FakeYoutubeDL,
+                    store_path=os.path.join(tmp, "videos.sqlite"), cache_path=None)
+                elapsed = time.perf_counter() - start
+            saved = sum(1 for videos in results.values() if videos)
+            print(f"scrape {name:10} {elapsed:6.2f}s  {saved}/{len(channels)} channels saved, "
+                  f"{FakeYoutubeDL.throttled - throttled} requests answered 429")
+        assert saved == len(channels)
+    finally:
+        SCHEDULER.attempts, FakeYoutubeDL.throttle_every = attempts, 0
+
+
+def bench_breaker():
+    with socket.socket() as s:   # a port that was free a moment ago: connections are refused
+        s.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{s.getsockname()[1]}/"
+    scheduler = Scheduler(attempts=1, failure_threshold=5, reset_after=60)
+    attempts = []
+
+    def request():
+        attempts.append(url)
+        socket.create_connection(("127.0.0.1", int(url.rsplit(":", 1)[1].strip("/"))), timeout=1).close()
+
+    refused = rejected = 0
+    start = time.perf_counter()
+    for _ in range(50):
+        try:
+            scheduler.call(url, request)
+        except CircuitOpen:
+            rejected += 1
+        except OSError:
+            refused += 1
+    elapsed = time.perf_counter() - start
+    print(f"breaker  50 calls in {elapsed:.3f}s: {len(attempts)} reached the network ({refused} refused), "
+          f"{rejected} rejected with the circuit open")
+    assert len(attempts) == 5 and rejected == 45
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    latency = float(argv[1]) if len(argv) > 1 else 0.02
+    bench_gogo(latency)
+    bench_scraper(latency)
+    bench_breaker()
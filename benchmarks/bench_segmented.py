@@ -0,0 +1,50 @@
+"""
+Measure segmented-download throughput against the local media server throttled per connection.
+
+Usage: python benchmarks/bench_segmented.py [size_bytes] [bandwidth_per_connection]
+"""
+from pathlib import Path
+from sys import argv
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import segmented   # noqa: E402
+from media_server import media_bytes, start_server   # noqa: E402
+
+
+if __name__ == "__main__":
+    size = int(argv[1]) if len(argv) > 1 else 16 * 1024 * 1024
+    bandwidth = int(argv[2]) if len(argv) > 2 else 2 * 1024 * 1024
+
+    server, base_url = start_server(latency=0.02, bandwidth=bandwidth)
+    url = f"{base_url}/media/big.mp4?size={size}"
+    digest = hashlib.sha256(media_bytes("/media/big.mp4", size)).hexdigest()
+
+    print(f"{size / 2 ** 20:.0f} MiB file, {bandwidth / 2 ** 20:.1f} MiB/s per connection")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for connections in (1, 2, 4, 8):
+                path = os.path.join(tmp, f"big{connections}.mp4")
+                start = time.perf_counter()
+                segmented.download(url, path, connections, sha256=digest)
+                elapsed = time.perf_counter() - start
+                print(f"{connections} connection(s)  {elapsed:6.2f}s  {size / elapsed / 2 ** 20:6.1f} MiB/s")
+
+            # Resume: keep half of each segment from an earlier attempt and finish the rest
+            path = os.path.join(tmp, "resumed.mp4")
+            step = -(-size // 8)
+            data = media_bytes("/media/big.mp4", size)
+            for i, start in enumerate(range(0, size, step)):
+                with open(f"{path}.part{i}", "wb") as f:
+                    f.write(data[start:start + step // 2])
+            start = time.perf_counter()
+            segmented.download(url, path, 8, sha256=digest)
+            print(f"resume, 8 connections  {time.perf_counter() - start:6.2f}s  (half of every segment already on disk)")
+    finally:
+        server.shutdown()
@@ -0,0 +1,68 @@
+"""
+Compare dedupe and append time of the Excel sheet against the SQLite video store.
+
+Usage: python benchmarks/bench_video_store.py [sizes...]   (default: 1000 10000 100000)
+"""
+from pathlib import Path
+from sys import argv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd   # noqa: E402
+
+from video_store import VideoStore   # noqa: E402
+from pandas_workbook import WorkbookSession   # noqa: E402
+
+NEW_VIDEOS = 5   # a typical refresh checks a handful of ids and appends a few
+
+
+def videos(start, count):
+    return [{"video_id": f"vid{i:08d}", "title": f"Video {i}", "upload_date": "2024-01-01", "duration": 754}
+            for i in range(start, start + count)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench(size, tmp):
+    output_excel = os.path.join(tmp, f"bench_{size}.xlsx")
+    store_path = os.path.join(tmp, f"bench_{size}.sqlite")
+
+    with VideoStore(store_path) as store:
+        store.add("Channel", videos(0, size))
+        store.export(output_excel)
+        candidates = [f"vid{i:08d}" for i in range(size - NEW_VIDEOS, size + NEW_VIDEOS)]
+        new = videos(size, NEW_VIDEOS)
+
+        # Excel: the old path read the whole sheet to build a set of URLs, then rewrote it
+        def excel_dedupe():
+            existing_urls = set(pd.read_excel(output_excel, sheet_name="Channel")["URL"])
+            return [c for c in candidates if f"https://www.youtube.com/watch?v={c}" not in existing_urls]
+
+        def excel_append():
+            session = WorkbookSession(output_excel)
+            session.append("Channel", [{"Title": v["title"], "URL": v["video_id"]} for v in new])
+            session.save()
+
+        results = {
+            "excel dedupe": timed(excel_dedupe),
+            "excel append": timed(excel_append),
+            "store dedupe": timed(lambda: store.known_ids(candidates)),
+            "store append": timed(lambda: store.add("Channel", new)),
+        }
+
+    print(f"{size:>7} rows  " + "  ".join(f"{name} {seconds * 1000:9.1f} ms" for name, seconds in results.items()))
+
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in argv[1:]] or [1000, 10000, 100000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            bench(size, tmp)
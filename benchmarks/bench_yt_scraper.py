@@ -0,0 +1,48 @@
+"""
+Benchmark the concurrent channel refresh against a fake extractor with artificial latency.
+
+Usage: python benchmarks/bench_yt_scraper.py [channels] [videos_per_channel] [latency_seconds]
+"""
+from pathlib import Path
+from sys import argv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_youtube import FakeYoutubeDL   # noqa: E402
+from yt_scraper import fetch_channels_to_workbook   # noqa: E402
+
+
+def bench(channels, label, tmp, **kwargs):
+    FakeYoutubeDL.requests = 0
+    start = time.perf_counter()
+    fetch_channels_to_workbook(channels, output_excel=os.path.join(tmp, "bench.xlsx"), ydl_factory=FakeYoutubeDL,
+                               store_path=os.path.join(tmp, "bench.sqlite"),
+                               cache_path=os.path.join(tmp, "cache.sqlite"), **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed:7.2f}s  {FakeYoutubeDL.requests:5d} requests")
+    return elapsed
+
+
+if __name__ == "__main__":
+    n_channels = int(argv[1]) if len(argv) > 1 else 16
+    FakeYoutubeDL.videos_per_channel = int(argv[2]) if len(argv) > 2 else 5
+    FakeYoutubeDL.latency = float(argv[3]) if len(argv) > 3 else 0.05
+
+    channels = {f"Channel {i}": (f"https://www.youtube.com/@channel{i}/videos", FakeYoutubeDL.videos_per_channel)
+                for i in range(n_channels)}
+    # A single channel needs at least one listing call followed by one round of video lookups
+    floor = FakeYoutubeDL.latency * 2
+
+    print(f"{n_channels} channels x {FakeYoutubeDL.videos_per_channel} videos, {FakeYoutubeDL.latency * 1000:.0f} ms per call")
+    with tempfile.TemporaryDirectory() as tmp:
+        serial = bench(channels, "serial, full listing", tmp, max_workers=1, per_channel_workers=1, incremental=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        concurrent = bench(channels, "concurrent, incremental", tmp, max_workers=32,
+                           per_channel_workers=FakeYoutubeDL.videos_per_channel)
+        bench(channels, "no-change refresh", tmp, max_workers=32)
+    print(f"speedup      {serial / concurrent:7.1f}x (lower bound per channel: {floor:.2f}s)")
@@ -0,0 +1,63 @@
+"""
+Stand-in for yt-dlp's YoutubeDL, for exercising yt_scraper.py without the network: channel listings
+and video lookups are answered from generated data after a fixed delay per request. With
+`throttle_every`, every n-th request fails the way yt-dlp reports a 429 from YouTube.
+"""
+import threading
+import time
+
+
+class FakeYoutubeDL:
+    """
+    Stand-in for YoutubeDL that answers channel and video lookups after a fixed delay per request.
+
+    Channel listings are served in pages of `page_size` entries; with process=False the entries are a
+    lazy generator, like yt-dlp's, so each page is only "requested" when it is consumed.
+    """
+    latency = 0.05
+    videos_per_channel = 5
+    channel_size = 300   # videos in each fake channel
+    page_size = 30
+    throttle_every = 0   # every n-th request raises "HTTP Error 429: Too Many Requests"
+    requests = 0
+    throttled = 0
+    _lock = threading.Lock()
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @classmethod
+    def _request(cls):
+        with cls._lock:
+            cls.requests += 1
+            throttled = cls.throttle_every and cls.requests % cls.throttle_every == 0
+            cls.throttled += bool(throttled)
+        time.sleep(cls.latency)
+        if throttled:
+            from yt_dlp.utils import DownloadError
+            raise DownloadError("ERROR: [youtube] Unable to download API page: HTTP Error 429: Too Many Requests")
+
+    def _pages(self, channel):
+        for start in range(0, self.channel_size, self.page_size):
+            if start:   # the first page comes with the extract_info call, like yt-dlp's channel tab
+                self._request()
+            # Like real flat listings: title and duration always, approximate dates only for recent uploads
+            yield from ({"id": f"{channel}-{i}", "title": f"Video {channel}-{i}", "duration": 754.0,
+                         "timestamp": time.time() - 86400 * (i * 3)}
+                        for i in range(start, min(start + self.page_size, self.channel_size)))
+
+    def extract_info(self, url, download=False, process=True):
+        if "watch?v=" in url:
+            self._request()
+            video_id = url.split("watch?v=", 1)[1]
+            return {"id": video_id, "title": f"Video {video_id}", "upload_date": "20240101", "duration": 754}
+        channel = url.rstrip("/").split("/")[-2]
+        self._request()
+        entries = self._pages(channel)
+        return {"_type": "playlist", "entries": entries if not process else list(entries)}
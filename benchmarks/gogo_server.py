@@ -0,0 +1,143 @@
+"""
+Local HTTP server replaying saved GOGOAnime pages (benchmarks/fixtures/gogo), for exercising gogo_http.py
+without the network.
+
+Routes mirror the live site: /search.html, /category/<show>, /ajax/load-list-episode, /<show>-episode-<n>
+and /download?ep=<n>. Every `js_every`-th episode gets the JavaScript-rendered download page, which the
+HTTP resolver has to hand over to the browser. Setting `GogoHandler.moved` renames the episode pages,
+so URLs indexed before the move 404 like they do when the site reshuffles its slugs.
+
+Throttling can be injected like a rate-limiting CDN would: beyond `rate_limit` requests per second
+(with bursts of `burst`), or beyond `max_in_flight` requests at once, requests get a 429 with a
+Retry-After of `retry_after` seconds.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import re
+import threading
+import time
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "gogo"
+EPISODE_ITEM = ('<li><a href=" /{slug}-episode-{n}"><div class="name"><span>EP</span> {n}</div>'
+                '<div class="vien"></div><div class="cate">SUB</div></a></li>')
+
+
+def fixture(name, **values):
+    html = (FIXTURES / name).read_text(encoding="utf-8")
+    for key, value in values.items():
+        html = html.replace("{" + key + "}", str(value))
+    return html
+
+
+class GogoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # headers and body go out in separate writes
+    latency = 0.0     # seconds added to every request, standing in for the round trip to the site
+    episodes = 24
+    js_every = 0      # every n-th episode's download page needs JavaScript
+    moved = False     # serve the episode pages under a new slug
+    rate_limit = None     # requests per second before 429s, None for no limit
+    burst = 10
+    max_in_flight = None  # concurrent requests before 429s, None for no limit
+    retry_after = "1"
+    requests = 0
+    throttled = 0
+    in_flight = 0
+    _tokens = None
+    _updated = 0.0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _throttle(self):
+        """
+        Count the request and decide whether it gets a 429 instead of a page.
+        """
+        with GogoHandler._lock:
+            GogoHandler.requests += 1
+            throttled = self.max_in_flight is not None and GogoHandler.in_flight >= self.max_in_flight
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                tokens = self.burst if GogoHandler._tokens is None else GogoHandler._tokens
+                tokens = min(self.burst, tokens + (now - GogoHandler._updated) * self.rate_limit)
+                GogoHandler._updated = now
+                if tokens < 1:
+                    throttled = True
+                elif not throttled:
+                    tokens -= 1
+                GogoHandler._tokens = tokens
+            if throttled:
+                GogoHandler.throttled += 1
+            else:
+                GogoHandler.in_flight += 1
+        return throttled
+
+    def do_GET(self):
+        if self._throttle():
+            time.sleep(self.latency)
+            self.send_response(429)
+            self.send_header("Retry-After", self.retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            self._page()
+        finally:
+            with GogoHandler._lock:
+                GogoHandler.in_flight -= 1
+
+    def _page(self):
+        time.sleep(self.latency)
+
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        slug = "fixture-show-v2" if GogoHandler.moved else "fixture-show"
+        episode = re.fullmatch(rf"/{slug}-episode-(\d+)", parsed.path)
+
+        if parsed.path == "/search.html":
+            html = fixture("search.html")
+        elif parsed.path.startswith("/category/"):
+            html = fixture("category.html", episodes=self.episodes)
+        elif parsed.path == "/ajax/load-list-episode":
+            last = min(int(query.get("ep_end", [self.episodes])[0]), self.episodes)
+            items = "\n".join(EPISODE_ITEM.format(slug=slug, n=n) for n in range(last, 0, -1))   # newest first, like the site
+            html = fixture("episode_list.html", items=items)
+        elif episode and 1 <= int(episode.group(1)) <= self.episodes:
+            html = fixture("episode.html", episode=episode.group(1))
+        elif parsed.path == "/download":
+            n = int(query["ep"][0])
+            js = self.js_every and n % self.js_every == 0
+            html = fixture("download_js.html" if js else "download.html", episode=n)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = html.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(latency=0.0, episodes=24, js_every=0, rate_limit=None, burst=10, max_in_flight=None,
+                 retry_after="1"):
+    """
+    Start the fixture server on a free localhost port in a background thread (throttling options: see
+    the module docstring).
+
+    Returns:
+        tuple: (server, base URL ending with '/'). Call server.shutdown() when done.
+    """
+    handler = type("Handler", (GogoHandler,), {"latency": latency, "episodes": episodes, "js_every": js_every,
+                                               "rate_limit": rate_limit, "burst": burst,
+                                               "max_in_flight": max_in_flight, "retry_after": retry_after})
+    GogoHandler._tokens = None   # a fresh server starts with a full bucket
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
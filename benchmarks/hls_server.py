@@ -0,0 +1,119 @@
+"""
+Local live-HLS origin for exercising hls_probe.py and tv.py without the network.
+
+Every channel has a master playlist with the VARIANTS below and a live media playlist per variant,
+a sliding window of WINDOW segments that advances with the clock. Segments are deterministic bytes
+sized to their variant's bitrate. Responses can be delayed and each connection throttled, like
+media_server.py, or every connection can share one throttled link, like a home connection. Special channels: "dead" answers 404 everywhere; "flaky" has a working master
+playlist but its top variant's media playlist 404s.
+
+    /<channel>/master.m3u8
+    /<channel>/<height>p/index.m3u8
+    /<channel>/<height>p/<sequence>.ts
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import re
+import threading
+import time
+
+from media_server import media_bytes
+
+CHUNK = 16 * 1024
+SEGMENT_SECONDS = 1
+WINDOW = 6
+
+# (height, bits per second)
+VARIANTS = ((360, 800_000), (480, 1_400_000), (720, 2_800_000), (1080, 5_000_000))
+
+
+def master_playlist():
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for height, bandwidth in VARIANTS:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={height * 16 // 9}x{height},'
+                     f'CODECS="avc1.4d401f,mp4a.40.2"')
+        lines.append(f"{height}p/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def media_playlist(now):
+    newest = int(now // SEGMENT_SECONDS)
+    first = newest - WINDOW + 1
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}",
+             f"#EXT-X-MEDIA-SEQUENCE:{first}"]
+    for sequence in range(first, newest + 1):
+        lines += [f"#EXTINF:{SEGMENT_SECONDS:.3f},", f"{sequence}.ts"]
+    return "\n".join(lines) + "\n"
+
+
+class HlsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0          # seconds added to every request
+    bandwidth = None       # bytes/second per connection, None for unthrottled
+    link = None            # bytes/second shared by all connections, None for unthrottled
+    requests = 0
+    _link_free = 0.0       # when the shared link has sent everything queued on it so far
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with HlsHandler._lock:
+            HlsHandler.requests += 1
+        time.sleep(self.latency)
+
+        match = re.fullmatch(r"/(\w+)/(?:master\.m3u8|(\d+)p/(index\.m3u8|(\d+)\.ts))", self.path.split("?")[0])
+        channel = match and match.group(1)
+        heights = {height: bandwidth for height, bandwidth in VARIANTS}
+        height = int(match.group(2)) if match and match.group(2) else None
+
+        if not match or channel == "dead" or (height is not None and height not in heights):
+            return self._send(404, b"", "text/plain")
+        if height is None:
+            return self._send(200, master_playlist().encode(), "application/vnd.apple.mpegurl")
+        if channel == "flaky" and height == VARIANTS[-1][0] and match.group(3) == "index.m3u8":
+            return self._send(404, b"", "text/plain")
+        if match.group(3) == "index.m3u8":
+            return self._send(200, media_playlist(time.time()).encode(), "application/vnd.apple.mpegurl")
+        size = heights[height] * SEGMENT_SECONDS // 8
+        return self._send(200, media_bytes(self.path, size), "video/mp2t")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            for offset in range(0, len(body), CHUNK):
+                chunk = body[offset:offset + CHUNK]
+                self.wfile.write(chunk)
+                if self.bandwidth:
+                    time.sleep(len(chunk) / self.bandwidth)
+                if self.link:
+                    # Queue the chunk behind whatever the other connections already sent
+                    with HlsHandler._lock:
+                        start = max(time.perf_counter(), type(self)._link_free)
+                        type(self)._link_free = start + len(chunk) / self.link
+                        done = type(self)._link_free
+                    time.sleep(max(0.0, done - time.perf_counter()))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class HlsServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # probes open a connection per variant at once; the default backlog of 5 drops SYNs
+
+
+def start_server(latency=0.0, bandwidth=None, link=None):
+    """
+    Start the HLS origin on a free localhost port in a background thread.
+
+    Returns:
+        tuple: (server, base URL). Call server.shutdown() when done.
+    """
+    handler = type("Handler", (HlsHandler,), {"latency": latency, "bandwidth": bandwidth, "link": link})
+    server = HlsServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
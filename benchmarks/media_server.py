@@ -0,0 +1,103 @@
+"""
+Local HTTP server serving fake media files, for exercising the downloaders without the network.
+
+Files are generated on the fly: /media/<name>.mp4?size=<bytes> returns `size` deterministic bytes,
+unless the path is one of the handler's `files` (path -> bytes), served as is, e.g. real media.
+The server honours Range requests, can add a fixed latency per request and can throttle each
+connection to a given bandwidth.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import hashlib
+import re
+import threading
+import time
+
+CHUNK = 64 * 1024
+
+
+def media_bytes(name, size):
+    """
+    Deterministic content for a fake file, so downloads can be checked byte for byte.
+    """
+    seed = hashlib.sha256(name.encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0          # seconds added to every request
+    bandwidth = None       # bytes/second per connection, None for unthrottled
+    fail_every = 0         # every n-th request gets a 503, to exercise retries
+    files = {}             # path -> fixed content, served instead of generated bytes
+    requests = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body):
+        with MediaHandler._lock:
+            MediaHandler.requests += 1
+            count = MediaHandler.requests
+        time.sleep(self.latency)
+
+        if self.fail_every and count % self.fail_every == 0:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        parsed = urlparse(self.path)
+        if parsed.path in self.files:
+            data = self.files[parsed.path]
+            size = len(data)
+        else:
+            size = int(parse_qs(parsed.query).get("size", ["1048576"])[0])
+            data = media_bytes(parsed.path, size)
+
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1) or 0)
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+
+        try:
+            for offset in range(start, end + 1, CHUNK):
+                chunk = data[offset:min(offset + CHUNK, end + 1)]
+                self.wfile.write(chunk)
+                if self.bandwidth:
+                    time.sleep(len(chunk) / self.bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # clients such as yt-dlp's generic extractor hang up after sniffing the first bytes
+
+
+def start_server(latency=0.0, bandwidth=None, fail_every=0, files=None):
+    """
+    Start the media server on a free localhost port in a background thread.
+
+    Returns:
+        tuple: (server, base URL). Call server.shutdown() when done.
+    """
+    handler = type("Handler", (MediaHandler,), {"latency": latency, "bandwidth": bandwidth, "fail_every": fail_every,
+                                                "files": files or {}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
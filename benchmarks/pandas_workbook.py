@@ -0,0 +1,98 @@
+import pandas as pd
+import os
+import shutil
+import tempfile
+
+
+class WorkbookSession:
+    """
+    Loads every sheet of an Excel workbook once and keeps them in memory as DataFrames.
+
+    Updates only touch the in-memory copy. `save()` writes the file once, re-serializing only the sheets
+    that changed, and replaces the workbook atomically (temp file + rename) so a crash mid-write never
+    leaves a truncated workbook behind. Used as a context manager, it saves on a clean exit.
+
+    This is how the scraper used to write all_channels.xlsx, before exports streamed from the video store
+    (catalog_export.py); bench_export.py and bench_video_store.py measure against it as the pandas baseline.
+
+    Args:
+        path (str): Excel workbook path. It does not need to exist yet.
+        load (bool): Read the existing sheets. Pass False when only replacing sheets, to skip the read.
+    """
+
+    def __init__(self, path, load=True):
+        self.path = path
+        self.sheets = pd.read_excel(path, sheet_name=None) if load and os.path.exists(path) else {}
+        self.dirty = set()   # names of sheets changed since loading
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.save()
+        return False
+
+    def get(self, sheet_name, columns=None):
+        """
+        Return a sheet's DataFrame, or an empty one with `columns` if the sheet doesn't exist.
+        """
+        if sheet_name in self.sheets:
+            return self.sheets[sheet_name]
+        return pd.DataFrame(columns=columns)
+
+    def replace(self, sheet_name, df):
+        """
+        Replace (or create) a sheet with `df`.
+        """
+        self.sheets[sheet_name] = df
+        self.dirty.add(sheet_name)
+
+    def append(self, sheet_name, rows, columns=None):
+        """
+        Append rows (a list of dicts or a DataFrame) to a sheet. Returns the sheet's new DataFrame.
+        """
+        df_new = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, columns=columns)
+        if len(df_new) == 0:
+            return self.get(sheet_name, columns)
+
+        df_existing = self.sheets.get(sheet_name)
+        if df_existing is None or len(df_existing) == 0:
+            df_final = df_new
+        else:
+            df_final = pd.concat([df_existing, df_new], ignore_index=True)
+
+        self.replace(sheet_name, df_final)
+        return df_final
+
+    def save(self):
+        """
+        Write the changed sheets to disk in one pass. Returns True if the file was written.
+        """
+        if not self.dirty:
+            return False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=directory)   # same directory so the rename is atomic
+        os.close(fd)
+
+        try:
+            if os.path.exists(self.path):
+                # Start from the current file so unchanged sheets are carried over as-is
+                shutil.copyfile(self.path, tmp_path)
+                writer = pd.ExcelWriter(tmp_path, mode='a', engine='openpyxl', if_sheet_exists='replace')
+            else:
+                writer = pd.ExcelWriter(tmp_path, mode='w', engine='openpyxl')
+
+            with writer:
+                for sheet_name in self.sheets:   # keep the workbook's sheet order
+                    if sheet_name in self.dirty:
+                        self.sheets[sheet_name].to_excel(writer, sheet_name=sheet_name, index=False)
+
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self.dirty.clear()
+        return True
@@ -0,0 +1,473 @@
+"""
+Offline benchmark suite: every script's hot path against the local stand-ins, with results saved so
+versions can be compared.
+
+Stand-ins: fake_youtube.FakeYoutubeDL for channel listings and video lookups, gogo_server.py and
+wiki_server.py replaying recorded HTML fixtures, hls_server.py as a synthetic live-HLS origin and
+media_server.py for downloadable files; all take a per-request latency. Each case runs `--repeat`
+times and keeps the median of every metric, plus the instrument.py counters of its last run.
+Browser cases are skipped when Playwright or Selenium (and their browser) aren't available, and the
+post-processing case when ffmpeg isn't.
+
+Usage:
+    python benchmarks/suite.py run [case ...] [--repeat N] [--latency SECONDS] [--no-save]
+    python benchmarks/suite.py compare [old.json new.json] [--threshold PERCENT]
+    python benchmarks/suite.py list
+
+`run` saves to benchmarks/results/<date>-<git revision>.json; `compare` defaults to the two newest
+results and exits with 1 if any metric got worse by more than the threshold.
+"""
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+sys.path.insert(0, str(HERE))
+
+from instrument import METRICS   # noqa: E402
+
+RESULTS = HERE / "results"
+
+
+class Skip(Exception):
+    """
+    Raised by a case that can't run here, e.g. because a browser driver is missing.
+    """
+
+
+def metric(value, unit, better="lower"):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# --- Cases: each takes the per-request latency and returns {metric name: metric(...)} ------------------
+
+def case_scrape(latency):
+    """
+    fetch_channel_to_sheet for one channel, then 8 channels at once, then a refresh with nothing new.
+    """
+    from fake_youtube import FakeYoutubeDL
+    from yt_scraper import fetch_channel_to_sheet, fetch_channels_to_workbook
+
+    FakeYoutubeDL.latency, FakeYoutubeDL.videos_per_channel = latency, 5
+    channels = {f"Channel {i}": (f"https://www.youtube.com/@fake{i}/videos", 5) for i in range(8)}
+    with tempfile.TemporaryDirectory() as tmp:
+        options = {"ydl_factory": FakeYoutubeDL, "store_path": os.path.join(tmp, "videos.sqlite"),
+                   "cache_path": os.path.join(tmp, "cache.sqlite")}
+        workbook = os.path.join(tmp, "channels.xlsx")
+        FakeYoutubeDL.requests = 0
+        _, one = timed(fetch_channel_to_sheet, "https://www.youtube.com/@single/videos", "Single", 5, workbook, **options)
+        one_requests = FakeYoutubeDL.requests
+        FakeYoutubeDL.requests = 0
+        _, many = timed(fetch_channels_to_workbook, channels, workbook, **options)
+        many_requests = FakeYoutubeDL.requests
+        FakeYoutubeDL.requests = 0
+        _, refresh = timed(fetch_channels_to_workbook, channels, workbook, **options)
+    return {
+        "one_channel": metric(one, "s"),
+        "one_channel_requests": metric(one_requests, "requests"),
+        "eight_channels": metric(many, "s"),
+        "eight_channels_requests": metric(many_requests, "requests"),
+        "refresh_unchanged": metric(refresh, "s"),
+        "refresh_requests": metric(FakeYoutubeDL.requests, "requests"),
+    }
+
+
+def case_anime_http(latency):
+    """
+    The browserless resolver: one episode, then a 24-episode batch, with no index.
+    """
+    import gogo_http
+    from gogo_server import GogoHandler, start_server
+
+    server, base_url = start_server(latency=latency, episodes=24)
+    try:
+        resolver = gogo_http.HttpResolver(base_url, ajax_url=base_url + "ajax/load-list-episode", workers=8)
+        before = GogoHandler.requests
+        (link, _), single = timed(resolver.resolve, "Fixture Show", 5)
+        single_requests = GogoHandler.requests - before
+        before = GogoHandler.requests
+        (links, browser, _), batch = timed(resolver.resolve_batch, "Fixture Show", "1-24")
+        batch_requests = GogoHandler.requests - before
+    finally:
+        server.shutdown()
+    assert link and len(links) == 24 and not browser, "resolver missed episodes"
+    return {
+        "single_episode": metric(single, "s"),
+        "single_requests": metric(single_requests, "requests"),
+        "batch_24": metric(batch, "s"),
+        "batch_requests": metric(batch_requests, "requests"),
+        "episodes_per_second": metric(24 / batch, "ep/s", "higher"),
+    }
+
+
+def case_anime_playwright(latency):
+    """
+    anime.py's browser path (gogo.py): launch, home page, then an 8-episode batch in tabs.
+    """
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        raise Skip("playwright is not installed")
+    import gogo
+    import navigation
+    from gogo_server import start_server
+
+    async def run(base_url):
+        async with async_playwright() as playwright:
+            start = time.perf_counter()
+            try:
+                browser = await playwright.chromium.launch(headless=True)
+            except Exception as e:
+                raise Skip(f"no browser for Playwright: {e}")
+            context = await browser.new_context()
+            await navigation.block_requests(context)
+            page = await context.new_page()
+            launch = time.perf_counter() - start
+            try:
+                await gogo.open_home(page)
+                start = time.perf_counter()
+                links, _ = await gogo.resolve_batch(page, "Fixture Show", "1-8")
+                return launch, time.perf_counter() - start, links
+            finally:
+                await browser.close()
+
+    server, base_url = start_server(latency=latency, episodes=24)
+    home, gogo.BASE_URL = gogo.BASE_URL, base_url
+    try:
+        launch, batch, links = asyncio.run(run(base_url))
+    finally:
+        gogo.BASE_URL = home
+        server.shutdown()
+    assert all(links.values()), "browser resolver missed episodes"
+    return {"launch": metric(launch, "s"), "batch_8": metric(batch, "s")}
+
+
+def case_anime_selenium(latency):
+    """
+    gogo_anime.py's path: Edge through Selenium, the show, then four episodes one after another.
+    """
+    try:
+        import gogo_anime
+    except ImportError:
+        raise Skip("selenium is not installed")
+    import gogo
+    from gogo_server import start_server
+
+    try:
+        driver, launch = timed(gogo_anime.start_driver)
+    except Exception as e:
+        raise Skip(f"no Edge driver for Selenium: {e}")
+    server, base_url = start_server(latency=latency, episodes=24)
+    home, gogo.BASE_URL = gogo.BASE_URL, base_url
+    try:
+        urls, show = timed(gogo_anime.open_show, driver, "Fixture Show")
+        links, episodes = timed(lambda: [gogo_anime.episode_link(driver, url) for url in urls[:4]])
+    finally:
+        gogo.BASE_URL = home
+        driver.quit()
+        server.shutdown()
+    assert all(links), "Selenium resolver missed episodes"
+    return {"launch": metric(launch, "s"), "show": metric(show, "s"), "episode": metric(episodes / 4, "s")}
+
+
+def case_pipeline(latency):
+    """
+    The anime download pipeline: 6 episodes, each resolved in 0.3s and downloaded as 2 MiB over 4 connections.
+    """
+    import anime_pipeline
+    from bench_anime_pipeline import fake_resolver
+    from media_server import start_server
+
+    server, base_url = start_server(latency=latency, bandwidth=2 * 2 ** 20)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            results, timings = asyncio.run(anime_pipeline.run_pipeline(
+                list(range(1, 7)), fake_resolver(base_url, 2 * 2 ** 20, 0.3),
+                anime_pipeline.BuiltinDownloader(connections=4), tmp, filename=lambda ep: f"ep{ep}.mp4"))
+    finally:
+        server.shutdown()
+    assert all(result == "done" for result in results.values()), results
+    return {
+        "wall": metric(timings["wall"], "s"),
+        "overlap": metric((timings["resolve"] + timings["download"]) / timings["wall"], "x", "higher"),
+    }
+
+
+def case_segmented(latency):
+    """
+    The built-in range-request downloader: 8 MiB at 2 MiB/s per connection, over 1 and 8 connections.
+    """
+    import segmented
+    from media_server import start_server
+
+    size = 8 * 2 ** 20
+    server, base_url = start_server(latency=latency, bandwidth=2 * 2 ** 20)
+    try:
+        results = {}
+        for connections in (1, 8):
+            with tempfile.TemporaryDirectory() as tmp:
+                _, elapsed = timed(segmented.download, f"{base_url}/media/file.mp4?size={size}",
+                                   os.path.join(tmp, "file.mp4"), connections=connections)
+            results[f"throughput_{connections}"] = metric(size / 2 ** 20 / elapsed, "MiB/s", "higher")
+    finally:
+        server.shutdown()
+    return results
+
+
+def case_download_manager(latency):
+    """
+    yt_downloader.py's queue: 4 files of 2 MiB through yt-dlp worker processes, 4 at a time.
+    """
+    from download_manager import run_downloads
+    from media_server import start_server
+
+    size = 2 * 2 ** 20
+    server, base_url = start_server(latency=latency, bandwidth=4 * 2 ** 20)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            ydl_opts = {"outtmpl": os.path.join(tmp, "%(title)s.%(ext)s"), "quiet": True, "no_warnings": True,
+                        "noprogress": True, "download_archive": os.path.join(tmp, "archive.txt")}
+            urls = [f"{base_url}/media/video{i}.mp4?size={size}" for i in range(4)]
+            counts, elapsed = timed(run_downloads, urls, ydl_opts, jobs=4, backoff=0.1,
+                                    queue_path=os.path.join(tmp, "queue.sqlite"))
+    finally:
+        server.shutdown()
+    assert counts.get("done") == 4, counts
+    return {"wall": metric(elapsed, "s"), "throughput": metric(4 * size / 2 ** 20 / elapsed, "MiB/s", "higher")}
+
+
+def case_postprocess(latency):
+    """
+    postprocess.py behind the anime pipeline: 4 real 10s clips downloaded, then verified, tagged and filed
+    by the pool while the next ones download.
+    """
+    import anime_pipeline
+    import postprocess
+    from bench_postprocess import clip
+    from media_server import start_server
+
+    if not postprocess.available():
+        raise Skip("ffmpeg and ffprobe are not on the PATH")
+    with tempfile.TemporaryDirectory() as tmp:
+        data = clip(os.path.join(tmp, "clip.mp4"), 10)
+    server, base_url = start_server(latency=latency, bandwidth=2 * 2 ** 20,
+                                    files={f"/media/ep{ep}.mp4": data for ep in range(1, 5)})
+
+    async def resolve(ep):
+        return f"{base_url}/media/ep{ep}.mp4"
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp, postprocess.PostProcessor() as pool:
+            results, timings = asyncio.run(anime_pipeline.run_pipeline(
+                list(range(1, 5)), resolve, anime_pipeline.BuiltinDownloader(connections=2), tmp,
+                filename=lambda ep: f"ep{ep}.mp4", postprocess=pool))
+            cpu = sum(result["cpu"] for result in pool.results)
+    finally:
+        server.shutdown()
+    assert all(result == "done" for result in results.values()), results
+    return {"wall": metric(timings["wall"], "s"), "post_per_file": metric(timings["post"] / 4, "s"),
+            "cpu_per_file": metric(cpu / 4, "s")}
+
+
+def case_tv_probe(latency):
+    """
+    tv.py's path before VLC starts: resolve, probe every variant, pick one; then `tv.py --check` over 5 channels.
+    """
+    import hls_probe
+    import tv
+    from hls_server import start_server
+
+    server, base_url = start_server(latency=latency, bandwidth=6_000_000 // 8)
+    try:
+        start = time.perf_counter()
+        url = tv.resolve("hls", f"{base_url}/news/master.m3u8", cache=None)
+        result = hls_probe.probe_stream(url)
+        variant = hls_probe.pick_variant(result)
+        ready = time.perf_counter() - start
+        _, check = timed(hls_probe.probe_many, [f"{base_url}/{name}/master.m3u8"
+                                                for name in ("news", "sports", "music", "flaky", "dead")])
+    finally:
+        server.shutdown()
+    assert variant is not None, result["error"]
+    return {
+        "probe_and_pick": metric(ready, "s"),
+        "first_segment": metric(variant["first_segment"], "s"),
+        "picked_bandwidth": metric(variant["bandwidth"] / 1e6, "Mb/s", "higher"),
+        "check_5_channels": metric(check, "s"),
+    }
+
+
+def case_wiki(latency):
+    """
+    player_wiki.py: the career table for 24 players, cold cache then revalidated.
+    """
+    import player_wiki
+    from wiki_server import start_server
+
+    players = [f"{('Player_One', 'Player_Two', 'Player_Three')[i % 3]}_{i}" for i in range(24)]
+    server, base_url = start_server(latency=latency)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            fetcher = player_wiki.WikiFetcher(base_url, cache=player_wiki.PageCache(tmp), workers=8)
+            (data, errors), cold = timed(player_wiki.player_tables, players, "national cup", fetcher)
+            _, warm = timed(player_wiki.player_tables, players, "national cup", fetcher)
+    finally:
+        server.shutdown()
+    assert not errors and len(data), errors
+    return {"cold_24": metric(cold, "s"), "revalidated_24": metric(warm, "s")}
+
+
+CASES = {
+    "scrape": case_scrape,
+    "anime_http": case_anime_http,
+    "anime_playwright": case_anime_playwright,
+    "anime_selenium": case_anime_selenium,
+    "pipeline": case_pipeline,
+    "segmented": case_segmented,
+    "download_manager": case_download_manager,
+    "postprocess": case_postprocess,
+    "tv_probe": case_tv_probe,
+    "wiki": case_wiki,
+}
+
+
+# --- Running, saving and comparing ---------------------------------------------------------------------
+
+def revision():
+    """
+    The checked-out git revision, with "+dirty" when the tree has uncommitted changes.
+    """
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=HERE).returncode != 0
+        return rev + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_case(name, latency, repeat):
+    """
+    Returns:
+        dict: {"metrics": {name: metric with the median value and "runs"}, "counters": {...}}
+            or {"skipped": reason}
+    """
+    runs = []
+    for _ in range(repeat):
+        METRICS.reset()
+        try:
+            with redirect_stdout(io.StringIO()):   # the scripts print progress; keep the table readable
+                runs.append(CASES[name](latency))
+        except Skip as e:
+            return {"skipped": str(e)}
+    metrics = {}
+    for key, first in runs[0].items():
+        values = [run[key]["value"] for run in runs]
+        metrics[key] = {**first, "value": statistics.median(values), "runs": values}
+    return {"metrics": metrics, "counters": METRICS.snapshot()["counters"]}
+
+
+def run(names, latency, repeat, save):
+    result = {
+        "revision": revision(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "latency": latency,
+        "repeat": repeat,
+        "cases": {},
+    }
+    for name in names:
+        start = time.perf_counter()
+        case = result["cases"][name] = run_case(name, latency, repeat)
+        if "skipped" in case:
+            print(f"{name}: skipped ({case['skipped']})")
+            continue
+        print(f"{name} ({time.perf_counter() - start:.1f}s)")
+        for key, m in case["metrics"].items():
+            spread = f"  [{min(m['runs']):.3g}..{max(m['runs']):.3g}]" if len(m["runs"]) > 1 else ""
+            print(f"  {key:24} {m['value']:10.3f} {m['unit']}{spread}")
+
+    if save:
+        RESULTS.mkdir(exist_ok=True)
+        path = RESULTS / f"{datetime.now():%Y%m%d-%H%M%S}-{result['revision']}.json"
+        path.write_text(json.dumps(result, indent=2))
+        print(f"Saved {path.relative_to(HERE.parent)}")
+    return result
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Print every metric of two saved runs side by side.
+
+    Returns:
+        list: "case.metric" names that got worse by more than `threshold` percent.
+    """
+    old, new = (json.loads(Path(path).read_text()) for path in (old_path, new_path))
+    print(f"{old['revision']} ({old['started']}) -> {new['revision']} ({new['started']})")
+    if old.get("latency") != new.get("latency"):
+        print(f"⚠️ Runs used different latencies: {old.get('latency')}s vs {new.get('latency')}s")
+    regressions = []
+    for name, case in new["cases"].items():
+        before = old["cases"].get(name, {})
+        if "skipped" in case or "skipped" in before or not before:
+            continue
+        print(name)
+        for key, m in case["metrics"].items():
+            if key not in before["metrics"]:
+                continue
+            was, now = before["metrics"][key]["value"], m["value"]
+            change = (now - was) / was * 100 if was else 0.0
+            worse = change if m["better"] == "lower" else -change
+            flag = " ❌" if worse > threshold else (" ✅" if worse < -threshold else "")
+            if worse > threshold:
+                regressions.append(f"{name}.{key}")
+            print(f"  {key:24} {was:10.3f} -> {now:10.3f} {m['unit']:8} {change:+6.1f}%{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks against local stand-ins.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("run", help="run cases and save the results")
+    command.add_argument("cases", nargs="*", choices=[[]] + list(CASES), help="cases to run (default: all)")
+    command.add_argument("--repeat", type=int, default=3, help="runs per case; the median is kept")
+    command.add_argument("--latency", type=float, default=0.05, help="seconds added to every stand-in request")
+    command.add_argument("--no-save", action="store_true", help="don't write benchmarks/results/*.json")
+    command = commands.add_parser("compare", help="compare two saved results (default: the two newest)")
+    command.add_argument("files", nargs="*")
+    command.add_argument("--threshold", type=float, default=15, help="percent change counted as a regression")
+    commands.add_parser("list", help="list the cases")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, fn in CASES.items():
+            print(f"{name:18} {' '.join(fn.__doc__.split())}")
+    elif args.command == "run":
+        run(args.cases or list(CASES), args.latency, args.repeat, not args.no_save)
+    else:
+        files = args.files or sorted(RESULTS.glob("*.json"))[-2:]
+        if len(files) != 2:
+            parser.error("compare needs two result files (or at least two saved runs)")
+        regressions = compare(*files, args.threshold)
+        for name in regressions:
+            print(f"❌ {name} regressed by more than {args.threshold:g}%")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,85 @@
+"""
+Local HTTP server replaying saved Wikipedia player pages (benchmarks/fixtures/wiki), for exercising
+player_wiki.py without the network.
+
+    /wiki/<Title>      the fixture page <Title>.html; "<Title>_<n>" serves the same page, so a batch
+                       of any size can be made from the three fixtures
+
+Pages carry an ETag and Last-Modified and answer conditional requests with 304 like the live site.
+Setting `WikiHandler.edited` changes every page (and its ETag), as if the articles had been edited.
+"""
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote
+import hashlib
+import re
+import threading
+import time
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "wiki"
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+
+
+class WikiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0      # seconds added to every request
+    edited = False     # serve a changed revision of every page
+    requests = 0
+    not_modified = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with WikiHandler._lock:
+            WikiHandler.requests += 1
+        time.sleep(self.latency)
+
+        match = re.fullmatch(r"/wiki/(.+?)(?:_\d+)?", unquote(self.path.split("?")[0]))
+        page = FIXTURES / f"{match.group(1)}.html" if match else None
+        if page is None or not page.exists():
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = page.read_bytes()
+        if WikiHandler.edited:
+            body = body.replace(b"is a professional footballer", b"is a retired professional footballer")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with WikiHandler._lock:
+                WikiHandler.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class WikiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_server(latency=0.0):
+    """
+    Start the fixture server on a free localhost port in a background thread.
+
+    Returns:
+        tuple: (server, base URL for player_wiki.WikiFetcher). Call server.shutdown() when done.
+    """
+    handler = type("Handler", (WikiHandler,), {"latency": latency})
+    server = WikiServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/wiki/"
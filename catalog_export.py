@@ -0,0 +1,185 @@
+from datetime import date
+from sys import argv
+import csv
+import os
+import tempfile
+
+# Typed export columns: real dates and whole seconds, so sheets sort and filter without parsing text
+COLUMNS = ["Title", "URL", "Upload Date", "Duration (s)"]
+
+# Rows pulled from the store per query; memory stays at about one chunk whatever the catalog's size
+CHUNK_SIZE = 5000
+
+FORMATS = (".xlsx", ".csv", ".parquet")
+
+
+def typed_row(title, video_id, upload_date, duration):
+    """
+    One export row from a stored video: the watch URL, the upload date as a date and the duration in seconds.
+    """
+    return (title, f"https://www.youtube.com/watch?v={video_id}",
+            date.fromisoformat(upload_date) if upload_date else None, duration)
+
+
+def _atomic(path, write):
+    """
+    Run `write(tmp_path)` and move the result over `path`, so a crash mid-export never leaves a truncated file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=directory)   # same directory: atomic rename
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _copy_cell(ws, cell):
+    """
+    A read-only cell's value for a write-only sheet; dates keep their number format, which a bare value would lose.
+    """
+    if not getattr(cell, "is_date", False):
+        return cell.value
+    from openpyxl.cell import WriteOnlyCell
+
+    copy = WriteOnlyCell(ws, cell.value)
+    copy.number_format = cell.number_format
+    return copy
+
+
+def export_xlsx(store, path, channels=None, chunk_size=CHUNK_SIZE):
+    """
+    Write channel sheets with openpyxl's write-only mode, streaming rows from the store chunk by chunk.
+
+    A write-only workbook can't be edited in place, so sheets that aren't being regenerated are copied
+    over row by row from the current file (read-only mode, equally streamed), keeping the sheet order
+    and any sheets that don't come from the store. Store-backed sheets still in the old text layout
+    (a "Duration" column) are regenerated too, so the first typed export migrates the whole workbook.
+
+    Args:
+        store (VideoStore): Source of the rows.
+        path (str): Excel workbook path.
+        channels (list): Sheets to regenerate from the store; all channels if None.
+        chunk_size (int): Rows per store query.
+    """
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    stored = set(store.channels())
+    regenerate = store.channels() if channels is None else list(channels)
+
+    def write(tmp_path):
+        old = load_workbook(path, read_only=True) if os.path.exists(path) else None
+        try:
+            order = old.sheetnames if old is not None else []
+            migrate = [name for name in order if name in stored and name not in regenerate
+                       and next(old[name].iter_rows(max_row=1, values_only=True), None) != tuple(COLUMNS)]
+            regenerate.extend(migrate)
+            order += [name for name in regenerate if name not in order]
+            wb = Workbook(write_only=True)
+            for name in order:
+                ws = wb.create_sheet(name)
+                if name not in regenerate:
+                    for row in old[name].iter_rows():
+                        ws.append([_copy_cell(ws, cell) for cell in row])
+                    continue
+                ws.column_dimensions["A"].width = 60
+                ws.column_dimensions["B"].width = 45
+                ws.column_dimensions["C"].width = 12
+                ws.append(COLUMNS)
+                for rows in store.iter_videos(name, chunk_size):
+                    for row in rows:
+                        title, url, upload_date, duration = typed_row(*row)
+                        day = WriteOnlyCell(ws, upload_date)
+                        day.number_format = "yyyy-mm-dd"
+                        ws.append([title, url, day, duration])
+            wb.save(tmp_path)
+        finally:
+            if old is not None:
+                old.close()
+
+    _atomic(path, write)
+
+
+def export_csv(store, path, channels=None, chunk_size=CHUNK_SIZE):
+    """
+    Write every video of `channels` (all if None) to one CSV file, with a leading "Channel" column.
+    Dates are ISO 8601 and durations whole seconds.
+    """
+    channels = store.channels() if channels is None else list(channels)
+
+    def write(tmp_path):
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Channel"] + COLUMNS)
+            for channel in channels:
+                for rows in store.iter_videos(channel, chunk_size):
+                    writer.writerows((channel,) + typed_row(*row) for row in rows)
+
+    _atomic(path, write)
+
+
+def export_parquet(store, path, channels=None, chunk_size=CHUNK_SIZE):
+    """
+    Write every video of `channels` (all if None) to a Parquet file, one row group per chunk, with a
+    date32 "Upload Date" and an int32 "Duration (s)" column.
+
+    Raises:
+        ImportError: pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is needed to export to .parquet: pip install pyarrow, or export to .xlsx or .csv",
+                          name="pyarrow") from e
+
+    schema = pa.schema([("Channel", pa.string()), ("Title", pa.string()), ("URL", pa.string()),
+                        ("Upload Date", pa.date32()), ("Duration (s)", pa.int32())])
+    channels = store.channels() if channels is None else list(channels)
+
+    def write(tmp_path):
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for channel in channels:
+                for rows in store.iter_videos(channel, chunk_size):
+                    columns = list(zip(*((channel,) + typed_row(*row) for row in rows)))
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+
+    _atomic(path, write)
+
+
+EXPORTERS = {".xlsx": export_xlsx, ".csv": export_csv, ".parquet": export_parquet}
+
+
+def export(store, path, channels=None, chunk_size=CHUNK_SIZE):
+    """
+    Export the catalog to `path`, in the format its extension names (.xlsx, .csv or .parquet).
+
+    For .xlsx only the `channels` sheets are regenerated (all if None); CSV and Parquet are single
+    tables, so they are always rewritten with every channel.
+
+    Raises:
+        ValueError: Unsupported file extension.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORTERS:
+        raise ValueError(f"can't export to {ext or path!r}, use one of: {', '.join(FORMATS)}")
+    if ext != ".xlsx":
+        channels = None
+    EXPORTERS[ext](store, path, channels, chunk_size)
+
+
+if __name__ == "__main__":
+    # python catalog_export.py <out.xlsx|out.csv|out.parquet> [database] [channel ...]
+    if len(argv) < 2:
+        print(f"Usage: {argv[0]} <output.xlsx|output.csv|output.parquet> [database] [channel ...]")
+        exit(1)
+
+    from video_store import VideoStore
+
+    with VideoStore(argv[2] if len(argv) > 2 else "videos.sqlite") as store:
+        export(store, argv[1], argv[3:] or None)
+        print(f"Exported {store.count()} videos to {argv[1]}.")
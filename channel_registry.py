@@ -0,0 +1,89 @@
+from datetime import date
+import json
+import statistics
+import time
+
+DEFAULTS = {"n_videos": 5, "min_interval_hours": 6, "max_interval_hours": 168}
+
+
+def load_registry(path="channels.json"):
+    """
+    Load the channel registry from a JSON or TOML config file.
+
+    The file has an optional `defaults` table and a `channels` list; each channel needs a `name` (the sheet
+    name) and a `url`, and may override `n_videos`, `min_interval_hours` and `max_interval_hours`.
+
+    Args:
+        path (str): Config file path; `.toml` files are read with tomllib, anything else as JSON.
+
+    Returns:
+        dict: Channel name -> settings dict (url, n_videos, min_interval_hours, max_interval_hours),
+            in config file order.
+    """
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+
+    defaults = {**DEFAULTS, **config.get("defaults", {})}
+    registry = {}
+    for channel in config["channels"]:
+        settings = {**defaults, **channel}
+        registry[settings.pop("name")] = settings
+    return registry
+
+
+def poll_interval(settings, upload_dates):
+    """
+    How often a channel should be polled, from its posting cadence.
+
+    The interval is half the median gap between its recent uploads (so a new video waits at most about
+    half a posting cycle), clamped to the channel's min/max interval. Channels without enough history
+    are polled at the minimum interval.
+
+    Args:
+        settings (dict): The channel's registry settings.
+        upload_dates (list): Recent upload dates as YYYY-MM-DD strings, in any order.
+
+    Returns:
+        float: Poll interval in seconds.
+    """
+    low = settings["min_interval_hours"] * 3600
+    high = settings["max_interval_hours"] * 3600
+
+    days = sorted(date.fromisoformat(d).toordinal() for d in upload_dates if d)
+    gaps = [b - a for a, b in zip(days, days[1:])]
+    if not gaps:
+        return low
+
+    return min(max(statistics.median(gaps) * 86400 / 2, low), high)
+
+
+def due_channels(registry, store, now=None):
+    """
+    Names of the channels whose poll interval has elapsed since they were last polled.
+
+    Args:
+        registry (dict): Channel registry from `load_registry`.
+        store (VideoStore): Video store holding upload history and last poll times.
+        now (float): Current UNIX time.
+
+    Returns:
+        list: Due channel names, most overdue first.
+    """
+    now = time.time() if now is None else now
+    last_polled = store.last_polled()
+
+    overdue = {}
+    for name, settings in registry.items():
+        if name not in last_polled:
+            overdue[name] = float("inf")   # never polled
+            continue
+        interval = poll_interval(settings, store.recent_upload_dates(name))
+        if now - last_polled[name] >= interval:
+            overdue[name] = now - last_polled[name] - interval
+
+    return sorted(overdue, key=overdue.get, reverse=True)
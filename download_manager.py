@@ -0,0 +1,426 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import functools
+import os
+import random
+import sqlite3
+import time
+
+from instrument import METRICS
+import segmented
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    url          TEXT PRIMARY KEY,
+    video_id     TEXT,
+    extractor    TEXT,              -- archive key prefix, e.g. 'youtube'
+    outtmpl      TEXT,              -- output template with the playlist fields filled in
+    status       TEXT NOT NULL,     -- pending, running, done or failed
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    total_attempts INTEGER NOT NULL DEFAULT 0,   -- over all runs; `attempts` restarts every run
+    next_attempt REAL NOT NULL DEFAULT 0,
+    error        TEXT,
+    added_at     REAL NOT NULL
+);
+"""
+
+
+def read_archive(path):
+    """
+    Entries ('<extractor> <id>') of a yt-dlp download archive file, as a set.
+    """
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def expand(url, ydl_opts, cache=None):
+    """
+    Expand a playlist (or single video) URL into downloadable items without resolving each video.
+
+    Playlist fields used in the output template are filled in per item, since every item is later
+    downloaded on its own and yt-dlp would no longer know which playlist it came from.
+
+    Args:
+        url (str): Playlist or video URL.
+        ydl_opts (dict): The download options (for the output template).
+        cache (ExtractCache): Optional cache for the flat playlist listing.
+
+    Returns:
+        list: Dicts with url, video_id, extractor and outtmpl.
+    """
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import sanitize_filename
+
+    flat_opts = {"quiet": True, "no_warnings": True, "extract_flat": "in_playlist", "skip_download": True}
+
+    def extract(page_url):
+        with YoutubeDL(flat_opts) as ydl:
+            return ydl.sanitize_info(ydl.extract_info(page_url, download=False))
+
+    info = cache.get_or_extract(url, "playlist", extract, flat_opts) if cache else extract(url)
+    outtmpl = ydl_opts.get("outtmpl", "%(title)s.%(ext)s")
+    if isinstance(outtmpl, dict):
+        outtmpl = outtmpl.get("default", "%(title)s.%(ext)s")
+
+    if info.get("_type") != "playlist":
+        return [{"url": info.get("webpage_url") or url, "video_id": info.get("id"),
+                 "extractor": (info.get("extractor_key") or info.get("ie_key") or "").lower(), "outtmpl": outtmpl}]
+
+    entries = [entry for entry in info.get("entries") or [] if entry]
+    width = len(str(len(entries)))
+    # '%' is escaped because the filled-in template is still a yt-dlp output template
+    playlist_title = sanitize_filename(info.get("title") or info.get("id") or "playlist").replace("%", "%%")
+
+    items = []
+    for index, entry in enumerate(entries, 1):
+        item_outtmpl = (outtmpl.replace("%(playlist_title)s", playlist_title)
+                               .replace("%(playlist)s", playlist_title)
+                               .replace("%(playlist_index)s", str(index).zfill(width)))
+        items.append({"url": entry.get("url") or entry.get("webpage_url"), "video_id": entry.get("id"),
+                      "extractor": (entry.get("ie_key") or entry.get("extractor_key") or "").lower(),
+                      "outtmpl": item_outtmpl})
+    return items
+
+
+def _is_progressive(info):
+    """
+    True if the selected format is a single plain-HTTP file (nothing to merge, no fragments).
+    """
+    return (info.get("_type", "video") == "video" and not info.get("requested_formats")
+            and info.get("protocol") in ("http", "https") and bool(info.get("url")))
+
+
+def _staged_download(ydl, url, ydl_opts, connections):
+    """
+    Download an item's streams into an `.incoming` folder next to its destination without merging them;
+    the post-processing pool (postprocess.py) merges, verifies and moves them, and the parent records
+    the item in the download archive only after that.
+
+    Returns:
+        dict: The job for postprocess.process, or None if the item is already in the download archive.
+    """
+    from urllib.request import urlopen
+    from yt_dlp.utils import make_archive_id
+
+    info = ydl.extract_info(url, download=False)
+    if info is None:
+        return None
+    destination = ydl.prepare_filename(info)
+    incoming = os.path.join(os.path.dirname(os.path.abspath(destination)), ".incoming")
+    os.makedirs(incoming, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(destination))[0]
+
+    # Range requests only when nothing asks for yt-dlp's own downloaders: the per-job rate limit and
+    # aria2c are options of those, which segmented.download knows nothing about
+    ranged = connections > 1 and "external_downloader" not in ydl_opts and not ydl_opts.get("ratelimit")
+    files = []
+    for f in info.get("requested_formats") or [info]:
+        # Separate video and audio files (or one progressive file), left unmerged for the pool
+        path = os.path.join(incoming, f"{stem}.f{f.get('format_id')}.{f.get('ext')}")
+        if not os.path.exists(path):
+            if ranged and f.get("protocol") in ("http", "https") and f.get("url"):
+                segmented.download(f["url"], path, connections, f.get("http_headers") or info.get("http_headers"))
+            else:
+                # yt-dlp's downloader for the format's protocol (HLS/DASH fragments included), one format at a time
+                success, _ = ydl.dl(path, {**{k: v for k, v in info.items() if k != "requested_formats"}, **f})
+                if not success:
+                    raise RuntimeError(f"yt-dlp could not download format {f.get('format_id')} of {url}")
+        files.append(path)
+
+    thumbnail = None
+    if info.get("thumbnail"):
+        thumbnail = os.path.join(incoming, f"{stem}.thumbnail")
+        try:
+            with urlopen(info["thumbnail"], timeout=30) as response, open(thumbnail, "wb") as f:
+                f.write(response.read())
+        except OSError:
+            thumbnail = None   # cover art is a nicety, not a reason to fail the item
+
+    return {
+        "files": files,
+        "destination": destination,
+        "duration": info.get("duration"),
+        "thumbnail": thumbnail,
+        "metadata": {"title": info.get("title"), "artist": info.get("uploader") or info.get("channel"),
+                     "date": info.get("upload_date"), "comment": info.get("webpage_url")},
+        "archive_id": make_archive_id(info.get("extractor_key") or info.get("ie_key"), info.get("id")),
+    }
+
+
+def download_item(url, ydl_opts, connections=1, postprocess=False):
+    """
+    Download a single item. Runs in a worker process; raises if yt-dlp reports a failure.
+
+    With `connections` > 1 and no external downloader or rate limit configured, progressive formats are
+    fetched with the segmented range-request downloader; anything else (merges, HLS/DASH) is left to yt-dlp.
+    With `postprocess`, streams are left unmerged in a staging folder and the post-processing job for
+    them is returned (see `_staged_download`).
+    """
+    from yt_dlp import YoutubeDL   # imported per worker: the parent process never needs yt-dlp itself
+
+    try:
+        with YoutubeDL(ydl_opts) as ydl:
+            if postprocess:
+                return _staged_download(ydl, url, ydl_opts, connections)
+            if connections < 2 or "external_downloader" in ydl_opts or ydl_opts.get("ratelimit"):
+                retcode = ydl.download([url])
+            else:
+                info = ydl.extract_info(url, download=False)
+                if info is None:   # already in the download archive
+                    return
+                if _is_progressive(info):
+                    filename = ydl.prepare_filename(info)
+                    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+                    if not os.path.exists(filename):
+                        segmented.download(info["url"], filename, connections, info.get("http_headers"))
+                    ydl.record_download_archive(info)
+                    return
+                ydl.process_ie_result(info, download=True)
+                retcode = 0
+    except Exception as e:
+        # yt-dlp errors can hold open responses, which can't be pickled back to the parent process
+        raise RuntimeError(str(e)) from None
+    if retcode != 0:
+        raise RuntimeError(f"yt-dlp returned an error for {url}")
+
+
+class DownloadQueue:
+    """
+    Persistent download queue; a crashed or interrupted run resumes from where it stopped.
+
+    Args:
+        path (str): SQLite database path, created on first use.
+    """
+
+    def __init__(self, path="download_queue.sqlite"):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(items)")}
+            if "total_attempts" not in columns:   # queues created before the lifetime cap
+                self._conn.execute("ALTER TABLE items ADD COLUMN total_attempts INTEGER NOT NULL DEFAULT 0")
+            # Items that were mid-download when the last run died start over
+            self._conn.execute("UPDATE items SET status = 'pending' WHERE status = 'running'")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def add(self, items, archive=()):
+        """
+        Queue items, marking the ones already in the download archive as done. Returns the number queued.
+        """
+        now = time.time()
+        rows = []
+        for item in items:
+            archived = f"{item['extractor']} {item['video_id']}" in archive
+            rows.append((item["url"], item["video_id"], item["extractor"], item["outtmpl"],
+                         "done" if archived else "pending", now))
+        with self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (url, video_id, extractor, outtmpl, status, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            return self._conn.total_changes - before
+
+    def retry_failed(self, max_total_attempts):
+        """
+        Put failed items back in the queue with a fresh per-run retry budget, unless they have already
+        been attempted `max_total_attempts` times over all runs.
+
+        Returns:
+            int: Number of failed items that are given up on for good.
+        """
+        with self._conn:
+            self._conn.execute("UPDATE items SET status = 'pending', attempts = 0, next_attempt = 0 "
+                               "WHERE status = 'failed' AND total_attempts < ?", (max_total_attempts,))
+            return self._conn.execute("SELECT COUNT(*) FROM items WHERE status = 'failed'").fetchone()[0]
+
+    def claim(self, limit, now=None):
+        """
+        Mark up to `limit` pending items whose backoff has elapsed as running, and return them.
+        """
+        now = time.time() if now is None else now
+        with self._conn:
+            rows = self._conn.execute(
+                "SELECT url, outtmpl FROM items WHERE status = 'pending' AND next_attempt <= ? "
+                "ORDER BY added_at, rowid LIMIT ?", (now, limit)).fetchall()
+            self._conn.executemany("UPDATE items SET status = 'running' WHERE url = ?", [(url,) for url, _ in rows])
+        return rows
+
+    def finish(self, url):
+        with self._conn:
+            self._conn.execute("UPDATE items SET status = 'done', error = NULL WHERE url = ?", (url,))
+
+    def fail(self, url, error, max_attempts, backoff, max_total_attempts=None):
+        """
+        Record a failed attempt; the item is retried after an exponential, jittered backoff until
+        `max_attempts` is reached in this run, or `max_total_attempts` over all runs. Returns True if it
+        will be retried.
+        """
+        with self._conn:
+            attempts, total = self._conn.execute(
+                "SELECT attempts, total_attempts FROM items WHERE url = ?", (url,)).fetchone()
+            attempts, total = attempts + 1, total + 1
+            retry = attempts < max_attempts and (max_total_attempts is None or total < max_total_attempts)
+            delay = backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+            self._conn.execute(
+                "UPDATE items SET status = ?, attempts = ?, total_attempts = ?, next_attempt = ?, error = ? "
+                "WHERE url = ?", ("pending" if retry else "failed", attempts, total, time.time() + delay, str(error), url))
+        return retry
+
+    def counts(self):
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status"))
+
+    def next_wakeup(self):
+        """
+        Time of the earliest pending retry, or None if nothing is pending.
+        """
+        return self._conn.execute("SELECT MIN(next_attempt) FROM items WHERE status = 'pending'").fetchone()[0]
+
+
+def run_downloads(urls, ydl_opts, jobs=4, max_attempts=3, backoff=5.0, rate_limit=None,
+                  queue_path="download_queue.sqlite", cache=None, download_fn=download_item, connections=1,
+                  postprocessor=None, max_total_attempts=10):
+    """
+    Expand playlists into items and download them with `jobs` worker processes.
+
+    With a `postprocessor`, each finished download is handed to it while the other downloads go on; an
+    item only counts as done (and enters the download archive) once it is verified and in the library.
+    Items that fail verification are downloaded again, up to `max_attempts`.
+
+    Args:
+        urls (list): Playlist or video URLs.
+        ydl_opts (dict): YoutubeDL options used for every item (format, outtmpl, download_archive, ...).
+        jobs (int): Number of concurrent downloads.
+        max_attempts (int): Attempts per item in this run before it is marked failed; the next run tries
+            failed items again.
+        backoff (float): Base delay in seconds before the first retry; doubled on every further attempt.
+        rate_limit (int): Global bandwidth cap in bytes/second, split evenly between the workers.
+        queue_path (str): Persistent queue path. Items are resumed with this call's `ydl_opts`, so callers
+            with different options need their own queue.
+        cache (ExtractCache): Optional cache for playlist listings.
+        download_fn (callable): Worker function taking (url, ydl_opts); must be picklable.
+        connections (int): Range-request connections per progressive file (passed to `download_fn`).
+        postprocessor (PostProcessor): Post-download stage (postprocess.py), optional.
+        max_total_attempts (int): Attempts per item over all runs, after which it stays failed.
+
+    Returns:
+        dict: Item count per status across the whole queue, including earlier runs.
+    """
+    worker = functools.partial(download_fn, connections=connections) if connections > 1 else download_fn
+    if postprocessor is not None:
+        worker = functools.partial(download_fn, connections=connections, postprocess=True)
+    worker_opts = dict(ydl_opts)
+    if rate_limit:
+        worker_opts["ratelimit"] = max(1, rate_limit // jobs)
+
+    with DownloadQueue(queue_path) as queue:
+        archive = read_archive(ydl_opts.get("download_archive"))
+        for url in urls:
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    with METRICS.span("download.expand"):
+                        items = expand(url, ydl_opts, cache)
+                    print(f"Queued {queue.add(items, archive)} new items from {url} ({len(items)} total).")
+                    break
+                except Exception as e:
+                    if attempt == max_attempts:
+                        print(f"Could not list {url}, skipping it: {e}")
+                    else:
+                        time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        given_up = queue.retry_failed(max_total_attempts)   # a new run gives earlier failures another chance
+        if given_up:
+            print(f"{given_up} items failed {max_total_attempts} times and are not retried any more.")
+
+        running, started = {}, {}   # started: future -> when it was submitted, for the download spans
+        posting = {}   # post-processing future -> (url, job)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            while True:
+                for url, outtmpl in queue.claim(jobs - len(running)):
+                    future = pool.submit(worker, url, {**worker_opts, "outtmpl": outtmpl})
+                    running[future], started[future] = url, time.perf_counter()
+
+                if not running and not posting:
+                    wakeup = queue.next_wakeup()
+                    if wakeup is None:
+                        break
+                    time.sleep(max(0, wakeup - time.time()))   # only backed-off retries are left
+                    continue
+
+                # Wake up for finished downloads, or for retries whose backoff runs out meanwhile
+                wakeup = queue.next_wakeup()
+                timeout = None if wakeup is None else max(0.1, wakeup - time.time())
+                done, _ = wait([*running, *posting], timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in posting:
+                        url, job = posting.pop(future)
+                        _post_done(queue, url, job, future, ydl_opts.get("download_archive"), max_attempts, backoff,
+                                   max_total_attempts)
+                        continue
+                    url = running.pop(future)
+                    elapsed = time.perf_counter() - started.pop(future)
+                    try:
+                        job = future.result()
+                        METRICS.record("download.item", elapsed)
+                        if postprocessor is not None and job is not None:
+                            posting[postprocessor.submit(job)] = url, job
+                            continue
+                        queue.finish(url)
+                        METRICS.count("download.done")
+                    except Exception as e:
+                        METRICS.record("download.item", elapsed, ok=False)
+                        _failed(queue, url, e, max_attempts, backoff, max_total_attempts)
+
+        counts = queue.counts()
+
+    print("Download queue: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    return counts
+
+
+def _failed(queue, url, error, max_attempts, backoff, max_total_attempts=None):
+    if queue.fail(url, error, max_attempts, backoff, max_total_attempts):
+        METRICS.count("download.retries")
+        print(f"Download failed, will retry: {url} ({error})")
+    else:
+        METRICS.count("download.failed")
+        print(f"Download failed for good: {url} ({error})")
+
+
+def _post_done(queue, url, job, future, archive_path, max_attempts, backoff, max_total_attempts=None):
+    """
+    Settle an item whose post-processing finished: done and archived, or failed and queued to be downloaded again.
+    """
+    try:
+        future.result()
+    except Exception as e:
+        # Whatever was downloaded didn't verify; a retry has to fetch it afresh
+        for path in job["files"]:
+            if os.path.exists(path):
+                os.remove(path)
+        _failed(queue, url, f"post-processing failed, {e}", max_attempts, backoff, max_total_attempts)
+        return
+    queue.finish(url)
+    METRICS.count("download.done")
+    if archive_path and job.get("archive_id"):
+        with open(archive_path, "a", encoding="utf-8") as f:
+            f.write(job["archive_id"] + "\n")
+
+
+def parse_rate(text):
+    """
+    Parse a bandwidth like '2.5M' or '500K' (bytes/second).
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
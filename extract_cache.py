@@ -0,0 +1,198 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from instrument import METRICS
+
+# How long each kind of extraction result stays fresh, in seconds
+DEFAULT_TTL = {
+    "channel": 15 * 60,          # channel listings change whenever something is uploaded
+    "playlist": 60 * 60,
+    "video": 30 * 24 * 3600,     # title, upload date and duration practically never change
+    "stream": 5 * 60,            # fallback when a stream URL carries no expiry of its own
+    "anime_link": 20 * 60,       # resolved GOGOAnime download links, see anime_index.py
+}
+
+# Kinds whose entries hold signed media URLs and expire with them
+SIGNED_KINDS = ("stream", "anime_link")
+
+# Stream URLs are refreshed this long before the expiry they advertise
+EXPIRY_MARGIN = 5 * 60
+
+# yt-dlp options that change what extract_info returns; everything else is left out of the key
+KEY_OPTIONS = ("format", "extract_flat", "extractor_args", "playlist_items", "playlistend", "cookiefile", "noplaylist")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,   -- hash of kind, URL and the options that matter
+    kind        TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    data        BLOB NOT NULL,      -- zlib-compressed JSON info dict
+    expires_at  REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access);
+"""
+
+
+def url_expiry(url):
+    """
+    Expiry (UNIX time) advertised by a signed media URL, e.g. googlevideo's `expire=` / `/expire/<ts>/`
+    or the `expires=` of CDN download links.
+    """
+    match = re.search(r"[?&/]expires?[=/](\d+)", str(url))
+    return int(match.group(1)) if match else None
+
+
+def info_expiry(info):
+    """
+    Earliest expiry of any media URL in an info dict (including its formats and playlist entries).
+    """
+    expiries = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ("url", "manifest_url") and isinstance(value, str):
+                    expiry = url_expiry(value)
+                    if expiry:
+                        expiries.append(expiry)
+                elif isinstance(value, (dict, list)):
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(info)
+    return min(expiries) if expiries else None
+
+
+class ExtractCache:
+    """
+    On-disk cache of yt-dlp extraction results, shared by the scraper, the downloaders and tv.py.
+
+    Entries are keyed by URL plus the options that change the result, and stored as compressed JSON.
+    Each kind has its own TTL (see DEFAULT_TTL); SIGNED_KINDS entries expire with the signed URLs inside them.
+    When the cache grows past `max_bytes` the least recently used entries are evicted.
+
+    Args:
+        path (str): SQLite database path, created on first use.
+        max_bytes (int): Size cap for the stored (compressed) data.
+        ttl (dict): Per-kind TTL overrides, in seconds.
+    """
+
+    def __init__(self, path="extract_cache.sqlite", max_bytes=256 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @staticmethod
+    def key(url, kind, opts=None):
+        relevant = {name: opts[name] for name in KEY_OPTIONS if opts and name in opts}
+        return hashlib.sha1(json.dumps([kind, url, relevant], sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, url, kind, opts=None):
+        """
+        Return the cached info dict for `url`, or None if it is missing or expired.
+        """
+        key = self.key(url, kind, opts)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT data, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                METRICS.count("cache.miss")
+                return None
+            self.hits += 1
+            METRICS.count("cache.hit")
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url, info, kind, opts=None, ttl=None):
+        """
+        Store an info dict. For SIGNED_KINDS entries the TTL follows the expiry of the URLs inside `info`.
+        """
+        now = time.time()
+        if ttl is None:
+            expiry = info_expiry(info) if kind in SIGNED_KINDS else None
+            ttl = expiry - EXPIRY_MARGIN - now if expiry else self.ttl[kind]
+        if ttl <= 0:
+            return
+
+        data = zlib.compress(json.dumps(info, separators=(",", ":"), default=str).encode())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, url, data, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(url, kind, opts), kind, url, data, now + ttl, now))
+            self._evict()
+
+    def invalidate(self, url, kind, opts=None):
+        """
+        Drop the entry for `url`, e.g. when the data it points at turned out to be stale.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (self.key(url, kind, opts),))
+
+    def invalidate_prefix(self, prefix, kind):
+        """
+        Drop every `kind` entry whose URL starts with `prefix`, whatever options it was stored with.
+
+        Returns:
+            int: Number of entries dropped.
+        """
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM entries WHERE kind = ? AND substr(url, 1, ?) = ?",
+                                      (kind, len(prefix), prefix)).rowcount
+
+    def get_or_extract(self, url, kind, extract, opts=None):
+        """
+        Return the cached info for `url`, calling `extract(url)` and caching its result on a miss.
+        """
+        info = self.get(url, kind, opts)
+        if info is None:
+            info = extract(url)
+            self.put(url, info, kind, opts)
+        return info
+
+    def _evict(self):
+        # Expired entries go first, then the least recently used ones until the cache fits
+        self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, LENGTH(data) FROM entries ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def summary(self):
+        """
+        One-line description of the hit/miss counters, for printing at the end of a run.
+        """
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0
+        return f"Extract cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)."
+
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import re
+import time
+
+from instrument import METRICS
+import navigation
+
+# Site and selectors shared by anime.py, the resolver daemon (anime_daemon.py) and gogo_anime.py
+BASE_URL = "https://ww19.gogoanimes.fi/"
+SEARCH_BOX = '[placeholder="search"]'
+SEARCH_BUTTON = '[onclick="do_search();"]'
+FIRST_RESULT = 'ul > li:nth-child(1) > p.name > a'
+EPISODE = "#episode_related > li:nth-last-child({}) > a"   # nth-last-child(n) is episode n
+EPISODE_LINKS = "#episode_related > li > a"                # newest first, so episode 1 is the last one
+DOWNLOAD_PAGE = "div.favorites_book > ul > li.dowloads > a"
+LINK_1080P = "#content-download > div:nth-child(1) > div:nth-child(6) > a"
+
+# Plain-HTTP equivalents of the steps above, used by gogo_http.py
+SEARCH_URL = "search.html?keyword={}"                                # relative to BASE_URL
+MOVIE_ID = "input#movie_id"                                          # show id the episode list is loaded by
+EPISODE_PAGES = "#episode_page a"                                    # ep_start/ep_end attributes span the list
+EPISODE_LIST_AJAX = "https://ajax.gogocdn.net/ajax/load-list-episode"
+
+# Browser profile; empty for a throwaway one. Ads and trackers are blocked by navigation.block_requests,
+# so no uBlock Origin profile is needed.
+USER_DATA_DIR = ''
+
+
+def parse_episodes(spec, total=None):
+    """
+    Parse an episode selection such as '7', '1-24', '1,3,5-7' or 'latest:5'.
+
+    Args:
+        spec (str): The episode selection.
+        total (int): Number of episodes the show has; needed for 'latest:N'.
+
+    Returns:
+        list: Episode numbers in ascending order, without duplicates.
+
+    Raises:
+        ValueError: If the selection is malformed (or uses 'latest' without `total`).
+    """
+    spec = str(spec).strip().lower()
+    match = re.fullmatch(r"latest:(\d+)", spec)
+    if match:
+        if total is None:
+            raise ValueError("'latest' needs the number of available episodes")
+        return list(range(max(1, total - int(match.group(1)) + 1), total + 1))
+
+    episodes = set()
+    for part in spec.split(","):
+        match = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?", part)
+        if not match:
+            raise ValueError(f"invalid episode selection: {part!r}")
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if first < 1 or last < first:
+            raise ValueError(f"invalid episode range: {part!r}")
+        episodes.update(range(first, last + 1))
+    return sorted(episodes)
+
+
+@METRICS.timed("browser.launch")
+async def launch(playwright, headless, user_data_dir=USER_DATA_DIR):
+    """
+    Launch a persistent Edge context that blocks images, fonts, media and ad/analytics hosts.
+
+    Args:
+        playwright: An async Playwright instance.
+        headless (bool): Run without a window.
+        user_data_dir (str): Browser profile directory; empty for a throwaway profile.
+
+    Returns:
+        BrowserContext: The persistent browser context.
+    """
+    context = await playwright.chromium.launch_persistent_context(
+        user_data_dir,
+        headless=headless,
+        channel='msedge', # Use the official Edge browser instead of the bundled chromium browser
+    )
+    await navigation.block_requests(context)
+    return context
+
+
+async def open_home(page):
+    """
+    Load the GOGOAnime home page, the starting point of every search.
+    """
+    logging.info('🌐 Setting sail to the GOGOAnime website... Hold on tight!')
+    await navigation.navigate(page, BASE_URL, SEARCH_BOX, "home page")
+    logging.info('🚀 Website successfully loaded! Ready for the adventure to begin!')
+
+
+async def open_show(page, anime):
+    """
+    Search for an anime from the home page and load its episode list.
+
+    Returns:
+        list: Episode page URLs, where index 0 is episode 1.
+    """
+    # Search for the anime
+    logging.info("🧐 Inputting search query... Let's find that anime!")
+    await page.locator(SEARCH_BOX).fill(f"{anime}")
+    await page.locator(SEARCH_BUTTON).click()
+    logging.info('🌀 Sifting through the vast animeverse...')
+
+    # Select the first search result; the home page has look-alike lists, so wait for the results page first
+    await page.wait_for_url(f"**/{SEARCH_URL.split('?')[0]}*", wait_until="commit")
+    result = await navigation.wait_for(page, FIRST_RESULT, "search results")
+    await result.click()
+    logging.info('📜 Loading the episode list... Almost there!')
+
+    await navigation.wait_for(page, EPISODE_LINKS, "episode list")
+    urls = await page.locator(EPISODE_LINKS).evaluate_all("links => links.map(link => link.href)")
+    logging.info(f"✅ Episode list loaded! {len(urls)} episodes, let’s see what we have!")
+    return urls[::-1]
+
+
+@METRICS.timed("browser.episode")
+async def episode_link(page, episode_url):
+    """
+    Extract the 1080P download link from an episode page.
+
+    Returns:
+        str: Extracted download link, or None if it could not be found.
+
+    Raises:
+        TimeoutError: If the episode page has no download button.
+    """
+    from playwright.async_api import TimeoutError
+
+    # Extract the URL for the download directory as soon as the button is in the DOM
+    button = await navigation.navigate(page, episode_url, DOWNLOAD_PAGE, "episode page")
+    download_url = await button.get_attribute('href')
+
+    try:
+        # Navigate to the download directory and wait for the 1080P link itself, not the page load
+        logging.info('⏳ Navigating to the download directory... Please wait, the treasure is almost yours!')
+        link = await navigation.navigate(page, download_url, LINK_1080P, "download page")
+        logging.info('🔑 Extracting the 1080P download link... The magic is happening!')
+        href = await link.get_attribute('href')
+        logging.info('🎉 Yatta! Download link successfully extracted! You did it!')
+    except TimeoutError:
+        logging.error('🕒 Oops! The download link is playing hard to get. Try again later!')
+        return None
+
+    return href
+
+
+@METRICS.timed("browser.show")
+async def show_urls(page, anime, index=None, fresh=False):
+    """
+    Episode page URLs for an anime: from the index when it has them, otherwise by searching from the
+    home page (the page must be on it) and walking the episode list, which is then indexed.
+
+    Returns:
+        tuple: (list of URLs where index 0 is episode 1, True if they came from the index)
+    """
+    if index and not fresh:
+        urls = index.episodes(anime)
+        if urls:
+            logging.info(f'🗂️ {len(urls)} episodes of {anime!r} found in the index, skipping the search')
+            return urls, True
+
+    urls = await open_show(page, anime)
+    if index:
+        index.store(anime, page.url, urls)
+    return urls, False
+
+
+async def resolve(page, anime, episode_no, index=None):
+    """
+    Extract the 1080P download link for one episode, starting from the home page.
+
+    Args:
+        page (Page): A page of the browser context, already on the home page.
+        anime (str): The name of the anime.
+        episode_no (int): The episode number.
+        index (AnimeIndex): Show index and link cache, optional.
+
+    Returns:
+        str: Extracted download link, or None if it could not be found.
+
+    Raises:
+        TimeoutError: If the search or episode list can't be navigated.
+    """
+    from playwright.async_api import TimeoutError
+
+    if index and (href := index.link(anime, episode_no)):
+        logging.info('🗂️ Download link served from the link cache!')
+        return href
+
+    urls, indexed = await show_urls(page, anime, index)
+    if indexed and episode_no > len(urls):   # new episodes aired since the show was indexed
+        urls, indexed = await show_urls(page, anime, index, fresh=True)
+    if not 1 <= episode_no <= len(urls):
+        logging.error(f"❌ Episode {episode_no} doesn't exist, the show has {len(urls)} episodes.")
+        return None
+
+    logging.info(f"🔍 Locating episode {episode_no}... It’s got to be here somewhere!")
+    try:
+        href = await episode_link(page, urls[episode_no - 1])
+    except TimeoutError:
+        if not indexed:
+            raise
+        # The indexed episode page has no download button any more: forget the show and walk it again
+        logging.info(f'🗂️ Indexed episode page for {anime!r} failed, searching again')
+        index.invalidate(anime)
+        await open_home(page)
+        return await resolve(page, anime, episode_no, index)
+
+    if index and href:
+        index.put_link(anime, episode_no, href)
+    return href
+
+
+@METRICS.timed("browser.batch")
+async def resolve_batch(page, anime, spec, tabs=4, index=None):
+    """
+    Resolve several episodes with a single search and episode-list load.
+
+    The episode pages are then worked through concurrently in up to `tabs` tabs of the same context.
+
+    Args:
+        page (Page): A page of the browser context, already on the home page.
+        anime (str): The name of the anime.
+        spec (str): Episode selection, see `parse_episodes`.
+        tabs (int): Maximum number of tabs resolving episodes at once.
+        index (AnimeIndex): Show index and link cache, optional.
+
+    Returns:
+        tuple: ({episode number: download link or None},
+            {"setup": seconds, "resolve": seconds, "episodes": {episode number: seconds}})
+    """
+    from playwright.async_api import TimeoutError
+
+    start = time.perf_counter()
+    latest = spec.strip().lower().startswith("latest:")
+    urls, indexed = await show_urls(page, anime, index, fresh=latest)   # 'latest' needs the current list
+    episodes = parse_episodes(spec, len(urls))
+    if indexed and max(episodes, default=0) > len(urls):
+        urls, indexed = await show_urls(page, anime, index, fresh=True)
+    timings = {"setup": time.perf_counter() - start, "episodes": {}}
+
+    missing = [ep for ep in episodes if ep > len(urls)]
+    if missing:
+        logging.warning(f"⚠️ Skipping episodes {missing}, the show has {len(urls)} episodes.")
+    links = {ep: None for ep in episodes}
+    if index:
+        for ep in episodes:
+            links[ep] = index.link(anime, ep)
+    todo = asyncio.Queue()
+    for ep in episodes:
+        if ep <= len(urls) and links[ep] is None:
+            todo.put_nowait(ep)
+
+    extra_tabs = [await page.context.new_page() for _ in range(min(tabs, todo.qsize()) - 1)]
+    stale = []
+
+    async def worker(tab):
+        while not todo.empty():
+            ep = todo.get_nowait()
+            started = time.perf_counter()
+            try:
+                links[ep] = await episode_link(tab, urls[ep - 1])
+                if index and links[ep]:
+                    index.put_link(anime, ep, links[ep])
+            except TimeoutError as e:
+                if indexed:
+                    stale.append(ep)
+                logging.error(f'❌ Episode {ep} failed: {e}')
+            except Exception as e:   # one bad episode shouldn't sink the batch
+                logging.error(f'❌ Episode {ep} failed: {e}')
+            timings["episodes"][ep] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(tab) for tab in [page] + extra_tabs))
+        if stale:   # the index pointed at pages that moved: walk the list again and retry those once
+            logging.info(f'🗂️ Indexed episode pages for {anime!r} failed, searching again')
+            index.invalidate(anime)
+            for ep, link in links.items():   # links this batch holds are good: keep them cached
+                if link:
+                    index.put_link(anime, ep, link)
+            indexed = False
+            await open_home(page)
+            urls, _ = await show_urls(page, anime, index)
+            for ep in stale:
+                if ep <= len(urls):
+                    todo.put_nowait(ep)
+            await asyncio.gather(*(worker(tab) for tab in [page] + extra_tabs))
+    finally:
+        for tab in extra_tabs:
+            await tab.close()
+    timings["resolve"] = time.perf_counter() - started
+
+    return links, timings
+
+
+def timing_report(timings, launch=0.0):
+    """
+    Compare a batch run with resolving the same episodes one process at a time.
+
+    Per-episode mode pays browser launch, search and episode-list load for every episode, then resolves
+    that one episode; batch mode pays them once.
+
+    Args:
+        timings (dict): Timings returned by `resolve_batch`.
+        launch (float): Browser launch time in seconds (0 when a warm daemon served the batch).
+
+    Returns:
+        str: A short multi-line report.
+    """
+    episode_times = list(timings["episodes"].values())
+    if not episode_times:
+        return "No episodes were resolved."
+    per_episode = sum(launch + timings["setup"] + t for t in episode_times)
+    batch = launch + timings["setup"] + timings["resolve"]
+    return (f"⏱️ Batch mode: {batch:.1f}s for {len(episode_times)} episodes "
+            f"(launch {launch:.1f}s, search + episode list {timings['setup']:.1f}s once)\n"
+            f"⏱️ Per-episode mode (estimated from the same steps): {per_episode:.1f}s "
+            f"-> {per_episode / batch:.1f}x slower")
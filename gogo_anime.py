@@ -1,131 +1,220 @@
 from selenium import webdriver  # For automating the browser
 from selenium.webdriver.common.by import By  # To locate elements
 from selenium.webdriver.common.keys import Keys # To simulate keyboard keys
-from selenium.common.exceptions import TimeoutException, NoSuchElementException # To handle exceptions related to timeouts
-from selenium.webdriver.support.wait import WebDriverWait # To implement explicit waits
-from selenium.webdriver.support import expected_conditions as EC # To specify the expected conditions for the explicit waits
+from selenium.common.exceptions import TimeoutException # To handle exceptions related to timeouts
+from selenium.webdriver.support import expected_conditions as EC # Conditions to wait on
+from selenium.webdriver.support.wait import WebDriverWait # Waits on the page instead of sleeping
 from sys import argv  # To access command-line arguments
-import time  # To add pauses between actions
+import asyncio # To overlap link extraction with downloads
+import time  # To time batch runs
 import logging
-import subprocess # To run shell commands from within the Python script
+
+import anime_pipeline # Resolve and download stages joined by a bounded queue
+import gogo # Shared selectors and episode-range parsing
+from instrument import METRICS, instrumented # Run-wide spans, counters and the JSON run report
+import navigation # Request blocking, event-driven waits and wait histograms
+import postprocess # Verifies, tags and files finished downloads
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
-# Check if the user has provided the name of the anime and the episode number as command-line arguments
-if len(argv) < 2:
-    print("Please provide the name of the anime")
-    exit(1)
-elif len(argv) < 3:
-    print("Please provide the episode number")
-    exit(1)
 
-def gogo_anime(anime, episode_no):
+@METRICS.timed("browser.launch")
+def start_driver():
     # Initialize browser options for Microsoft Edge
     options = webdriver.EdgeOptions()
 
-    # Specify the location of the uBlock Origin extension
-    ublock_origin = r'F:\Extensions\uBlock Origin.crx'
-    # ublock_origin = os.path.abspath(r'F:\Extensions\uBlock Origin.crx')
-    options.add_extension(ublock_origin)
-
     # Modify the browser settings to disable images (helps speed up loading and saves bandwidth)
     options.add_argument("--blink-settings=imagesEnabled=false")
 
+    # Don't wait for pages to finish loading: every step waits for the element it needs instead
+    options.page_load_strategy = "none"
+
     # options.add_argument("--headless") # Run the browser in headless mode (without opening a window)
-    
-    # Launch the Edge browser with the specified options (including extensions and settings)
+
+    # Launch the Edge browser with the specified options
     driver = webdriver.Edge(options=options)
 
-    # Wait for 10 seconds to ensure the uBlock Origin extension is fully loaded
-    time.sleep(10)
+    # Block fonts, media and ad/analytics hosts through DevTools; replaces the uBlock Origin extension
+    navigation.block_requests_selenium(driver)
+
+    return driver
+
+
+@METRICS.timed("browser.show")
+def open_show(driver, anime):
+    """
+    Search for the anime and open its episode directory.
+    Returns the episode page URLs (index 0 is episode 1).
+
+    Raises:
+        TimeoutException: If the search box, results or episode list don't show up.
+    """
+    # Step 1: Load the GoGoAnime website, up to the point where the search box exists
+    logging.info("Loading the GoGoAnime website...")
+    search_box = navigation.navigate_selenium(driver, gogo.BASE_URL, "#keyword", "home page")
+    logging.info("Website Loaded!")
 
-    # Set the global page load timeout for the session. If the page takes longer than 40 seconds to load, a TimeoutException will be raised
-    driver.set_page_load_timeout(40)
-    
-    # Set the implicit wait time for the driver. This will be applicable for all the elements located by the driver
-    driver.implicitly_wait(5)
+    # Step 2: Enter the anime name in the search input box
+    logging.info("Search box located, typing anime name...")
+    search_box.send_keys(f'{anime}')
 
-    # Step 1: Load the GoGoAnime website
+    # Step 3: Initiate the search by simulating the Enter key press
+    logging.info("Loading search results...")
+    home_url = driver.current_url
+    search_box.send_keys(Keys.ENTER)
+
+    # Step 4: Click on the first search result, once the results page has replaced the home page
+    # (the home page has look-alike result lists)
+    logging.info("Clicking the first search result to proceed to the episodes directory...")
+    start = time.perf_counter()
     try:
-        logging.info("Loading the GoGoAnime website...")
-        driver.get('https://ww19.gogoanimes.fi/')
+        WebDriverWait(driver, navigation.STEP_TIMEOUT).until(EC.url_changes(home_url))
     except TimeoutException:
-        pass # Continue to the next step even if the website takes longer than 40 seconds to load
+        navigation.WAITS.record("search", time.perf_counter() - start, ok=False)
+        raise
+    navigation.WAITS.record("search", time.perf_counter() - start)
+    search_result = navigation.wait_for_selenium(driver, gogo.FIRST_RESULT, "search results", visible=True)
+    search_result.click()
+
+    # Collect every episode link; the list is newest first, so it is reversed to put episode 1 first
+    navigation.wait_for_selenium(driver, gogo.EPISODE_LINKS, "episode list")
+    links = driver.find_elements(By.CSS_SELECTOR, gogo.EPISODE_LINKS)
+    return [link.get_attribute('href') for link in links][::-1]
+
+
+@METRICS.timed("browser.batch")
+def resolve_tabs(driver, urls, episodes):
+    """
+    Resolve a group of episodes side by side: every episode page is opened in its own tab at once so the
+    pages load in parallel, then each tab is sent to its download page (again all at once) and read in turn.
+
+    Returns:
+        dict: Episode number -> download link or None.
+    """
+    links = {ep: None for ep in episodes}
+    main_window = driver.current_window_handle
+
+    # Open every episode page of the group in its own tab; they load concurrently
+    handles = {}
+    for ep in episodes:
+        before = set(driver.window_handles)
+        driver.execute_script("window.open(arguments[0], '_blank');", urls[ep - 1])
+        handles[ep] = (set(driver.window_handles) - before).pop()
+
+    # Send each tab on to its download page without waiting for the previous one
+    for ep, handle in handles.items():
+        driver.switch_to.window(handle)
+        try:
+            button = navigation.wait_for_selenium(driver, gogo.DOWNLOAD_PAGE, "episode page")
+            driver.execute_script("window.location.href = arguments[0];", button.get_attribute('href'))
+        except TimeoutException:
+            logging.error(f"Timeout locating the download button for episode {ep}")
+
+    # Read the 1080p links as the download pages finish loading
+    for ep, handle in handles.items():
+        driver.switch_to.window(handle)
+        try:
+            link = navigation.wait_for_selenium(driver, gogo.LINK_1080P, "download page")
+            links[ep] = link.get_attribute('href')
+            logging.info(f"Download link for episode {ep} extracted!")
+        except TimeoutException:
+            logging.error(f"Timeout extracting the download link for episode {ep}")
+        driver.close()
+
+    driver.switch_to.window(main_window)
+    return links
+
+
+async def download_episodes(anime, spec, downloader, folder, post_pool=None, tabs=4):
+    """
+    Resolve episodes in one browser with one search, `tabs` episodes at a time, and download each as soon
+    as its link is ready while the next ones are being resolved.
+
+    Returns:
+        dict: Episode number -> "done", "unresolved" or "failed: <error>"
+    """
+    start = time.perf_counter()
+    driver = await asyncio.to_thread(start_driver)
+    launch = time.perf_counter() - start
+    try:
+        try:
+            urls = await asyncio.to_thread(open_show, driver, anime)
+        except TimeoutException:
+            logging.error("Timeout while searching for the anime")
+            return {}
+        episodes = [ep for ep in gogo.parse_episodes(spec, len(urls)) if ep <= len(urls)]
+        batch_timings = {"setup": time.perf_counter() - start - launch, "resolve": 0.0, "episodes": {}}
+        todo, links = list(episodes), {}
+
+        async def resolve(ep):
+            # The episode asked for goes with the next ones in a group of tabs; the rest of the group
+            # waits here until the pipeline asks for it
+            if ep in todo:
+                todo.remove(ep)
+            if ep not in links:
+                group = [ep] + todo[:tabs - 1]
+                del todo[:tabs - 1]
+                started = time.perf_counter()
+                links.update(await asyncio.to_thread(resolve_tabs, driver, urls, group))
+                # Tabs of a group load side by side, so each of its episodes took about the group's whole time
+                elapsed = time.perf_counter() - started
+                batch_timings["resolve"] += elapsed
+                batch_timings["episodes"].update({e: elapsed for e in group})
+            return links.pop(ep)
+
+        # One resolver: the driver can only be steered by one thread at a time
+        results, timings = await anime_pipeline.run_pipeline(
+            episodes, resolve, downloader, folder, filename=lambda ep: f"{anime}-EP{ep}.mp4", resolvers=1,
+            postprocess=post_pool)
     finally:
-        logging.info("Website Loaded!") # Log a message indicating that the website has been loaded successfully
+        print("Closing the browser session...")
+        driver.quit()
+
+    print(anime_pipeline.pipeline_report(timings))
+    print(gogo.timing_report(batch_timings, launch))
+    print(navigation.WAITS.report())
+    return results
 
-    
+
+def main(anime, spec, downloader='idm', folder='F:/Anime', post=True):
+    """
+    Download the selected episodes with the named downloader and return the exit status. With `post`,
+    episodes are verified and tagged as they finish (needs ffmpeg; IDM downloads are left alone).
+    """
     try:
-        # Step 2: Locate the search input box and enter the anime name
-        logging.info("Locating the search input box...")
-        search_box = driver.find_element(By.ID, "keyword")
-        logging.info("Search box located, typing anime name...")
-        search_box.send_keys(f'{anime}')
-    
-        # Step 3: Initiate the search by simulating the Enter key press
-        logging.info("Loading search results...")
-        search_box.send_keys(Keys.ENTER)
-    except NoSuchElementException:
-        logging.error("Unable to locate the search box")
-        driver.quit()
-        return None
-    except TimeoutException:
-        pass
+        with instrumented('gogo_anime'), postprocess.optional(post and downloader != 'idm') as post_pool:
+            results = asyncio.run(download_episodes(anime, spec, anime_pipeline.DOWNLOADERS[downloader](), folder,
+                                                    post_pool))
+            if post_pool:
+                print(post_pool.report())
+    except KeyboardInterrupt:
+        print("Stopped. Partial downloads are kept and resume on the next run.")
+        return 1
+
+    print(results)
+    print(METRICS.report())
+    return 0 if any(result == "done" for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    # Check if the user has provided the name of the anime and the episode number as command-line arguments
+    if len(argv) < 2:
+        print("Please provide the name of the anime")
+        exit(1)
+    elif len(argv) < 3:
+        print("Please provide the episode number (or a range such as 1-24, 1,3,5 or latest:5)")
+        exit(1)
 
-    
     try:
-        # Step 4: Click on the first search result
-        logging.info("Clicking the first search result to proceed to the episodes directory...")
-        search_result = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'ul > li:nth-child(1) > p.name > a'))) #"p.name a"
-        search_result.click()
-    
-        # Step 5: Locate and click on the specific episode
-        logging.info("Locating the specific episode...")
-        # nth-last-child is a pseudo-class that locates elements based on their position as a child of a parent, counting from the end.
-        episode = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, f"#episode_related > li:nth-last-child({episode_no}) > a")))
-        episode.click()
-    
-        # Step 6: Click on the download button for the episode
-        logging.info("Clicking the download button to access the download links...") # 'li.dowloads a'
-        download_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.favorites_book > ul > li.dowloads > a")))
-        download_button.click()
-        
-        # Step 6: Switch to the download window and extract the download link
-        logging.info("Switching to the download window...")
-        download_window = driver.window_handles[-1]
-        driver.switch_to.window(download_window)
-        logging.info("Extracting the 1080p download link...") # '//div[@class="dowload"]/a[contains(text(), "1080P - mp4")]'
-        Mp4_1080p = WebDriverWait(driver, 50).until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#content-download > div:nth-child(1) > div:nth-child(6) > a")))
-        download_link = Mp4_1080p.get_attribute('href') # Extract the download link
-        logging.info("Download link successfully extracted!")
-        
-    except TimeoutException:
-            logging.error(f"Timeout during element interaction")
-            driver.quit()
-            return None # Return None if the timeout exception occurs
-    
-    
-    # Close the browser session
-    print("Closing the browser session...")
-    driver.quit()
-    return download_link # Return the download link
-
-
-# Call the function
-link = gogo_anime(anime=argv[1], episode_no=argv[2])
-print(link)
-
-# Check if the download link was successfully extracted
-if link is None:
-    exit(1)
-else:
-    pass # Continue to the next step
-
-destination_folder = 'F:/Anime'
-
-# Constructing the command to launch IDM to start downloading the episode from the link and save it in the destination folder
-command = f'idman.exe /d "{link}" /p "{destination_folder}" /f "{argv[1]}"-EP"{argv[2]}".mp4'
-
-# Running the above command in the shell from within the Python script
-subprocess.run(command, shell=True)
\ No newline at end of file
+        if not argv[2].lower().startswith('latest:'):
+            gogo.parse_episodes(argv[2])
+    except ValueError:
+        print("Invalid episode selection. Use a number, a range such as 1-24, a list such as 1,3,5 or latest:N.")
+        exit(1)
+
+    # Optional 3rd argument picks the downloader: idm (default), ytdlp or builtin
+    if len(argv) > 3 and argv[3] not in anime_pipeline.DOWNLOADERS:
+        print(f"Invalid downloader. Use one of: {', '.join(anime_pipeline.DOWNLOADERS)}")
+        exit(1)
+    exit(main(argv[1], argv[2], argv[3] if len(argv) > 3 else 'idm', argv[4] if len(argv) > 4 else 'F:/Anime'))
@@ -0,0 +1,318 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urljoin
+import logging
+import threading
+import time
+
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import requests
+
+from anime_index import LATEST_MAX_AGE
+from instrument import METRICS
+from scheduler import SCHEDULER, CircuitOpen
+import gogo
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                         "Chrome/124.0 Safari/537.36 Edg/124.0"}
+
+
+class NeedsBrowser(Exception):
+    """
+    Raised when a page doesn't carry what we need in its HTML, i.e. it is built by JavaScript.
+    """
+
+
+class StaleEpisode(NeedsBrowser):
+    """
+    Raised when an episode page is missing or has no download button: a moved URL or a changed layout.
+    """
+
+
+class HttpResolver:
+    """
+    Resolve GOGOAnime download links with plain HTTP requests and the same CSS selectors as the browser path.
+
+    One pooled keep-alive session is shared by every request, so a batch reuses its connections.
+    With an `index`, known shows skip the search and episode list, and download links that are still
+    valid skip everything; a show whose indexed pages fail a selector is invalidated and walked again.
+
+    Args:
+        base_url (str): Site root, ending with '/'.
+        ajax_url (str): Endpoint the show page loads its episode list from.
+        workers (int): Connection pool size, and the number of episodes `resolve_batch` works on at once.
+        timeout (float): Per-request timeout in seconds.
+        index (AnimeIndex): Show index and link cache, optional.
+        scheduler (Scheduler): Paces and retries the requests; the shared SCHEDULER by default.
+    """
+
+    def __init__(self, base_url=gogo.BASE_URL, ajax_url=gogo.EPISODE_LIST_AJAX, workers=4, timeout=15, index=None,
+                 scheduler=None):
+        self.base_url = base_url
+        self.ajax_url = ajax_url
+        self.workers = workers
+        self.timeout = timeout
+        self.index = index
+        self.scheduler = scheduler or SCHEDULER
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._local = threading.local()   # per-thread stage timings, so resolves can run side by side
+
+    @property
+    def from_index(self):
+        """
+        True if the last `open_show` in this thread served the episode list from the index.
+        """
+        return getattr(self._local, "from_index", False)
+
+    @property
+    def show_timings(self):
+        return getattr(self._local, "show_timings", {})
+
+    def _get(self, url, params=None):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        METRICS.count("http.requests")
+        METRICS.count("http.bytes", len(response.content))
+        response.raise_for_status()
+        return response
+
+    def _soup(self, url, params=None):
+        try:
+            response = self.scheduler.call(url, self._get, url, params)
+        except CircuitOpen as e:   # callers already fall back to the browser on request errors
+            raise requests.ConnectionError(str(e)) from e
+        return BeautifulSoup(response.text, "html.parser"), response.url
+
+    def _timed(self, stage, fn, *args):
+        """
+        Run one stage and record its duration in the calling thread's timings.
+        """
+        start, ok = time.perf_counter(), False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            self._local.timings[stage] = time.perf_counter() - start
+            METRICS.record(f"http.{stage}", self._local.timings[stage], ok)
+
+    def _search(self, anime):
+        soup, url = self._soup(urljoin(self.base_url, gogo.SEARCH_URL.format(quote_plus(anime))))
+        result = soup.select_one(gogo.FIRST_RESULT)
+        if result is None:
+            raise NeedsBrowser(f"no search result for {anime!r} in the page HTML")
+        return urljoin(url, result["href"])
+
+    def _episode_list(self, show_url):
+        soup, url = self._soup(show_url)
+        links = soup.select(gogo.EPISODE_LINKS)
+        if not links:
+            # The live site fills #episode_related from an AJAX call; make the same call ourselves
+            movie_id = soup.select_one(gogo.MOVIE_ID)
+            pages = soup.select(gogo.EPISODE_PAGES)
+            if movie_id is None or not pages:
+                raise NeedsBrowser("the episode list is not in the show page HTML")
+            params = {"ep_start": 0, "ep_end": pages[-1].get("ep_end", 9999), "id": movie_id["value"]}
+            soup, _ = self._soup(self.ajax_url, params)
+            links = soup.select(gogo.EPISODE_LINKS)
+            if not links:
+                raise NeedsBrowser("the episode list endpoint returned no episodes")
+        return [urljoin(url, link["href"].strip()) for link in links][::-1]
+
+    def _download_page(self, episode_url):
+        soup, url = self._soup(episode_url)
+        button = soup.select_one(gogo.DOWNLOAD_PAGE)
+        if button is None:
+            raise NeedsBrowser(f"no download button in {episode_url}")
+        return urljoin(url, button["href"])
+
+    def _link(self, download_url):
+        soup, _ = self._soup(download_url)
+        link = soup.select_one(gogo.LINK_1080P)
+        if link is None:   # the real download page often renders its mirrors with JS behind a captcha
+            raise NeedsBrowser(f"no 1080P link in the HTML of {download_url}")
+        return link["href"]
+
+    def open_show(self, anime, max_age=None, fresh=False):
+        """
+        Find the anime's episode list: from the index if it has one no older than `max_age` seconds,
+        otherwise by walking the show page (skipping the search when the index knows the page).
+
+        Returns:
+            list: Episode page URLs, where index 0 is episode 1. `from_index` tells where they came from.
+
+        Raises:
+            NeedsBrowser: If a page needs JavaScript.
+            requests.RequestException: On network or HTTP errors.
+        """
+        self._local.timings = {}
+        self._local.from_index = False
+        if self.index and not fresh:
+            urls = self._timed("index", self.index.episodes, anime, max_age)
+            if urls:
+                self._local.from_index = True
+                self._local.show_timings = self._local.timings
+                return urls
+
+        show_url = self.index.show_url(anime) if self.index else None
+        urls = None
+        if show_url:
+            try:
+                urls = self._timed("episode list", self._episode_list, show_url)
+            except (NeedsBrowser, requests.HTTPError) as e:
+                logging.info(f'🗂️ Indexed show page for {anime!r} failed ({e}), searching again')
+                self.index.invalidate(anime)
+        if urls is None:
+            show_url = self._timed("search", self._search, anime)
+            urls = self._timed("episode list", self._episode_list, show_url)
+        if self.index:
+            self.index.store(anime, show_url, urls)
+        self._local.show_timings = self._local.timings
+        return urls
+
+    def episode_link(self, episode_url):
+        """
+        Follow an episode page to its download page and extract the 1080P link.
+
+        Returns:
+            tuple: (download link, {stage: seconds})
+
+        Raises:
+            StaleEpisode: If the episode page is gone or has no download button.
+            NeedsBrowser: If the download page needs JavaScript.
+            requests.RequestException: On network or HTTP errors.
+        """
+        self._local.timings = {}
+        try:
+            download_url = self._timed("episode page", self._download_page, episode_url)
+        except (NeedsBrowser, requests.HTTPError) as e:
+            raise StaleEpisode(str(e)) from e
+        link = self._timed("download page", self._link, download_url)
+        return link, self._local.timings
+
+    def _show(self, anime, episodes):
+        """
+        Episode URLs covering `episodes`; an indexed list too short for them is walked again.
+        """
+        urls = self.open_show(anime)
+        if self.from_index and max(episodes, default=0) > len(urls):
+            urls = self.open_show(anime, fresh=True)   # new episodes aired since the show was indexed
+        return urls
+
+    def resolve(self, anime, episode_no):
+        """
+        Extract the 1080P download link for one episode.
+
+        Returns:
+            tuple: (download link or None if the episode doesn't exist, {stage: seconds})
+
+        Raises:
+            NeedsBrowser: If a page needs JavaScript.
+            requests.RequestException: On network or HTTP errors.
+        """
+        if self.index:
+            link = self.index.link(anime, episode_no)
+            if link:
+                return link, {"link cache": 0.0}
+
+        urls = self._show(anime, [episode_no])
+        if not 1 <= episode_no <= len(urls):
+            logging.error(f"❌ Episode {episode_no} doesn't exist, the show has {len(urls)} episodes.")
+            return None, dict(self.show_timings)
+        try:
+            link, timings = self.episode_link(urls[episode_no - 1])
+        except StaleEpisode:
+            if not self.from_index:
+                raise
+            logging.info(f'🗂️ Indexed episode page for {anime!r} failed, walking the episode list again')
+            self.index.invalidate(anime)
+            return self.resolve(anime, episode_no)
+
+        if self.index:
+            self.index.put_link(anime, episode_no, link)
+        return link, {**self.show_timings, **timings}
+
+    def resolve_batch(self, anime, spec):
+        """
+        Resolve several episodes with one search and episode-list load, `workers` episodes at a time.
+        Episodes with a valid cached link are not fetched at all.
+
+        Returns:
+            tuple: ({episode number: link}, [episode numbers that need the browser],
+                {"search": s, "episode list": s, "episodes": {episode number: {stage: seconds}}})
+
+        Raises:
+            NeedsBrowser: If the search or episode list needs JavaScript.
+            requests.RequestException: On network or HTTP errors during the search or episode list.
+        """
+        latest = spec.strip().lower().startswith("latest:")
+        if latest:   # 'latest' depends on how many episodes are out, so a stale table won't do
+            urls = self.open_show(anime, max_age=LATEST_MAX_AGE)
+            episodes = gogo.parse_episodes(spec, len(urls))
+        else:
+            episodes = gogo.parse_episodes(spec)
+            urls = self._show(anime, episodes)
+        show_timings, indexed = self.show_timings, self.from_index
+        missing = [ep for ep in episodes if ep > len(urls)]
+        if missing:
+            logging.warning(f"⚠️ Skipping episodes {missing}, the show has {len(urls)} episodes.")
+
+        links, browser, stale, timings = {}, [], [], {**show_timings, "episodes": {}}
+        if self.index:
+            links = {ep: link for ep in episodes if (link := self.index.link(anime, ep))}
+            if links:
+                logging.info(f'🗂️ {len(links)} links served from the link cache')
+
+        def work(ep):
+            try:
+                links[ep], timings["episodes"][ep] = self.episode_link(urls[ep - 1])
+                if self.index:
+                    self.index.put_link(anime, ep, links[ep])
+            except StaleEpisode as e:
+                (stale if indexed else browser).append(ep)
+                logging.info(f'🧭 Episode {ep} page failed: {e}')
+            except (NeedsBrowser, requests.RequestException) as e:
+                logging.info(f'🧭 Episode {ep} needs the browser: {e}')
+                browser.append(ep)
+
+        todo = [ep for ep in episodes if ep <= len(urls) and ep not in links]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(work, todo))
+
+        if stale:   # the index pointed at pages that moved: walk the list again and retry those once
+            logging.info(f'🗂️ Indexed episode pages for {anime!r} failed, walking the episode list again')
+            self.index.invalidate(anime)
+            for ep, link in links.items():   # links this batch holds are good: keep them cached
+                self.index.put_link(anime, ep, link)
+            urls = self.open_show(anime)
+            timings.update(self.show_timings)
+            retry, stale, indexed = stale, [], False   # the list is fresh now: a second failure needs the browser
+            gone = [ep for ep in retry if ep > len(urls)]
+            if gone:
+                logging.warning(f"⚠️ Skipping episodes {gone}, the show has {len(urls)} episodes.")
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(work, [ep for ep in retry if ep <= len(urls)]))
+        return links, sorted(browser), timings
+
+
+def stage_report(timings):
+    """
+    Format HTTP stage timings, e.g. from `HttpResolver.resolve` or `resolve_batch`.
+
+    Returns:
+        str: One line per stage; batch episode stages are summed, with the slowest episode shown.
+    """
+    lines = []
+    for stage, seconds in timings.items():
+        if stage != "episodes":
+            lines.append(f"⏱️ {stage:<14} {seconds * 1000:8.1f} ms")
+    episodes = timings.get("episodes", {})
+    if episodes:
+        for stage in ("episode page", "download page"):
+            times = [t[stage] for t in episodes.values() if stage in t]
+            lines.append(f"⏱️ {stage:<14} {sum(times) * 1000:8.1f} ms over {len(times)} episodes "
+                         f"(slowest {max(times) * 1000:.1f} ms)")
+    return "\n".join(lines)
@@ -0,0 +1,218 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
+import re
+import threading
+import time
+
+from instrument import METRICS
+from scheduler import SCHEDULER
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                         "Chrome/124.0 Safari/537.36"}
+
+# A variant is picked only if it downloaded at least this many times faster than it plays
+HEADROOM = 1.5
+
+# Live players start this many segments back from the newest one (RFC 8216 §6.3.3)
+LIVE_EDGE_SEGMENTS = 3
+
+
+def _fetch(url, timeout, limit=None):
+    """
+    GET `url` through the scheduler, retrying once: a probe that keeps retrying would be measuring
+    the retries. Returns (body bytes, seconds to first byte, total seconds, final URL) of the last attempt.
+    """
+    return SCHEDULER.call(url, _fetch_once, url, timeout, limit, attempts=2)
+
+
+def _fetch_once(url, timeout, limit):
+    start = time.perf_counter()
+    with urlopen(Request(url, headers=HEADERS), timeout=timeout) as response:
+        first = response.read(1)
+        ttfb = time.perf_counter() - start
+        body = first + (response.read(limit - 1) if limit else response.read())
+        METRICS.count("http.requests")
+        METRICS.count("http.bytes", len(body))
+        return body, ttfb, time.perf_counter() - start, response.url
+
+
+def _attributes(line):
+    """
+    Parse an attribute list such as BANDWIDTH=1280000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2".
+    """
+    return {key: value.strip('"') for key, value in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', line)}
+
+
+def parse_master(text, base_url):
+    """
+    Parse an HLS master playlist.
+
+    Returns:
+        list: Variants as {"url", "bandwidth" (bits/s), "resolution", "codecs"}, highest bandwidth first.
+            A media playlist (no variants) comes back as a single variant of unknown bandwidth.
+    """
+    variants, pending = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            pending = _attributes(line.split(":", 1)[1])
+        elif line and not line.startswith("#") and pending is not None:
+            variants.append({
+                "url": urljoin(base_url, line),
+                "bandwidth": int(pending.get("AVERAGE-BANDWIDTH") or pending.get("BANDWIDTH") or 0),
+                "resolution": pending.get("RESOLUTION"),
+                "codecs": pending.get("CODECS"),
+            })
+            pending = None
+    if not variants and "#EXTINF" in text:
+        variants.append({"url": base_url, "bandwidth": 0, "resolution": None, "codecs": None})
+    return sorted(variants, key=lambda v: v["bandwidth"], reverse=True)
+
+
+def parse_media(text, base_url):
+    """
+    Parse an HLS media playlist.
+
+    Returns:
+        tuple: ([(segment URL, duration in seconds)], True if the playlist is live i.e. has no #EXT-X-ENDLIST)
+    """
+    segments, duration = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",")[0])
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((urljoin(base_url, line), duration))
+            duration = None
+    return segments, "#EXT-X-ENDLIST" not in text
+
+
+def playlist_tag(text, tag, default=0):
+    """
+    Numeric value of a playlist-level tag such as #EXT-X-MEDIA-SEQUENCE or #EXT-X-TARGETDURATION.
+    """
+    match = re.search(rf"^#{tag}:([\d.]+)", text, re.MULTILINE)
+    return float(match.group(1)) if match else default
+
+
+def probe_variant(variant, timeout=10, segment_lock=None):
+    """
+    Fetch a variant's media playlist and the segment a player would start on, and time both. With a
+    `segment_lock`, the segment is only fetched while holding it.
+
+    Returns:
+        dict: The variant plus "ok", "error", "playlist_time", "ttfb" (segment time to first byte),
+            "first_segment" (playlist + segment, i.e. how long until playback could start),
+            "throughput" (bits/s while fetching the segment) and "speed" (throughput over the
+            variant's bandwidth; below 1 means it would stall).
+    """
+    result = {**variant, "ok": False, "error": None}
+    try:
+        body, _, playlist_time, final_url = _fetch(variant["url"], timeout)
+        segments, live = parse_media(body.decode("utf-8", "replace"), final_url)
+        if not segments:
+            raise ValueError("media playlist has no segments")
+        segment_url, duration = segments[-LIVE_EDGE_SEGMENTS] if live and len(segments) >= LIVE_EDGE_SEGMENTS else segments[0]
+        with segment_lock or nullcontext():
+            data, ttfb, segment_time, _ = _fetch(segment_url, timeout)
+        throughput = 8 * len(data) / segment_time if segment_time else 0
+        bandwidth = variant["bandwidth"] or (8 * len(data) / duration if duration else 0)
+        result.update(
+            ok=True, playlist_time=playlist_time, ttfb=ttfb, first_segment=playlist_time + segment_time,
+            throughput=throughput, speed=throughput / bandwidth if bandwidth else 0, live=live)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+@METRICS.timed("hls.probe")
+def probe_stream(url, timeout=10, max_variants=None):
+    """
+    Probe an HLS stream: fetch the master playlist, then probe its variants. Media playlists are fetched
+    concurrently, but the timed segment downloads take turns: run side by side they would share the
+    link, and each would measure a fraction of the real throughput.
+
+    Args:
+        url (str): Master (or media) playlist URL.
+        timeout (float): Per-request timeout in seconds.
+        max_variants (int): Probe only this many of the highest-bandwidth variants.
+
+    Returns:
+        dict: {"url", "ok", "error", "master_time", "variants": [probe_variant results]}
+    """
+    result = {"url": url, "ok": False, "error": None, "master_time": None, "variants": []}
+    try:
+        body, _, result["master_time"], final_url = _fetch(url, timeout)
+        variants = parse_master(body.decode("utf-8", "replace"), final_url)
+        if not variants:
+            raise ValueError("not an HLS playlist")
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+
+    variants = variants[:max_variants] if max_variants else variants
+    segment_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=len(variants)) as pool:
+        result["variants"] = list(pool.map(lambda v: probe_variant(v, timeout, segment_lock), variants))
+    result["ok"] = any(v["ok"] for v in result["variants"])
+    if not result["ok"]:
+        result["error"] = result["variants"][0]["error"]
+    return result
+
+
+def pick_variant(result, headroom=HEADROOM):
+    """
+    Best variant for the bandwidth measured while probing: the highest-bandwidth one that downloaded
+    at least `headroom` times faster than real time, else the fastest-relative working one.
+
+    Returns:
+        dict: The chosen variant's probe result, or None if nothing works.
+    """
+    working = [v for v in result["variants"] if v["ok"]]
+    if not working:
+        return None
+    comfortable = [v for v in working if v["speed"] >= headroom]
+    if comfortable:
+        return max(comfortable, key=lambda v: v["bandwidth"])
+    return max(working, key=lambda v: v["speed"])
+
+
+def network_caching(variant, floor=300, ceiling=3000):
+    """
+    VLC --network-caching (ms) for a probed variant: enough to cover a few times the segment
+    latency we measured, instead of a fixed second for every stream.
+    """
+    return int(min(ceiling, max(floor, 3 * variant["ttfb"] * 1000)))
+
+
+def probe_many(urls, timeout=10, max_variants=None):
+    """
+    Probe several streams at once.
+
+    Returns:
+        dict: URL -> probe_stream result.
+    """
+    urls = list(urls)
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        return dict(zip(urls, pool.map(lambda u: probe_stream(u, timeout, max_variants), urls)))
+
+
+def describe(result):
+    """
+    One line per variant of a probe result, for printing.
+    """
+    if not result["variants"]:
+        return f"  ❌ {result['error']}"
+    lines = []
+    for v in result["variants"]:
+        label = f"{v['resolution'] or '?':>9} {v['bandwidth'] / 1e6:6.2f} Mb/s"
+        if v["ok"]:
+            lines.append(f"  {label}  first segment {v['first_segment']:5.2f}s  "
+                         f"(ttfb {v['ttfb']:.2f}s)  {v['throughput'] / 1e6:6.2f} Mb/s  {v['speed']:4.1f}x real time")
+        else:
+            lines.append(f"  {label}  ❌ {v['error']}")
+    return "\n".join(lines)
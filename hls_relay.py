@@ -0,0 +1,390 @@
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from instrument import METRICS
+import hls_probe
+
+HOST = "127.0.0.1"
+PORT = 8766
+
+# Segments listed in the live playlist the relay serves
+LIVE_WINDOW = 6
+
+# A channel nobody has asked for in this long stops pulling from upstream, in seconds
+IDLE_TIMEOUT = 60
+
+# Clients that fetched something within this long count as watching, in seconds
+CLIENT_WINDOW = 30
+
+
+class ChannelRelay:
+    """
+    Pull one channel's media playlist and segments from upstream once, for any number of local clients.
+
+    New segments are prefetched `prefetch` at a time as soon as the playlist lists them and kept in an
+    in-memory ring of the last `buffer` segments. With `record_dir`, every segment is also written to
+    disk (the last `record_limit` of them, or all) together with a playlist that plays the recording
+    back, which is also what the time-shift playlist serves from. Only the segment URIs are rewritten,
+    so encrypted streams (#EXT-X-KEY) and byte-range playlists are not relayed correctly.
+
+    Args:
+        name (str): Channel name, used in URLs and for the recording folder.
+        playlist_url (str): Upstream media playlist (a single variant, see hls_probe.pick_variant).
+        buffer (int): Segments kept in memory.
+        prefetch (int): Segments downloaded from upstream at once.
+        record_dir (str): Folder to record into, or None.
+        record_limit (int): Recorded segments to keep on disk, None for all.
+        timeout (float): Upstream request timeout in seconds.
+    """
+
+    def __init__(self, name, playlist_url, buffer=30, prefetch=3, record_dir=None, record_limit=None, timeout=10):
+        self.name = name
+        self.playlist_url = playlist_url
+        self.buffer = buffer
+        self.record_dir = os.path.join(record_dir, name) if record_dir else None
+        self.record_limit = record_limit
+        self.timeout = timeout
+        self.target = 6.0
+        self.ended = False
+        self.error = None
+        self.last_seq = None
+        self.upstream_bytes = 0
+        self.served_bytes = 0
+        self.last_access = time.time()
+        self._segments = {}    # sequence -> (duration, bytes): the in-memory ring
+        self._pending = {}     # sequence -> Future, for segments being prefetched
+        self._recorded = {}    # sequence -> (duration, path)
+        self._clients = {}     # client address -> last request time
+        self._lock = threading.Lock()
+        self._record_lock = threading.Lock()   # one recording.m3u8 writer at a time
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=prefetch)
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+
+    def start(self):
+        threading.Thread(target=self._run, name=f"relay-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self.record_dir:
+            self._write_recording(final=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._poll()
+                self.error = None
+            except Exception as e:
+                self.error = str(e)
+                logging.warning(f"📡 {self.name}: upstream playlist failed: {e}")
+            if self.ended:
+                break
+            # Reload about twice per target duration, so new segments are fetched soon after they appear
+            self._stop.wait(max(0.5, self.target / 2))
+        if self.ended and self.record_dir:   # the stream ended: close the recording once its last segments are in
+            self._pool.shutdown(wait=True)
+            self._write_recording(final=True)
+
+    def _poll(self):
+        body, _, _, url = hls_probe._fetch(self.playlist_url, self.timeout)
+        text = body.decode("utf-8", "replace")
+        segments, live = hls_probe.parse_media(text, url)
+        first = int(hls_probe.playlist_tag(text, "EXT-X-MEDIA-SEQUENCE"))
+        self.target = hls_probe.playlist_tag(text, "EXT-X-TARGETDURATION", self.target)
+        numbered = [(first + i, segment_url, duration) for i, (segment_url, duration) in enumerate(segments)]
+        if self.last_seq is None and live:   # join at the live edge rather than replaying the whole window
+            numbered = numbered[-hls_probe.LIVE_EDGE_SEGMENTS:]
+        new = [segment for segment in numbered if self.last_seq is None or segment[0] > self.last_seq]
+        with self._lock:
+            for seq, segment_url, duration in new:
+                self._pending[seq] = self._pool.submit(self._fetch_segment, seq, segment_url, duration)
+        if new:
+            self.last_seq = new[-1][0]
+        self.ended = not live
+
+    def _fetch_segment(self, seq, url, duration):
+        try:
+            data, *_ = hls_probe._fetch(url, self.timeout)
+        except Exception as e:
+            logging.warning(f"📡 {self.name}: segment {seq} failed: {e}")
+            with self._lock:
+                self._pending.pop(seq, None)
+            return None
+
+        path = None
+        if self.record_dir:
+            path = os.path.join(self.record_dir, f"{seq}.ts")
+            with open(path, "wb") as f:
+                f.write(data)
+
+        METRICS.count("relay.upstream_bytes", len(data))
+        with self._lock:
+            self.upstream_bytes += len(data)
+            self._segments[seq] = (duration, data)
+            self._pending.pop(seq, None)
+            while len(self._segments) > self.buffer:
+                del self._segments[min(self._segments)]
+            doomed = []
+            if path:
+                self._recorded[seq] = (duration, path)
+                while self.record_limit and len(self._recorded) > self.record_limit:
+                    doomed.append(self._recorded.pop(min(self._recorded))[1])
+        for old in doomed:
+            os.remove(old)
+        if path:
+            try:
+                self._write_recording()
+            except OSError as e:   # the segment itself is stored; the next write catches the playlist up
+                logging.warning(f"📡 {self.name}: recording playlist not updated: {e}")
+        self._ready.set()
+        return data
+
+    def _write_recording(self, final=False):
+        """
+        Keep <record_dir>/<channel>/recording.m3u8 up to date, so the recording plays back on its own.
+
+        Prefetch threads and `stop` call this concurrently; writes are serialized so they don't replace
+        each other's temporary file, and each takes its snapshot inside the lock, so the last write wins
+        with the newest state.
+        """
+        with self._record_lock:
+            with self._lock:
+                recorded = sorted(self._recorded.items())
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(self.target + 0.999)}",
+                     f"#EXT-X-MEDIA-SEQUENCE:{recorded[0][0] if recorded else 0}"]
+            previous = None
+            for seq, (duration, path) in recorded:
+                if previous is not None and seq != previous + 1:
+                    lines.append("#EXT-X-DISCONTINUITY")   # a segment upstream failed to deliver
+                lines += [f"#EXTINF:{duration:.3f},", os.path.basename(path)]
+                previous = seq
+            if final or self.ended:
+                lines.append("#EXT-X-ENDLIST")
+            tmp = os.path.join(self.record_dir, "recording.m3u8.tmp")
+            with open(tmp, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, os.path.join(self.record_dir, "recording.m3u8"))
+
+    def touch(self, client):
+        now = time.time()
+        with self._lock:
+            self.last_access = now
+            self._clients[client] = now
+
+    def wait_ready(self, timeout):
+        return self._ready.wait(timeout)
+
+    def _run_ending_at_newest(self, sequences):
+        """
+        The contiguous run of sequence numbers ending at the newest one: playlists can't skip numbers.
+        """
+        run = []
+        for seq in sorted(sequences, reverse=True):
+            if run and seq != run[-1] - 1:
+                break
+            run.append(seq)
+        return run[::-1]
+
+    def playlist(self, timeshift=False):
+        """
+        Media playlist pointing at the relay's own copies: the newest LIVE_WINDOW buffered segments, or
+        with `timeshift` everything still available (recording included) so players can seek back.
+        """
+        with self._lock:
+            durations = {seq: duration for seq, (duration, _) in self._recorded.items()} if timeshift else {}
+            durations.update({seq: duration for seq, (duration, _) in self._segments.items()})
+        run = self._run_ending_at_newest(durations)
+        if not timeshift:
+            run = run[-LIVE_WINDOW:]
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(self.target + 0.999)}",
+                 f"#EXT-X-MEDIA-SEQUENCE:{run[0] if run else 0}"]
+        for seq in run:
+            lines += [f"#EXTINF:{durations[seq]:.3f},", f"{seq}.ts"]
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def segment(self, seq):
+        """
+        A segment's bytes from memory, from an in-flight prefetch, or from the recording; None if gone.
+
+        Raises:
+            TimeoutError: The in-flight prefetch didn't finish within the upstream timeout, or was cancelled
+                because the channel stopped.
+        """
+        with self._lock:
+            cached = self._segments.get(seq)
+            pending = self._pending.get(seq)
+            recorded = self._recorded.get(seq)
+        data = None
+        if cached:
+            data = cached[1]
+        elif pending:
+            try:
+                data = pending.result(self.timeout)   # wait for the one upstream download instead of starting another
+            except (TimeoutError, CancelledError):
+                raise TimeoutError(f"segment {seq} is still downloading from upstream") from None
+        elif recorded and os.path.exists(recorded[1]):
+            with open(recorded[1], "rb") as f:
+                data = f.read()
+        if data:
+            METRICS.count("relay.served_bytes", len(data))
+            with self._lock:
+                self.served_bytes += len(data)
+        return data
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            clients = sum(now - seen < CLIENT_WINDOW for seen in self._clients.values())
+            return {
+                "upstream": self.playlist_url,
+                "clients": clients,
+                "buffered": len(self._segments),
+                "recorded": len(self._recorded),
+                "upstream_bytes": self.upstream_bytes,
+                "served_bytes": self.served_bytes,
+                "ended": self.ended,
+                "error": self.error,
+            }
+
+
+class Relay:
+    """
+    Channel relays started on a channel's first request and stopped once nobody has asked for it
+    for `idle_timeout` seconds.
+
+    Args:
+        source (callable): fn(channel name) -> upstream media playlist URL; raises KeyError for unknown channels.
+        **options: Passed on to every ChannelRelay (buffer, prefetch, record_dir, record_limit, timeout).
+    """
+
+    def __init__(self, source, idle_timeout=IDLE_TIMEOUT, **options):
+        self.source = source
+        self.idle_timeout = idle_timeout
+        self.options = options
+        self.channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, name):
+        name = name.lower()   # "BBC" and "bbc" are the same upstream
+        with self._lock:
+            relay = self.channels.get(name)
+        if relay is not None:
+            return relay
+        # The source probes upstream, which can take seconds: not under the lock, where it would hold up
+        # every other channel and /status
+        playlist_url = self.source(name)
+        with self._lock:
+            relay = self.channels.get(name)
+            if relay is None:   # unless another request started it meanwhile
+                logging.info(f"📡 Starting relay for {name}")
+                relay = self.channels[name] = ChannelRelay(name, playlist_url, **self.options).start()
+        return relay
+
+    def reap(self):
+        now = time.time()
+        with self._lock:
+            idle = [name for name, relay in self.channels.items() if now - relay.last_access > self.idle_timeout]
+            for name in idle:
+                logging.info(f"📡 Nobody watching {name}, stopping its relay")
+                self.channels.pop(name).stop()
+
+    def stop(self):
+        with self._lock:
+            for relay in self.channels.values():
+                relay.stop()
+            self.channels.clear()
+
+    def status(self):
+        with self._lock:
+            return {name: relay.status() for name, relay in self.channels.items()}
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    relay = None   # set by `serve`
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/status":
+            return self._send(200, json.dumps(self.relay.status(), indent=2).encode(), "application/json")
+
+        match = re.fullmatch(r"/([\w-]+)/(live\.m3u8|timeshift\.m3u8|(\d+)\.ts)", path)
+        if not match:
+            return self._send(404, b"not found\n", "text/plain")
+        try:
+            channel = self.relay.channel(match.group(1))
+        except KeyError:
+            return self._send(404, b"unknown channel\n", "text/plain")
+        except Exception as e:
+            return self._send(502, f"upstream unavailable: {e}\n".encode(), "text/plain")
+        channel.touch(self.client_address[0])
+
+        if match.group(3):
+            try:
+                data = channel.segment(int(match.group(3)))
+            except TimeoutError as e:
+                return self._send(504, f"{e}\n".encode(), "text/plain")
+            if data is None:
+                return self._send(404, b"segment gone\n", "text/plain")
+            return self._send(200, data, "video/mp2t")
+
+        if not channel.wait_ready(channel.timeout):
+            return self._send(504, f"no segments from upstream yet: {channel.error}\n".encode(), "text/plain")
+        return self._send(200, channel.playlist(timeshift=match.group(2) == "timeshift.m3u8").encode(),
+                          "application/vnd.apple.mpegurl")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # players hang up mid-segment when they switch or seek
+
+
+class RelayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(relay, host=HOST, port=PORT):
+    """
+    Serve `relay` over HTTP in background threads, reaping idle channels as it goes.
+
+        http://<host>:<port>/<channel>/live.m3u8       live edge
+        http://<host>:<port>/<channel>/timeshift.m3u8  everything buffered or recorded, for seeking back
+        http://<host>:<port>/status                    clients and upstream vs served bytes per channel
+
+    Returns:
+        RelayServer: Call shutdown() and relay.stop() when done.
+    """
+    handler = type("Handler", (RelayHandler,), {"relay": relay})
+    server = RelayServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def reaper():
+        while server.socket.fileno() != -1:
+            time.sleep(min(10, relay.idle_timeout))
+            relay.reap()
+
+    threading.Thread(target=reaper, daemon=True).start()
+    return server
@@ -0,0 +1,252 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+# Switches read by `instrumented`, so a run report, a profile or a metrics endpoint can be turned on for any
+# script without new arguments; `python -m scripts --report/--profile/--metrics-port` sets them too
+REPORT_ENV = "SCRIPTS_REPORT"               # path of the JSON run report to write when the run ends
+PROFILE_ENV = "SCRIPTS_PROFILE"             # cprofile or pyinstrument
+METRICS_PORT_ENV = "SCRIPTS_METRICS_PORT"   # serve Prometheus text metrics on this localhost port
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class Metrics:
+    """
+    Timing spans and counters for one run, so a slow run shows where its time went: browser launch,
+    network, yt-dlp extraction, downloads or Excel I/O. Thread-safe; shared through the module-level `METRICS`.
+
+    Names are dotted by area: spans such as "browser.launch", "youtube.extract" or "excel.export", counters
+    such as "cache.hit", "http.requests", "http.bytes" or "download.retries".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}      # name -> [seconds]
+        self._errors = {}     # name -> spans that raised
+        self._counters = {}
+        self.started = time.time()
+
+    def record(self, name, seconds, ok=True):
+        with self._lock:
+            self._spans.setdefault(name, []).append(seconds)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextmanager
+    def span(self, name):
+        """
+        Time the body of a `with` block; a block that raises is recorded as an error of that span.
+        """
+        start, ok = time.perf_counter(), False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(name, time.perf_counter() - start, ok)
+
+    def timed(self, name):
+        """
+        Decorator form of `span`, for plain and async functions.
+        """
+        def decorate(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await fn(*args, **kwargs)
+            else:
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._errors.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """
+        {"spans": {name: {"count", "errors", "total", "mean", "p50", "p90", "max"}}, "counters": {name: value}}
+        """
+        with self._lock:
+            spans = {name: (sorted(times), self._errors.get(name, 0)) for name, times in self._spans.items()}
+            counters = dict(self._counters)
+        result = {}
+        for name, (times, errors) in sorted(spans.items()):
+            result[name] = {
+                "count": len(times),
+                "errors": errors,
+                "total": sum(times),
+                "mean": sum(times) / len(times),
+                "p50": times[len(times) // 2],
+                "p90": times[min(len(times) - 1, int(len(times) * 0.9))],
+                "max": times[-1],
+            }
+        return {"spans": result, "counters": dict(sorted(counters.items()))}
+
+    def report(self):
+        """
+        One line per span, slowest in total first, then the counters.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, stats in sorted(snapshot["spans"].items(), key=lambda item: -item[1]["total"]):
+            errors = f", {stats['errors']} failed" if stats["errors"] else ""
+            lines.append(f"⏱️ {name}: {stats['total']:.2f}s over {stats['count']} "
+                         f"(p50 {stats['p50']:.2f}s, p90 {stats['p90']:.2f}s, max {stats['max']:.2f}s{errors})")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"🔢 {name}: {value:,}")
+        return "\n".join(lines) if lines else "Nothing recorded."
+
+    def run_report(self, script, **extra):
+        """
+        The run as a JSON-ready dict: what ran, when, for how long, and every span and counter.
+        """
+        return {
+            "script": script,
+            "argv": sys.argv,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "elapsed": time.time() - self.started,
+            **self.snapshot(),
+            **extra,
+        }
+
+    def prometheus(self):
+        """
+        Spans and counters in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = ["# TYPE scripts_span_seconds summary"]
+        for name, stats in snapshot["spans"].items():
+            lines += [f'scripts_span_seconds_sum{{span="{name}"}} {stats["total"]:.6f}',
+                      f'scripts_span_seconds_count{{span="{name}"}} {stats["count"]}',
+                      f'scripts_span_errors_total{{span="{name}"}} {stats["errors"]}']
+        for name, value in snapshot["counters"].items():
+            metric = "scripts_" + "".join(c if c.isalnum() else "_" for c in name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def profiled(kind, output):
+    """
+    Profile the body of a `with` block with cProfile (stats saved to `output`.prof, loadable with pstats
+    or snakeviz) or pyinstrument (an HTML call tree in `output`.html, if pyinstrument is installed).
+    """
+    if kind == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{output}.prof")
+            print(f"Profile saved to {output}.prof")
+    elif kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise SystemExit("pyinstrument is not installed: pip install pyinstrument, or use cprofile")
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{output}.html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            print(f"Profile saved to {output}.html")
+    else:
+        raise ValueError(f"unknown profiler {kind!r}, use one of: {', '.join(PROFILERS)}")
+
+
+def serve_metrics(port, host="127.0.0.1", metrics=METRICS):
+    """
+    Serve `metrics` at http://<host>:<port>/metrics for a Prometheus scraper, from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: Call shutdown() to stop it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = metrics.prometheus().encode() if self.path.split("?")[0] == "/metrics" else b""
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_active = threading.Lock()
+
+
+@contextmanager
+def instrumented(script, report=None, profile=None, metrics_port=None):
+    """
+    Wrap one run of a script: start the profiler and metrics endpoint if asked for, and write the JSON
+    run report when the run ends, failed runs included. Arguments left as None fall back to the
+    SCRIPTS_REPORT, SCRIPTS_PROFILE and SCRIPTS_METRICS_PORT environment variables. Nested calls
+    (a script's main called from another instrumented run) leave everything to the outer one.
+
+    Args:
+        script (str): Name recorded in the report, and the profile's file name.
+        report (str): JSON run report path.
+        profile (str): "cprofile" or "pyinstrument".
+        metrics_port (int): Port for the Prometheus endpoint, for long-running jobs.
+    """
+    if not _active.acquire(blocking=False):
+        yield METRICS
+        return
+
+    report = report or os.environ.get(REPORT_ENV)
+    profile = profile or os.environ.get(PROFILE_ENV)
+    metrics_port = metrics_port or os.environ.get(METRICS_PORT_ENV)
+    server = serve_metrics(int(metrics_port)) if metrics_port else None
+    status = "ok"
+    try:
+        if profile:
+            with profiled(profile, f"{script}-{time.strftime('%Y%m%d-%H%M%S')}"):
+                yield METRICS
+        else:
+            yield METRICS
+    except BaseException as e:
+        status = f"failed: {type(e).__name__}: {e}" if not isinstance(e, SystemExit) else f"exit {e.code}"
+        raise
+    finally:
+        if report:
+            with open(report, "w", encoding="utf-8") as f:
+                json.dump(METRICS.run_report(script, status=status), f, indent=2)
+        if server:
+            server.shutdown()
+        _active.release()
@@ -0,0 +1,223 @@
+import bisect
+import threading
+import time
+from urllib.parse import urlparse
+
+from instrument import METRICS
+from scheduler import SCHEDULER
+
+# Resource types the resolvers never need: the links they extract are plain attributes in the HTML.
+# Stylesheets stay, or hidden overlays would show up and intercept clicks.
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+# Ad, analytics and pop-under hosts the GOGOAnime pages pull in (a request to any subdomain is blocked too)
+BLOCKED_DOMAINS = (
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+    "googletagmanager.com", "adservice.google.com", "amazon-adsystem.com", "histats.com", "statcounter.com",
+    "popads.net", "popcash.net", "propellerads.com", "onclickads.net", "adsterra.com", "exoclick.com",
+    "juicyads.com", "mgid.com", "disqus.com", "disquscdn.com", "cloudflareinsights.com", "hotjar.com",
+)
+
+# The same blocklist as URL patterns, for Chromium's Network.setBlockedURLs (used through Selenium's CDP)
+BLOCKED_URL_PATTERNS = [f"*{domain}*" for domain in BLOCKED_DOMAINS] + [
+    f"*.{ext}*" for ext in ("png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "woff", "woff2", "ttf", "otf", "mp4")]
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, float("inf"))
+
+# How long a single navigation step may take before it counts as failed, in seconds
+STEP_TIMEOUT = 30
+
+# Tries per navigation, through the shared scheduler: a timed-out page load is retried once after a
+# backoff instead of ending the run
+NAVIGATION_ATTEMPTS = 2
+
+
+def should_block(url, resource_type=None):
+    """
+    True if a request is for a resource type or host on the blocklist.
+    """
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == domain or host.endswith("." + domain) for domain in BLOCKED_DOMAINS)
+
+
+class WaitStats:
+    """
+    Per-step histograms of how long each navigation wait took, so slow steps stand out.
+    Thread-safe; shared by the Playwright and Selenium resolvers through the module-level `WAITS`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = {}
+
+    def record(self, step, seconds, ok=True):
+        METRICS.record(f"browser.wait.{step}", seconds, ok)
+        with self._lock:
+            entry = self._steps.setdefault(step, {"times": [], "timeouts": 0})
+            entry["times"].append(seconds)
+            if not ok:
+                entry["timeouts"] += 1
+
+    def snapshot(self):
+        """
+        {step: {"count", "timeouts", "p50", "p90", "max", "buckets": [count per BUCKETS bound]}}
+        """
+        with self._lock:
+            steps = {step: (sorted(entry["times"]), entry["timeouts"]) for step, entry in self._steps.items()}
+        result = {}
+        for step, (times, timeouts) in steps.items():
+            buckets = [0] * len(BUCKETS)
+            for t in times:
+                buckets[bisect.bisect_left(BUCKETS, t)] += 1
+            result[step] = {
+                "count": len(times),
+                "timeouts": timeouts,
+                "p50": times[len(times) // 2],
+                "p90": times[min(len(times) - 1, int(len(times) * 0.9))],
+                "max": times[-1],
+                "buckets": buckets,
+            }
+        return result
+
+    def report(self):
+        """
+        One block per step: percentiles, then a bar per non-empty bucket.
+        """
+        lines = []
+        for step, stats in self.snapshot().items():
+            lines.append(f"⏱️ {step}: {stats['count']} waits, p50 {stats['p50']:.2f}s, p90 {stats['p90']:.2f}s, "
+                         f"max {stats['max']:.2f}s, {stats['timeouts']} timed out")
+            peak = max(stats["buckets"])
+            for bound, count in zip(BUCKETS, stats["buckets"]):
+                if count:
+                    label = f"≤{bound:g}s" if bound != float("inf") else f">{BUCKETS[-2]:g}s"
+                    lines.append(f"     {label:>7} {'█' * max(1, round(20 * count / peak))} {count}")
+        return "\n".join(lines) if lines else "No navigation waits recorded."
+
+
+WAITS = WaitStats()
+
+
+# --- Playwright ---------------------------------------------------------------------------------------
+
+async def block_requests(context):
+    """
+    Abort blocked requests for every page of a Playwright browser context (replaces uBlock Origin).
+    """
+    async def route(route):
+        request = route.request
+        if should_block(request.url, request.resource_type):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", route)
+
+
+async def wait_for(page, selector, step, timeout=STEP_TIMEOUT, state="attached"):
+    """
+    Wait until `selector` reaches `state` on a Playwright page and record the wait under `step`.
+
+    Returns:
+        Locator: The first matching element.
+
+    Raises:
+        TimeoutError: If it doesn't show up within `timeout` seconds.
+    """
+    locator = page.locator(selector).first
+    start = time.perf_counter()
+    try:
+        await locator.wait_for(state=state, timeout=timeout * 1000)
+    except Exception:
+        WAITS.record(step, time.perf_counter() - start, ok=False)
+        raise
+    WAITS.record(step, time.perf_counter() - start)
+    return locator
+
+
+async def navigate(page, url, selector, step, timeout=STEP_TIMEOUT):
+    """
+    Go to `url` and return as soon as `selector` is in the DOM, without waiting for the load event
+    (ads and trackers keep that from firing for seconds). The whole step is recorded under `step`.
+
+    Returns:
+        Locator: The first element matching `selector`.
+
+    Raises:
+        TimeoutError: If the page or the element doesn't arrive within `timeout` seconds, on every attempt.
+    """
+    async def attempt():
+        await page.goto(url, wait_until="commit", timeout=timeout * 1000)
+        locator = page.locator(selector).first
+        await locator.wait_for(state="attached", timeout=timeout * 1000)
+        return locator
+
+    start = time.perf_counter()
+    try:
+        locator = await SCHEDULER.acall(url, attempt, attempts=NAVIGATION_ATTEMPTS)
+    except Exception:
+        WAITS.record(step, time.perf_counter() - start, ok=False)
+        raise
+    WAITS.record(step, time.perf_counter() - start)
+    return locator
+
+
+# --- Selenium -----------------------------------------------------------------------------------------
+
+def block_requests_selenium(driver):
+    """
+    Block the same resources in a Chromium-based Selenium driver (Edge, Chrome) via the DevTools protocol.
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+
+def _until(driver, selector, timeout, visible):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    condition = EC.visibility_of_element_located if visible else EC.presence_of_element_located
+    return WebDriverWait(driver, timeout).until(condition((By.CSS_SELECTOR, selector)))
+
+
+def wait_for_selenium(driver, selector, step, timeout=STEP_TIMEOUT, visible=False):
+    """
+    Wait until `selector` is present (or visible) in a Selenium driver and record the wait under `step`.
+
+    Returns:
+        WebElement: The first matching element.
+
+    Raises:
+        TimeoutException: If it doesn't show up within `timeout` seconds.
+    """
+    start = time.perf_counter()
+    try:
+        element = _until(driver, selector, timeout, visible)
+    except Exception:
+        WAITS.record(step, time.perf_counter() - start, ok=False)
+        raise
+    WAITS.record(step, time.perf_counter() - start)
+    return element
+
+
+def navigate_selenium(driver, url, selector, step, timeout=STEP_TIMEOUT, visible=False):
+    """
+    Selenium counterpart of `navigate`: with the driver's page-load strategy set to "none", `get`
+    returns right away and the step ends when `selector` arrives.
+    """
+    def attempt():
+        driver.get(url)
+        return _until(driver, selector, timeout, visible)
+
+    start = time.perf_counter()
+    try:
+        element = SCHEDULER.call(url, attempt, attempts=NAVIGATION_ATTEMPTS)
+    except Exception:
+        WAITS.record(step, time.perf_counter() - start, ok=False)
+        raise
+    WAITS.record(step, time.perf_counter() - start)
+    return element
@@ -1,15 +1,348 @@
-import pandas as pd
-import lxml # not used directly, but pandas uses lxml internally for parsing
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import quote
 from sys import argv
+import json
+import os
+import re
+import threading
+import time
+
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+import pandas as pd
+import requests
+
+from instrument import METRICS, instrumented
+from scheduler import SCHEDULER
+
+WIKI_URL = "https://en.wikipedia.org/wiki/"
+
+# Wikipedia asks scripts to identify themselves instead of posing as a browser
+HEADERS = {"User-Agent": "player_wiki/1.0 (table extraction script; python-requests)"}
+
+
+class PageCache:
+    """
+    Raw page HTML on disk, with the validators (ETag / Last-Modified) needed to revalidate it.
+
+    Args:
+        folder (str): Cache folder; created when the first page is stored.
+    """
+
+    def __init__(self, folder="wiki_cache"):
+        self.folder = folder
+
+    def _path(self, title, ext):
+        return os.path.join(self.folder, quote(title, safe="") + ext)
+
+    def get(self, title):
+        """
+        Returns:
+            tuple: (html, meta) or (None, None) if the page was never stored.
+        """
+        try:
+            with open(self._path(title, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._path(title, ".html"), encoding="utf-8") as f:
+                return f.read(), meta
+        except (OSError, ValueError):
+            return None, None
+
+    def put(self, title, html, meta):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self._path(title, ".html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        with open(self._path(title, ".json"), "w", encoding="utf-8") as f:   # written last: it marks the pair complete
+            json.dump(meta, f)
+
+    def touch(self, title, meta):
+        meta["checked"] = time.time()
+        with open(self._path(title, ".json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+
+class WikiFetcher:
+    """
+    Fetch Wikipedia pages over one pooled keep-alive session, revalidating cached copies instead of
+    downloading them again: an unchanged page costs a 304 with no body.
+
+    Args:
+        base_url (str): Prefix the page title is appended to.
+        cache (PageCache): Where pages and their validators are kept, None to always download.
+        workers (int): Connection pool size, and the number of pages `fetch_many` works on at once.
+        timeout (float): Per-request timeout in seconds.
+        max_age (float): Serve cached pages checked within this many seconds without asking at all.
+        scheduler (Scheduler): Paces and retries the requests; the shared SCHEDULER by default.
+    """
+
+    def __init__(self, base_url=WIKI_URL, cache=None, workers=4, timeout=15, max_age=0, scheduler=None):
+        self.base_url = base_url
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.max_age = max_age
+        self.scheduler = scheduler or SCHEDULER
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"downloaded": 0, "not_modified": 0, "fresh": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        METRICS.count(f"wiki.{outcome}")
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _get(self, url, headers):
+        with METRICS.span("wiki.request"):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        METRICS.count("http.bytes", len(response.content))
+        response.raise_for_status()
+        return response
+
+    def fetch(self, title):
+        """
+        HTML of the page `title` (spaces or underscores), from the cache when it is still current.
+
+        Raises:
+            requests.HTTPError: The page doesn't exist or the site refused the request.
+            scheduler.CircuitOpen: The site failed too often for now.
+        """
+        title = title.strip().replace(" ", "_")
+        html, meta = self.cache.get(title) if self.cache else (None, None)
+        if html is not None and time.time() - meta.get("checked", 0) < self.max_age:
+            self._count("fresh")
+            return html
+
+        headers = {}
+        if html is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = self.scheduler.call(self.base_url, self._get, self.base_url + quote(title), headers)
+        if response.status_code == 304 and html is not None:
+            self.cache.touch(title, meta)
+            self._count("not_modified")
+            return html
+
+        self._count("downloaded")
+        if self.cache:
+            self.cache.put(title, response.text, {
+                "url": response.url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified") or formatdate(usegmt=True),
+                "checked": time.time(),
+            })
+        return response.text
+
+    def fetch_many(self, titles, parse=None):
+        """
+        Fetch several pages at once, optionally parsing each as soon as it arrives.
+
+        Args:
+            titles (list): Page titles.
+            parse (callable): fn(title, html) -> result, run in the worker that fetched the page.
+
+        Returns:
+            dict: title -> HTML (or parse result), or the exception that title failed with.
+        """
+        def one(title):
+            try:
+                html = self.fetch(title)
+                return parse(title, html) if parse else html
+            except Exception as e:
+                return e
+
+        titles = list(titles)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(titles, pool.map(one, titles)))
+
+
+def select_table(html, table):
+    """
+    Find one table on a page without building DataFrames for the others.
+
+    Args:
+        html (str): Page HTML.
+        table (int | str): Position among the page's tables (0-based, like the index into `pd.read_html`'s
+            list), or text to look for, case-insensitively, in a table's caption or header cells.
+
+    Returns:
+        bs4.element.Tag: The table.
+
+    Raises:
+        LookupError: No table at that position, or none matching the text.
+    """
+    tables = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("table")).find_all("table")
+    if isinstance(table, int):
+        if not -len(tables) <= table < len(tables):
+            raise LookupError(f"page has {len(tables)} tables, no table {table}")
+        return tables[table]
+
+    needle = table.lower()
+    for candidate in tables:
+        caption = candidate.find("caption")
+        headers = " ".join(th.get_text(" ", strip=True) for th in candidate.find_all("th"))
+        if needle in f"{caption.get_text(' ', strip=True) if caption else ''} {headers}".lower():
+            return candidate
+    raise LookupError(f"no table with a caption or header matching {table!r}")
+
+
+def _cell_text(cell):
+    for note in cell.select("sup.reference, span.sortkey, style"):   # footnote markers and hidden sort keys
+        note.decompose()
+    return cell.get_text(" ", strip=True)
+
+
+def _span(cell, attribute):
+    return max(1, int(re.sub(r"\D", "", cell.get(attribute, "")) or 1))
+
+
+def _numeric(column):
+    """
+    Numbers for a column of figures ("1,234", "—" for none), or the column unchanged if it holds text.
+    """
+    cleaned = column.str.replace(",", "", regex=False).replace({"—": None, "–": None, "-": None, "": None})
+    converted = pd.to_numeric(cleaned, errors="coerce")
+    return converted if converted.notna().sum() == cleaned.notna().sum() else column
+
+
+def table_frame(table):
+    """
+    DataFrame for a table, with rowspan/colspan cells repeated into every row and column they cover.
+    Leading rows made only of header cells become the column names ("League Apps", "League Goals").
+    """
+    grid, header_rows, spans = [], 0, {}   # spans: column -> (text, rows still covered)
+    for tr in table.find_all("tr"):
+        if tr.find_parent("table") is not table:   # rows of a nested table
+            continue
+        cells = tr.find_all(["th", "td"], recursive=False)
+        if not cells:
+            continue
+        if len(grid) == header_rows and all(cell.name == "th" for cell in cells):
+            header_rows += 1
+
+        row, col, pending = [], 0, iter(cells)
+        while True:
+            if col in spans:
+                text, left = spans[col]
+                row.append(text)
+                if left > 1:
+                    spans[col] = (text, left - 1)
+                else:
+                    del spans[col]
+                col += 1
+                continue
+            cell = next(pending, None)
+            if cell is None:
+                if not any(c > col for c in spans):
+                    break
+                row.append("")
+                col += 1
+                continue
+            text, rowspan = _cell_text(cell), _span(cell, "rowspan")
+            for _ in range(_span(cell, "colspan")):
+                row.append(text)
+                if rowspan > 1:
+                    spans[col] = (text, rowspan - 1)
+                col += 1
+        grid.append(row)
+
+    width = max((len(row) for row in grid), default=0)
+    grid = [row + [""] * (width - len(row)) for row in grid]
+    if header_rows and header_rows < len(grid):
+        names = []
+        for col in range(width):
+            parts = []
+            for row in grid[:header_rows]:
+                if row[col] and row[col] not in parts:
+                    parts.append(row[col])
+            names.append(" ".join(parts) or str(col))
+    else:
+        header_rows, names = 0, [str(col) for col in range(width)]
+
+    seen = {}
+    for i, name in enumerate(names):   # "Apps" can appear under several headings; keep columns distinct
+        seen[name] = seen.get(name, -1) + 1
+        names[i] = f"{name}.{seen[name]}" if seen[name] else name
+    frame = pd.DataFrame(grid[header_rows:], columns=names)
+    return frame.apply(_numeric)
+
+
+@METRICS.timed("wiki.parse")
+def player_table(title, html, table):
+    """
+    The requested table of one player's page, with the player as the first column.
+    """
+    frame = table_frame(select_table(html, table))
+    frame.insert(0, "player", title.replace("_", " "))
+    return frame
+
+
+def player_tables(players, table, fetcher):
+    """
+    Fetch and parse the same table for several players at once.
+
+    Returns:
+        tuple: (one combined DataFrame with a "player" column, {player: error} for players that failed)
+    """
+    results = fetcher.fetch_many(players, parse=lambda title, html: player_table(title, html, table))
+    frames = [result for result in results.values() if isinstance(result, pd.DataFrame)]
+    errors = {title: result for title, result in results.items() if isinstance(result, Exception)}
+    return (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()), errors
+
+
+def read_players(arg):
+    """
+    Players from a comma-separated list, or from a file (one per line) when the argument starts with '@'.
+    """
+    if arg.startswith("@"):
+        with open(arg[1:], encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [player.strip() for player in arg.split(",") if player.strip()]
+
+
+def parse_table(arg):
+    """
+    A table argument: an index if it is a number, otherwise caption or header text.
+    """
+    return int(arg) if re.fullmatch(r"-?\d+", arg) else arg
+
+
+def main(players, table, output=None):
+    """
+    Extract `table` for every player, print it or write it to `output` (.csv or .xlsx); returns the exit status.
+    """
+    if not players:
+        print("No players given: pass Player_Name, a comma-separated list or @players.txt (one per line)")
+        return 1
+    start = time.perf_counter()
+    fetcher = WikiFetcher(cache=PageCache(), workers=min(8, len(players)))
+    with instrumented("wiki"):
+        data, errors = player_tables(players, table, fetcher)
+    for player, error in errors.items():
+        print(f"{player}: {error}")
 
+    if output is None:
+        print(data.to_string())
+    elif output.endswith(".xlsx"):
+        data.to_excel(output, index=False)
+    else:
+        data.to_csv(output, index=False)
+    print(f"{len(players) - len(errors)}/{len(players)} players, {len(data)} rows in {time.perf_counter() - start:.2f}s "
+          f"({fetcher.stats['downloaded']} downloaded, {fetcher.stats['not_modified']} unchanged since cached)")
+    return 1 if errors else 0
 
-scraper = pd.read_html(f'https://en.wikipedia.org/wiki/{argv[1]}') #use _ instead of space in player name
-print(argv)
 
-# for index, table in enumerate(scraper): # Iterates over the DataFrames
-#     print('********************************************')
-#     print(index)
-#     print(table)
+if __name__ == "__main__":
+    # python player_wiki.py <Player_Name | Player_One,Player_Two | @players.txt> <table index | caption text> [out.csv|out.xlsx]
+    if len(argv) < 3:
+        print(f"Usage: {argv[0]} <player | players,comma,separated | @players.txt> <table index | caption text> [output]")
+        raise SystemExit(1)
 
-index = int(argv[2])
-print(scraper[index]) # Prints the table at the specified index from the list of DataFrames (e.g. index = 2 means 3rd table)
\ No newline at end of file
+    # use _ or spaces in player names
+    raise SystemExit(main(read_players(argv[1]), parse_table(argv[2]), argv[3] if len(argv) > 3 else None))
@@ -1,11 +1,16 @@
-from yt_dlp import YoutubeDL
 from sys import argv
 
-if len(argv) < 2:
-    print("Please provide a playlist or video URL as a command-line argument.")
-    exit(1)
+from download_manager import parse_rate, run_downloads
+from extract_cache import ExtractCache
+from instrument import instrumented
+import postprocess
+from segmented import ydl_segment_opts
 
-link = argv[1]
+# Connections per file: parallel HLS/DASH fragments, or range requests for single-file formats
+CONNECTIONS = 8
+
+# This script's own download queue: queued items are resumed with its ydl_opts (archive, playlist folders)
+QUEUE = "playlist_downloader_queue.sqlite"
 
 # Configuration options for 360p playlist downloads
 ydl_opts = {
@@ -33,7 +38,36 @@ ydl_opts = {
 
     # Quiet mode: reduces clutter in the console (optional)
     'quiet': False,
+
+    # Fetch fragments concurrently, and use aria2c for single-file formats when it is installed
+    **ydl_segment_opts(CONNECTIONS),
 }
 
-with YoutubeDL(ydl_opts) as ydl:
-    ydl.download([link])
\ No newline at end of file
+
+def download(links, jobs=None, rate_limit=None, post=True):
+    """
+    Expand each playlist into items and download them, `jobs` at a time (4 unless `jobs` says otherwise);
+    re-running resumes an interrupted queue.
+    With `post` and ffmpeg installed, finished items are merged, verified and checksummed while the others
+    download, and only enter the download archive once they pass.
+    """
+    with instrumented("playlist_downloader"), ExtractCache() as cache, postprocess.optional(post) as post_pool:
+        run_downloads(links, ydl_opts, jobs=jobs or 4, rate_limit=rate_limit, cache=cache, queue_path=QUEUE,
+                      connections=CONNECTIONS, postprocessor=post_pool)
+        if post_pool:
+            print(post_pool.report())
+
+
+# The guard matters: download workers are separate processes that re-import this module on Windows
+if __name__ == "__main__":
+    if len(argv) < 2:
+        print("Please provide a playlist or video URL as a command-line argument.")
+        print(f"Usage: {argv[0]} <url> [parallel downloads] [bandwidth cap, e.g. 5M]")
+        exit(1)
+
+    link = argv[1]
+    jobs = int(argv[2]) if len(argv) > 2 else 4
+    rate_limit = parse_rate(argv[3]) if len(argv) > 3 else None
+
+    # The playlist is expanded into items that download in parallel; re-running resumes an interrupted queue
+    download([link], jobs, rate_limit)
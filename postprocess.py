@@ -0,0 +1,307 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from instrument import METRICS
+
+CHUNK = 1024 * 1024
+
+# A file is rejected if its duration is this far off the expected one (seconds, or a fraction of it)
+DURATION_TOLERANCE = 2.0
+DURATION_TOLERANCE_RATIO = 0.01
+
+# Seconds decoded at the end of every file: a truncated download fails here even when its header
+# (and so the duration ffprobe reports) is intact
+TAIL_CHECK = 5
+
+# Checksum manifest written next to the files, in the format `sha256sum -c` reads
+MANIFEST = "SHA256SUMS"
+
+# Containers whose index ffmpeg can move to the front, so players start without reading the whole file
+FASTSTART = (".mp4", ".m4v", ".m4a", ".mov")
+
+
+def available():
+    """
+    True if ffmpeg and ffprobe are on the PATH.
+    """
+    return bool(shutil.which("ffmpeg") and shutil.which("ffprobe"))
+
+
+def _ffmpeg(args):
+    """
+    Run ffmpeg with -benchmark, which reports its CPU time on every platform (os.times doesn't count
+    child processes on Windows).
+
+    Returns:
+        float: CPU seconds (user + system) ffmpeg used.
+
+    Raises:
+        RuntimeError: ffmpeg failed or reported errors; the message is its last lines of output.
+    """
+    # The bench line is logged at info level; level+ tags every line so the errors can be picked out
+    result = subprocess.run(["ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-loglevel", "level+info", "-benchmark",
+                             *args], capture_output=True, text=True, errors="replace")
+    cpu = sum(float(user) + float(system)
+              for user, system in re.findall(r"utime=([\d.]+)s stime=([\d.]+)s", result.stderr))
+    errors = [line for line in result.stderr.splitlines() if "[error]" in line or "[fatal]" in line]
+    if result.returncode != 0 or errors:
+        raise RuntimeError(" | ".join(errors[-3:]) or f"ffmpeg exited with {result.returncode}")
+    return cpu
+
+
+def probe(path):
+    """
+    Read a file's container with ffprobe.
+
+    Returns:
+        dict: {"duration": seconds or None, "video": video stream count, "audio": audio stream count}
+
+    Raises:
+        RuntimeError: The container can't be read (truncated, corrupt or not media at all).
+    """
+    result = subprocess.run(["ffprobe", "-v", "error", "-show_entries",
+                             "format=duration:stream=codec_type:stream_disposition=attached_pic", "-of", "json", path],
+                            capture_output=True, text=True, errors="replace")
+    if result.returncode != 0 or result.stderr.strip():
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"{path}: unreadable")
+    data = json.loads(result.stdout or "{}")
+    streams = [s for s in data.get("streams", []) if not s.get("disposition", {}).get("attached_pic")]
+    duration = data.get("format", {}).get("duration")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "video": sum(1 for s in streams if s.get("codec_type") == "video"),
+        "audio": sum(1 for s in streams if s.get("codec_type") == "audio"),
+    }
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remux_args(files, output, metadata, thumbnail, video_streams):
+    """
+    One stream-copy ffmpeg pass that merges `files`, tags them and attaches the thumbnail as cover art.
+    """
+    inputs = files + ([thumbnail] if thumbnail else [])
+    args = ["-y"]
+    for path in inputs:
+        args += ["-i", path]
+    for i in range(len(files)):
+        args += ["-map", str(i)]
+    args += ["-c", "copy"]
+    if thumbnail:   # re-encoded to JPEG: thumbnails are often WebP, which MP4 can't carry as cover art
+        args += ["-map", f"{len(files)}:v", f"-c:v:{video_streams}", "mjpeg",
+                 f"-disposition:v:{video_streams}", "attached_pic"]
+    for key, value in (metadata or {}).items():
+        if value is not None:
+            args += ["-metadata", f"{key}={value}"]
+    if output.lower().endswith(FASTSTART):
+        args += ["-movflags", "+faststart"]
+    return args + [output]
+
+
+def process(job):
+    """
+    Remux or merge one downloaded item, verify it, checksum it and move it into the library. Runs in a
+    pool process; sources are only removed once the result is verified and in place.
+
+    Args:
+        job (dict): files (downloaded paths; several are merged, e.g. a video and an audio stream),
+            destination (final path in the library), and optionally duration (expected seconds),
+            metadata ({tag: value}), thumbnail (image path) and archive_id (download archive entry).
+
+    Returns:
+        dict: path, sha256, bytes, duration, archive_id, cpu (seconds, ffmpeg included) and
+            timings ({stage: seconds}).
+
+    Raises:
+        RuntimeError: "<stage>: <reason>", with the sources left where they were.
+    """
+    files, destination = job["files"], job["destination"]
+    timings, cpu = {}, 0.0
+    cpu_start = time.process_time()
+
+    def stage(name, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        except (OSError, RuntimeError, ValueError) as e:
+            raise RuntimeError(f"{name}: {e}") from None
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    sources = stage("probe", lambda: [probe(path) for path in files])
+    expected = job.get("duration") or max((s["duration"] or 0 for s in sources), default=0) or None
+
+    ext = os.path.splitext(destination)[1].lower()
+    needs_remux = (len(files) > 1 or job.get("metadata") or job.get("thumbnail")
+                   or os.path.splitext(files[0])[1].lower() != ext)
+    output = files[0]
+    if needs_remux:
+        output = os.path.join(os.path.dirname(files[0]), f".post-{os.path.basename(destination)}")
+        args = _remux_args(files, output, job.get("metadata"), job.get("thumbnail"),
+                           sum(s["video"] for s in sources))
+        try:
+            cpu += stage("remux", _ffmpeg, args)
+        except RuntimeError:
+            if not job.get("thumbnail"):
+                raise
+            # A cover image ffmpeg can't convert isn't worth losing the video over
+            args = _remux_args(files, output, job.get("metadata"), None, 0)
+            cpu += stage("remux", _ffmpeg, args)
+
+    def verify():
+        result = probe(output)
+        if sum(s["video"] for s in sources) and not result["video"]:
+            raise RuntimeError("no video stream")
+        if sum(s["audio"] for s in sources) and not result["audio"]:
+            raise RuntimeError("no audio stream")
+        if expected and result["duration"] is not None:
+            if abs(result["duration"] - expected) > max(DURATION_TOLERANCE, expected * DURATION_TOLERANCE_RATIO):
+                raise RuntimeError(f"duration {result['duration']:.1f}s, expected {expected:.1f}s")
+        # Decode the last seconds: a file cut short errors out here
+        return result, _ffmpeg(["-sseof", f"-{TAIL_CHECK}", "-i", output, "-f", "null", "-"])
+
+    try:
+        result, tail_cpu = stage("verify", verify)
+        cpu += tail_cpu
+        digest = stage("hash", sha256, output)
+        size = os.path.getsize(output)
+
+        def move():
+            os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+            shutil.move(output, destination)   # a rename on the same drive, a copy across drives
+            for path in files + ([job["thumbnail"]] if job.get("thumbnail") else []):
+                if path != output and os.path.exists(path):
+                    os.remove(path)
+
+        stage("move", move)
+    finally:
+        if output != files[0] and os.path.exists(output):   # a remux that failed verification
+            os.remove(output)
+
+    return {"path": destination, "sha256": digest, "bytes": size, "duration": result["duration"],
+            "archive_id": job.get("archive_id"), "cpu": cpu + time.process_time() - cpu_start, "timings": timings}
+
+
+class PostProcessor:
+    """
+    Post-download stage on a process pool: remux/merge, verify with ffprobe, checksum, tag and move into
+    the library (see `process`). Items are submitted as their downloads finish, so they are processed
+    while other downloads are still running.
+
+    Every finished item gets a line in the SHA256SUMS manifest of its folder. `report()` gives the stage's
+    throughput and CPU use.
+
+    Args:
+        workers (int): Pool processes; by default half the CPUs, leaving the rest to the downloads.
+
+    Raises:
+        RuntimeError: ffmpeg or ffprobe isn't installed.
+    """
+
+    def __init__(self, workers=None):
+        if not available():
+            raise RuntimeError("post-processing needs ffmpeg and ffprobe on the PATH")
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.results = []
+        self.failed = {}   # destination -> error
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._futures = []
+        self._lock = threading.Lock()
+        self._started = None
+        self._finished = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def submit(self, job):
+        """
+        Queue one item. Returns a concurrent.futures.Future for `process`'s result.
+        """
+        with self._lock:
+            if self._started is None:
+                self._started = time.perf_counter()
+        future = self._pool.submit(process, job)
+        future.add_done_callback(lambda f: self._done(job, f))
+        self._futures.append(future)
+        return future
+
+    def _done(self, job, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            with self._lock:
+                self.failed[job["destination"]] = str(e)
+                self._finished = time.perf_counter()
+            METRICS.count("post.failed")
+            return
+        with self._lock:
+            self.results.append(result)
+            self._finished = time.perf_counter()
+            manifest = os.path.join(os.path.dirname(os.path.abspath(result["path"])), MANIFEST)
+            with open(manifest, "a", encoding="utf-8") as f:
+                f.write(f"{result['sha256']}  {os.path.basename(result['path'])}\n")
+        for stage, seconds in result["timings"].items():
+            METRICS.record(f"post.{stage}", seconds)
+        METRICS.count("post.done")
+        METRICS.count("post.bytes", result["bytes"])
+
+    def wait(self):
+        """
+        Block until every submitted item is processed. Returns the results of the ones that succeeded.
+        """
+        for future in list(self._futures):
+            try:
+                future.result()
+            except Exception:
+                pass   # recorded in `failed`
+        return self.results
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def report(self):
+        """
+        Throughput and CPU use of the stage, for printing at the end of a run.
+        """
+        with self._lock:
+            wall = (self._finished - self._started) if self._started and self._finished else 0.0
+            done, failed = list(self.results), dict(self.failed)
+        size = sum(r["bytes"] for r in done)
+        cpu = sum(r["cpu"] for r in done)
+        lines = [f"🎞️ Post-processed {len(done)} files ({size / 2 ** 20:.1f} MiB) in {wall:.1f}s: "
+                 f"{len(done) / wall if wall else 0:.2f} files/s, {size / 2 ** 20 / wall if wall else 0:.1f} MiB/s; "
+                 f"CPU {cpu:.1f}s ({cpu / wall if wall else 0:.2f} of {self.workers} workers busy)"]
+        lines += [f"❌ {os.path.basename(path)}: {error}" for path, error in failed.items()]
+        return "\n".join(lines)
+
+
+def optional(enabled=True, workers=None):
+    """
+    A PostProcessor to use in a `with` block, or None in its place when `enabled` is false or ffmpeg
+    isn't installed; downloads are then left as they were downloaded.
+    """
+    if not enabled:
+        return nullcontext()
+    if not available():
+        print("ffmpeg/ffprobe not found: downloads won't be verified or filed into the library.")
+        return nullcontext()
+    return PostProcessor(workers)
@@ -0,0 +1,412 @@
+from urllib.parse import urlparse
+import logging
+import random
+import re
+import threading
+import time
+
+from instrument import METRICS
+
+# Responses that mean "slow down": the host is rate limiting us or is overloaded
+THROTTLE_STATUSES = {408, 429, 503}
+
+# Exception class names (anywhere in the MRO) that mean a request took too long: requests' Timeout,
+# socket/asyncio TimeoutError, Playwright's TimeoutError and Selenium's TimeoutException
+TIMEOUT_ERRORS = {"Timeout", "TimeoutError", "TimeoutException", "timeout"}
+
+# ... and ones that mean the connection failed: worth retrying, but not a sign of throttling
+CONNECTION_ERRORS = {"ConnectionError", "URLError", "RemoteDisconnected", "IncompleteRead", "ChunkedEncodingError"}
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of sending a request to a host that kept failing, until its cool-down is over.
+    """
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} failed too often, not retrying for another {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def _status(exc):
+    """
+    HTTP status carried by an exception: requests' HTTPError, urllib's HTTPError, or yt-dlp's
+    DownloadError, which only has it in its message ("HTTP Error 429: Too Many Requests").
+    """
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int):
+        status = exc.code
+    if status is None:
+        match = re.search(r"HTTP Error (\d{3})", str(exc))
+        status = int(match.group(1)) if match else None
+    return status
+
+
+def classify(exc):
+    """
+    How a failed request should be treated.
+
+    Returns:
+        str: "throttle" (429/503 or a timeout: back off and lower the host's concurrency and rate),
+            "retry" (server error or broken connection: back off and retry) or None (anything else,
+            e.g. a 404 or a parse error: retrying won't help, so the exception is raised right away).
+    """
+    status = _status(exc)
+    if status is not None:
+        if status in THROTTLE_STATUSES:
+            return "throttle"
+        return "retry" if status >= 500 else None
+
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    message = str(exc).lower()
+    if names & TIMEOUT_ERRORS or "timed out" in message or "too many requests" in message:
+        return "throttle"
+    if names & CONNECTION_ERRORS or "connection reset" in message or "connection refused" in message:
+        return "retry"
+    return None
+
+
+def retry_after(exc):
+    """
+    Seconds the server asked us to wait (a numeric Retry-After header), or None.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Requests per second with bursts. Callers reserve a token and sleep for however long the reservation
+    says, so waiting callers are served in order instead of racing for each refill.
+
+    Args:
+        rate (float): Tokens added per second; None for no limit.
+        burst (float): Bucket size, i.e. how many requests may go out back to back. Defaults to `rate`.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Take a token. Returns the seconds to wait before it may be used (0 if one was available).
+        """
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, seconds):
+        """
+        Hold back every request for `seconds`, e.g. for a Retry-After header.
+        """
+        if self.rate is None:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit, as in TCP congestion control: every success adds 1/limit (about one slot
+    per round of successful requests), a throttled request halves the limit. Decreases are at most one
+    per `cooldown` seconds, so a burst of 429s answering one round of requests only counts once.
+
+    Args:
+        initial (int): Starting number of requests in flight.
+        minimum (int): Lowest the limit goes.
+        maximum (int): Highest the limit goes.
+        cooldown (float): Minimum seconds between two decreases.
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=32, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.active = 0
+        self._decreased = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.active >= int(self.limit):
+                return False
+            self.active += 1
+            return True
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= int(self.limit):
+                self._cond.wait()
+            self.active += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def increase(self):
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def decrease(self):
+        """
+        Halve the limit. Returns True if it was lowered, False if a recent decrease already covered this.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if now - self._decreased < self.cooldown:
+                return False
+            self._decreased = now
+            self.limit = max(self.minimum, self.limit / 2)
+            return True
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests to a host after `threshold` failures in a row. After `reset_after` seconds
+    one trial request is let through (half-open): if it succeeds the circuit closes, if not it stays
+    open for another `reset_after`.
+    """
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._trial else "open"
+
+    def allow(self, host):
+        """
+        Raises:
+            CircuitOpen: If requests to the host are on hold.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited >= self.reset_after and not self._trial:
+                self._trial = True   # this caller is the trial request
+                return
+        METRICS.count("scheduler.rejected")
+        raise CircuitOpen(host, max(0.0, self.reset_after - waited))
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self, host):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None:
+                    logging.warning(f"⛔ {host}: {self.failures} failures in a row, pausing requests for {self.reset_after:.0f}s")
+                    METRICS.count("scheduler.circuit_opened")
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+class _Host:
+    def __init__(self, name, rate, burst, concurrency, max_concurrency, failure_threshold, reset_after):
+        self.name = name
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = AdaptiveLimit(concurrency, maximum=max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_after)
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def succeeded(self):
+        self.limit.increase()
+        self.breaker.success()
+        if self.max_rate is not None:   # the rate creeps back up the same way the concurrency does
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + 1 / self.limit.limit)
+
+    def throttled(self):
+        self.count("throttled")
+        METRICS.count("scheduler.throttled")
+        if self.limit.decrease() and self.max_rate is not None:
+            self.bucket.rate = max(self.max_rate / 20, self.bucket.rate / 2)
+
+
+class Scheduler:
+    """
+    Paces, limits and retries the requests of every network-facing script, per host.
+
+    Each host gets a token bucket (requests per second), an AIMD concurrency limit that shrinks when the
+    host throttles us (429/503, timeouts) and grows back while requests succeed, jittered exponential
+    retries that honour Retry-After, and a circuit breaker that stops hammering a host that keeps
+    failing. Shared through the module-level `SCHEDULER`; per-host settings go through `configure`.
+
+    Args:
+        rate (float): Default requests per second per host; None for no limit. Lowered while throttled.
+        burst (float): Default token bucket size.
+        concurrency (int): Default starting number of requests in flight per host.
+        max_concurrency (int): Ceiling the concurrency limit grows to.
+        attempts (int): Tries per request, the first included.
+        backoff (float): Base retry delay in seconds; doubled on every further attempt, with jitter.
+        max_backoff (float): Longest retry delay, Retry-After included.
+        failure_threshold (int): Failures in a row that open a host's circuit.
+        reset_after (float): Seconds a circuit stays open before a trial request.
+    """
+
+    def __init__(self, rate=50, burst=None, concurrency=8, max_concurrency=32, attempts=4, backoff=0.5,
+                 max_backoff=30, failure_threshold=8, reset_after=30):
+        self.defaults = {"rate": rate, "burst": burst, "concurrency": concurrency, "max_concurrency": max_concurrency,
+                         "failure_threshold": failure_threshold, "reset_after": reset_after}
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._settings = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host, **settings):
+        """
+        Override the defaults (rate, burst, concurrency, ...) for one host; applies to a host's state
+        the next time it is created, so call it before the first request to that host.
+        """
+        with self._lock:
+            self._settings[host] = settings
+            self._hosts.pop(host, None)
+
+    def host(self, url):
+        """
+        The state of the host `url` points at (a bare name such as "www.youtube.com" works too).
+        """
+        name = urlparse(url).hostname or url
+        with self._lock:
+            if name not in self._hosts:
+                self._hosts[name] = _Host(name, **{**self.defaults, **self._settings.get(name, {})})
+            return self._hosts[name]
+
+    def _delay(self, host, exc, attempt, attempts):
+        """
+        Book-keeping for a failed attempt. Returns the seconds to wait before the next one, or re-raises
+        `exc` if it isn't worth retrying or the attempts are used up.
+        """
+        kind = classify(exc)
+        if kind is None:
+            host.breaker.success()   # the host answered; the request itself was the problem
+            raise exc
+        host.breaker.failure(host.name)
+        wait = retry_after(exc)
+        if kind == "throttle":
+            host.throttled()
+            if wait:
+                host.bucket.pause(min(wait, self.max_backoff))   # the whole host waits, not just this caller
+        if attempt >= attempts:
+            host.count("failed")
+            raise exc
+        host.count("retries")
+        METRICS.count("scheduler.retries")
+        backoff = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        return min(self.max_backoff, max(wait or 0.0, backoff))
+
+    def call(self, url, fn, *args, attempts=None, **kwargs):
+        """
+        Run `fn(*args, **kwargs)`, a request to `url`'s host, within the host's limits, retrying it when
+        it fails in a way that retrying can fix.
+
+        Returns:
+            Whatever `fn` returns.
+
+        Raises:
+            CircuitOpen: If the host's circuit is open.
+            Exception: Whatever `fn` raised on its last attempt, or right away if retrying can't help.
+        """
+        host = self.host(url)
+        attempts = attempts or self.attempts
+        for attempt in range(1, attempts + 1):
+            host.breaker.allow(host.name)
+            wait = host.bucket.reserve()
+            if wait:
+                METRICS.record("scheduler.wait", wait)
+                time.sleep(wait)
+            host.limit.acquire()
+            host.count("requests")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._delay(host, e, attempt, attempts)
+            else:
+                host.succeeded()
+                return result
+            finally:
+                host.limit.release()
+            time.sleep(delay)
+
+    async def acall(self, url, fn, *args, attempts=None, **kwargs):
+        """
+        `call` for coroutine functions: `await fn(*args, **kwargs)`, waiting without blocking the event loop.
+        """
+        import asyncio   # only the browser paths await requests; the rest shouldn't pay for the import
+        host = self.host(url)
+        attempts = attempts or self.attempts
+        for attempt in range(1, attempts + 1):
+            host.breaker.allow(host.name)
+            wait = host.bucket.reserve()
+            if wait:
+                METRICS.record("scheduler.wait", wait)
+                await asyncio.sleep(wait)
+            while not host.limit.try_acquire():
+                await asyncio.sleep(0.05)
+            host.count("requests")
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._delay(host, e, attempt, attempts)
+            else:
+                host.succeeded()
+                return result
+            finally:
+                host.limit.release()
+            await asyncio.sleep(delay)
+
+    def report(self):
+        """
+        One line per host that was contacted: its current limits, throttling and retries.
+        """
+        with self._lock:
+            hosts = list(self._hosts.values())
+        lines = []
+        for host in hosts:
+            rate = f"{host.bucket.rate:.1f}/s" if host.bucket.rate is not None else "unlimited"
+            lines.append(f"🚦 {host.name}: {host.stats['requests']} requests, {host.stats['throttled']} throttled, "
+                         f"{host.stats['retries']} retried, {host.stats['failed']} failed "
+                         f"(concurrency {host.limit.limit:.1f}, rate {rate}, circuit {host.breaker.state})")
+        return "\n".join(lines) if lines else "No requests scheduled."
+
+
+SCHEDULER = Scheduler()
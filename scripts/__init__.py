@@ -0,0 +1,3 @@
+"""
+Command-line front end for the scripts in this repository; run it with `python -m scripts`.
+"""
@@ -0,0 +1,7 @@
+import sys
+
+from scripts.cli import main
+
+# The guard matters: download workers are separate processes that re-import __main__ on Windows
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+One entry point for the scripts: python -m scripts <command> [arguments]
+
+    scrape    record the latest videos of the registered YouTube channels (yt_scraper.py)
+    download  download videos or playlists (yt_downloader.py, playlist_downloader.py)
+    anime     download GOGOAnime episodes (anime.py with Playwright, gogo_anime.py with Selenium)
+    tv        play, check or relay live TV channels (tv.py)
+    wiki      extract a table from players' Wikipedia pages (player_wiki.py)
+
+Options before the command apply to any of them: --report=run.json writes a JSON run report with
+every timing span and counter, --profile=cprofile|pyinstrument profiles the run, and --metrics-port=N
+serves Prometheus metrics while it lasts (see instrument.py).
+
+Arguments are checked before a command imports the script that does the work, so a typo is reported
+in milliseconds instead of after pandas, yt-dlp or a browser driver has loaded. Keep the imports at
+the top of this module to the standard library; benchmarks/bench_cli_startup.py checks that they are.
+"""
+import argparse
+import os
+import re
+import sys
+
+# The scripts are flat modules in the repository root, next to this package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _url(text):
+    if not re.match(r"https?://", text):
+        raise argparse.ArgumentTypeError(f"not an http(s) URL: {text!r}")
+    return text
+
+
+def _rate(text):
+    from download_manager import parse_rate   # yt-dlp itself is only imported by the download workers
+
+    try:
+        return parse_rate(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a bandwidth like 500K or 2.5M: {text!r}")
+
+
+def _jobs(text):
+    if not text.isdigit() or int(text) < 1:
+        raise argparse.ArgumentTypeError(f"parallel downloads must be a whole number of at least 1: {text!r}")
+    return int(text)
+
+
+def _episodes(text):
+    import gogo
+
+    if not text.lower().startswith("latest:"):
+        try:
+            gogo.parse_episodes(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError("use a number, a range such as 1-24, a list such as 1,3,5 or latest:N")
+    return text
+
+
+def _downloader(text):
+    from anime_pipeline import DOWNLOADERS
+
+    if text not in DOWNLOADERS:
+        raise argparse.ArgumentTypeError(f"use one of: {', '.join(DOWNLOADERS)}")
+    return text
+
+
+def _players(text):
+    if text.startswith("@") and not os.path.isfile(text[1:]):
+        raise argparse.ArgumentTypeError(f"no such file: {text[1:]}")
+    return text
+
+
+def _table_output(text):
+    if not text.endswith((".csv", ".xlsx")):
+        raise argparse.ArgumentTypeError("output must be a .csv or .xlsx file")
+    return text
+
+
+def scrape(argv):
+    import yt_scraper
+
+    return yt_scraper.main(argv, prog="scripts scrape") or 0
+
+
+def download(args):
+    downloader = __import__("playlist_downloader" if args.playlist else "yt_downloader")
+    downloader.download(args.urls, args.jobs, args.rate, post=not args.no_post)
+    return 0
+
+
+def anime(args):
+    if args.engine == "selenium":
+        import gogo_anime
+
+        return gogo_anime.main(args.name, args.episodes, args.downloader, args.folder, post=not args.no_post)
+    import anime
+
+    return anime.main(args.name, args.episodes, not args.headed, args.downloader, args.folder, post=not args.no_post)
+
+
+def tv(argv):
+    import tv
+
+    return tv.main(argv, prog="scripts tv")
+
+
+def wiki(args):
+    import player_wiki
+
+    return player_wiki.main(player_wiki.read_players(args.players), player_wiki.parse_table(args.table), args.output)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="scripts", description="Scraping, download and playback scripts.")
+    # Handled by _global_options before argparse runs; declared so --help lists them
+    parser.add_argument("--report", metavar="PATH", help="write a JSON run report with timings and counters")
+    parser.add_argument("--profile", choices=("cprofile", "pyinstrument"), help="profile the run")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="serve Prometheus metrics while running")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    # Listed for --help only: main() hands scrape and tv their arguments before argparse sees them
+    commands.add_parser("scrape", add_help=False, help="record the latest videos of YouTube channels")
+
+    command = commands.add_parser("download", help="download videos or playlists")
+    command.add_argument("urls", nargs="+", type=_url, metavar="url")
+    command.add_argument("--playlist", action="store_true", help="save into per-playlist folders with a download archive")
+    command.add_argument("--jobs", type=_jobs, help="parallel downloads")
+    command.add_argument("--rate", type=_rate, help="bandwidth cap, e.g. 5M")
+    command.add_argument("--no-post", action="store_true", help="skip merging, verifying and checksumming downloads")
+    command.set_defaults(run=download)
+
+    command = commands.add_parser("anime", help="download GOGOAnime episodes")
+    command.add_argument("name")
+    command.add_argument("episodes", type=_episodes, help="1, 1-24, 1,3,5 or latest:N")
+    command.add_argument("--engine", choices=("playwright", "selenium"), default="playwright")
+    command.add_argument("--headed", action="store_true", help="show the browser (Playwright only)")
+    command.add_argument("--downloader", type=_downloader, default="idm")
+    command.add_argument("--folder", default="F:/Anime")
+    command.add_argument("--no-post", action="store_true", help="skip verifying and tagging episodes")
+    command.set_defaults(run=anime)
+
+    commands.add_parser("tv", add_help=False, help="play, check or relay live TV channels")
+
+    command = commands.add_parser("wiki", help="extract a table from players' Wikipedia pages")
+    command.add_argument("players", type=_players, help="Player_Name, a comma-separated list or @file")
+    command.add_argument("table", help="table index or caption/header text")
+    command.add_argument("output", nargs="?", type=_table_output, help="output .csv or .xlsx (default: print)")
+    command.set_defaults(run=wiki)
+    return parser
+
+
+# Commands that keep their own argument handling: everything after the command name goes to them as is
+PASSTHROUGH = {"scrape": scrape, "tv": tv}
+
+# Options for every command -> the environment variable instrument.instrumented reads them from, which
+# also carries them into the scripts' worker processes
+GLOBAL_OPTIONS = {"--report": "SCRIPTS_REPORT", "--profile": "SCRIPTS_PROFILE", "--metrics-port": "SCRIPTS_METRICS_PORT"}
+
+
+def _global_options(argv, parser):
+    """
+    Move the options in front of the command into the environment; returns the remaining arguments.
+    """
+    argv = list(argv)
+    while argv and argv[0].partition("=")[0] in GLOBAL_OPTIONS:
+        option, _, value = argv.pop(0).partition("=")
+        if not value:
+            if not argv:
+                parser.error(f"{option} needs a value")
+            value = argv.pop(0)
+        if option == "--profile" and value not in ("cprofile", "pyinstrument"):
+            parser.error("--profile must be cprofile or pyinstrument")
+        if option == "--metrics-port" and not value.isdigit():
+            parser.error(f"--metrics-port must be a port number, not {value!r}")
+        os.environ[GLOBAL_OPTIONS[option]] = value
+    return argv
+
+
+def main(argv=None):
+    parser = build_parser()
+    argv = _global_options(sys.argv[1:] if argv is None else argv, parser)
+    if argv and argv[0] in PASSTHROUGH:
+        return PASSTHROUGH[argv[0]](argv[1:])
+    args = parser.parse_args(argv)
+    return args.run(args)
@@ -0,0 +1,48 @@
+"""
+Shared fixtures: the fake servers under benchmarks/ stand in for the sites the scripts talk to.
+"""
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+def _serve(start_server, **options):
+    server, base_url = start_server(**options)
+    try:
+        yield base_url
+    finally:
+        server.shutdown()
+
+
+@pytest.fixture
+def gogo_site():
+    """
+    Base URL of the GOGOAnime fixture site: 12 episodes, every 5th download page needs JavaScript.
+    """
+    import gogo_server
+    yield from _serve(gogo_server.start_server, episodes=12, js_every=5)
+    gogo_server.GogoHandler.moved = False
+
+
+@pytest.fixture
+def media_site():
+    import media_server
+    yield from _serve(media_server.start_server)
+
+
+@pytest.fixture
+def hls_site():
+    import hls_server
+    yield from _serve(hls_server.start_server)
+
+
+@pytest.fixture
+def wiki_site():
+    import wiki_server
+    yield from _serve(wiki_server.start_server)
+    wiki_server.WikiHandler.edited = False
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from media_server import media_bytes
+import download_manager
+from download_manager import DownloadQueue, run_downloads
+
+SIZE = 64 * 1024
+
+
+def broken_download(url, ydl_opts):   # module level, so worker processes can unpickle it
+    raise RuntimeError("connection reset")
+
+
+def item(url, outtmpl="%(title)s.%(ext)s"):
+    return {"url": url, "video_id": os.path.basename(url), "extractor": "generic", "outtmpl": outtmpl}
+
+
+@pytest.fixture
+def ydl_opts(tmp_path):
+    return {
+        "outtmpl": str(tmp_path / "%(title)s.%(ext)s"),
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+    }
+
+
+def test_interrupted_items_resume_as_pending(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    with DownloadQueue(path) as queue:
+        queue.add([item("http://a"), item("http://b")])
+        assert [url for url, _ in queue.claim(1)] == ["http://a"]
+        assert queue.counts() == {"running": 1, "pending": 1}
+
+    with DownloadQueue(path) as queue:   # the run died with "http://a" mid-download
+        assert queue.counts() == {"pending": 2}
+        assert [url for url, _ in queue.claim(2)] == ["http://a", "http://b"]
+
+
+def test_archived_items_are_queued_as_done(tmp_path):
+    with DownloadQueue(str(tmp_path / "queue.sqlite")) as queue:
+        assert queue.add([item("http://a"), item("http://b")], archive={"generic b"}) == 2
+        assert queue.counts() == {"pending": 1, "done": 1}
+
+
+def test_resumed_queue_downloads_from_the_server(media_site, ydl_opts, tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    url = f"{media_site}/media/file0.mp4?size={SIZE}"
+    with DownloadQueue(path) as queue:
+        queue.add([item(url, ydl_opts["outtmpl"])])
+        queue.claim(1)   # interrupted mid-download
+
+    counts = run_downloads([], ydl_opts, jobs=1, backoff=0.01, queue_path=path)
+
+    assert counts == {"done": 1}
+    assert (tmp_path / "file0.mp4").read_bytes() == media_bytes("/media/file0.mp4", SIZE)
+
+
+def test_failed_items_stop_at_the_lifetime_cap(monkeypatch, tmp_path):
+    monkeypatch.setattr(download_manager, "expand", lambda url, ydl_opts, cache=None: [item(url)])
+    path = str(tmp_path / "queue.sqlite")
+
+    for _ in range(4):   # two attempts per run: 2, 4, then 5 of 5 and nothing more
+        counts = run_downloads(["http://broken"], {}, jobs=1, max_attempts=2, backoff=0.01, queue_path=path,
+                               download_fn=broken_download, max_total_attempts=5)
+
+    assert counts == {"failed": 1}
+    with DownloadQueue(path) as queue:
+        assert queue.retry_failed(5) == 1
+        assert queue._conn.execute("SELECT total_attempts FROM items").fetchone() == (5,)
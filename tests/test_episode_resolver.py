@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+
+import anime   # noqa: E402
+import gogo_http   # noqa: E402
+
+
+def resolve_all(base_url, spec, monkeypatch):
+    """
+    Resolve every episode of `spec` with two pipeline workers; browser batches are recorded, not run.
+
+    Returns:
+        tuple: ({episode: link}, [browser batch specs])
+    """
+    batches = []
+
+    async def browser_batch(self, spec):
+        batches.append(spec)
+        return {int(ep): f"browser-{ep}" for ep in spec.split(",")}
+
+    monkeypatch.setattr(anime.EpisodeResolver, "_batch", browser_batch)
+
+    async def run():
+        resolver = anime.EpisodeResolver("Fixture Show", True, None)
+        resolver.http = gogo_http.HttpResolver(base_url, ajax_url=base_url + "ajax/load-list-episode", workers=4)
+        episodes, links = await resolver.episodes(spec), {}
+
+        async def worker():
+            while episodes:
+                ep = episodes.pop(0)
+                links[ep] = await resolver(ep)
+
+        await asyncio.gather(worker(), worker())
+        return links
+
+    return asyncio.run(run()), batches
+
+
+def test_only_javascript_episodes_reach_the_browser(gogo_site, monkeypatch):
+    links, batches = resolve_all(gogo_site, "1-14", monkeypatch)
+
+    assert {ep: links[ep] for ep in (5, 10)} == {5: "browser-5", 10: "browser-10"}
+    assert links[1] == "https://cdn.example/fixture-show-ep1-1080p.mp4"
+    assert links[13] is None and links[14] is None
+    assert sorted(int(ep) for spec in batches for ep in spec.split(",")) == [5, 10]
+
+
+def test_everything_goes_to_the_browser_when_http_fails(gogo_site, monkeypatch):
+    def needs_browser(self, anime, spec):
+        raise gogo_http.NeedsBrowser("search results are rendered by JavaScript")
+
+    monkeypatch.setattr(gogo_http.HttpResolver, "resolve_batch", needs_browser)
+    links, batches = resolve_all(gogo_site, "1-8", monkeypatch)
+
+    assert links == {ep: f"browser-{ep}" for ep in range(1, 9)}
+    assert len(batches) < 8   # batched, not one browser run per episode
@@ -0,0 +1,85 @@
+import pytest
+
+from anime_index import AnimeIndex
+from gogo_server import GogoHandler
+import gogo_http
+
+
+def expected(ep):
+    return f"https://cdn.example/fixture-show-ep{ep}-1080p.mp4"
+
+
+def resolver(base_url, index=None):
+    return gogo_http.HttpResolver(base_url, ajax_url=base_url + "ajax/load-list-episode", workers=4, index=index)
+
+
+@pytest.fixture
+def index(tmp_path):
+    with AnimeIndex(str(tmp_path / "index.sqlite")) as index:
+        yield index
+
+
+def test_resolve_batch_hands_javascript_pages_to_the_browser(gogo_site):
+    links, browser, timings = resolver(gogo_site).resolve_batch("Fixture Show", "1-12")
+
+    assert links == {ep: expected(ep) for ep in range(1, 13) if ep % 5}
+    assert browser == [5, 10]
+    assert set(timings["episodes"]) == set(links)
+
+
+def test_resolve_batch_skips_episodes_past_the_end(gogo_site):
+    links, browser, _ = resolver(gogo_site).resolve_batch("Fixture Show", "11-14")
+
+    assert links == {11: expected(11), 12: expected(12)}
+    assert browser == []
+
+
+def test_moved_pages_rebuild_the_index(gogo_site, index):
+    resolver(gogo_site, index).resolve_batch("Fixture Show", "1-4")
+    GogoHandler.moved = True
+    for ep in (3, 4):
+        index.drop_link("Fixture Show", ep)
+
+    links, browser, _ = resolver(gogo_site, index).resolve_batch("Fixture Show", "1-4")
+
+    assert links == {ep: expected(ep) for ep in range(1, 5)}
+    assert browser == []
+    assert index.episodes("fixture show")[0].endswith("fixture-show-v2-episode-1")
+    assert index.link("Fixture Show", 1) == expected(1)   # still cached after the invalidation
+
+
+class StaleResolver(gogo_http.HttpResolver):
+    """
+    An index pointing at 5 episodes of a show that now has 3, whose episode pages keep failing.
+    """
+
+    def _show(self, anime, episodes):
+        self._local.from_index, self._local.show_timings = True, {}
+        return ["indexed"] * 5
+
+    def open_show(self, anime, max_age=None, fresh=False):
+        self._local.from_index, self._local.show_timings = False, {}
+        return ["walked"] * 3
+
+    def episode_link(self, episode_url):
+        raise gogo_http.StaleEpisode("no download button")
+
+
+class NoLinks:
+    def __init__(self):
+        self.invalidated = 0
+
+    def link(self, anime, episode_no):
+        return None
+
+    def invalidate(self, anime):
+        self.invalidated += 1
+
+
+def test_stale_retry_hands_second_failures_to_the_browser():
+    index = NoLinks()
+    links, browser, _ = StaleResolver(index=index).resolve_batch("Fixture Show", "1-5")
+
+    assert links == {}
+    assert browser == [1, 2, 3]   # 4 and 5 are gone from the walked list
+    assert index.invalidated == 1
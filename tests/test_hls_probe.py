@@ -0,0 +1,57 @@
+import requests
+
+import hls_probe
+import hls_server
+
+
+def test_parse_master_orders_variants_by_bandwidth():
+    variants = hls_probe.parse_master(hls_server.master_playlist(), "http://origin/news/master.m3u8")
+
+    assert [v["bandwidth"] for v in variants] == sorted((b for _, b in hls_server.VARIANTS), reverse=True)
+    assert variants[0] == {"url": "http://origin/news/1080p/index.m3u8", "bandwidth": 5_000_000,
+                           "resolution": "1920x1080", "codecs": "avc1.4d401f,mp4a.40.2"}
+
+
+def test_parse_master_prefers_average_bandwidth():
+    text = ('#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=900000,AVERAGE-BANDWIDTH=600000\nlow.m3u8\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=800000\nmid.m3u8\n')
+
+    assert [v["url"] for v in hls_probe.parse_master(text, "http://origin/")] == [
+        "http://origin/mid.m3u8", "http://origin/low.m3u8"]
+
+
+def test_media_playlist_as_master_is_one_variant():
+    text = hls_server.media_playlist(100)
+
+    assert hls_probe.parse_master(text, "http://origin/a/index.m3u8") == [
+        {"url": "http://origin/a/index.m3u8", "bandwidth": 0, "resolution": None, "codecs": None}]
+
+
+def test_parse_media_live_window():
+    text = hls_server.media_playlist(100)
+    segments, live = hls_probe.parse_media(text, "http://origin/news/720p/index.m3u8")
+
+    assert live
+    assert segments[0] == ("http://origin/news/720p/95.ts", 1.0)
+    assert len(segments) == hls_server.WINDOW
+    assert hls_probe.playlist_tag(text, "EXT-X-MEDIA-SEQUENCE") == 95
+    assert not hls_probe.parse_media(text + "#EXT-X-ENDLIST\n", "http://origin/")[1]
+
+
+def test_probe_stream_against_the_origin(hls_site):
+    result = hls_probe.probe_stream(f"{hls_site}/news/master.m3u8")
+
+    assert result["ok"]
+    assert [v["ok"] for v in result["variants"]] == [True] * len(hls_server.VARIANTS)
+    assert hls_probe.pick_variant(result)["ok"]
+
+
+def test_probe_stream_reports_broken_channels(hls_site):
+    dead = hls_probe.probe_stream(f"{hls_site}/dead/master.m3u8")
+    flaky = hls_probe.probe_stream(f"{hls_site}/flaky/master.m3u8")
+
+    assert not dead["ok"] and dead["error"]
+    assert flaky["ok"]
+    assert [v["ok"] for v in flaky["variants"]] == [False, True, True, True]
+    assert hls_probe.pick_variant(flaky)["resolution"] != "1920x1080"
+    assert requests.get(f"{hls_site}/flaky/1080p/index.m3u8", timeout=5).status_code == 404
@@ -0,0 +1,62 @@
+from bs4 import BeautifulSoup
+import pytest
+
+from wiki_server import FIXTURES, WikiHandler
+import player_wiki
+
+TABLE = "national cup"
+
+
+def fixture(title):
+    return (FIXTURES / f"{title}.html").read_text(encoding="utf-8")
+
+
+def test_player_table_merges_header_rows():
+    frame = player_wiki.player_table("Player_Two", fixture("Player_Two"), TABLE)
+
+    assert list(frame.columns) == ["player", "Club", "Season", "League Division", "League Apps", "League Goals",
+                                   "National cup Apps", "National cup Goals", "Total Apps", "Total Goals"]
+    assert frame.iloc[0].tolist() == ["Player Two", "Sample City", "2016–17", "Championship", 8, 0, 1, 0, 9, 0]
+
+
+def test_player_table_numbers_and_blanks():
+    frame = player_wiki.player_table("Player_One", fixture("Player_One"), TABLE)
+
+    assert frame["League Apps"].dtype.kind == "i"
+    assert frame.loc[2, "National cup Apps"] != frame.loc[2, "National cup Apps"]   # "—" is NaN
+
+
+def test_select_table_by_header_text_skips_other_tables():
+    html = fixture("Player_Three")
+    table = player_wiki.select_table(html, TABLE)
+
+    assert table is not player_wiki.select_table(html, 0)
+    with pytest.raises(LookupError):
+        player_wiki.select_table(html, "transfer fees")
+    with pytest.raises(LookupError):
+        player_wiki.select_table(html, 99)
+
+
+def test_table_frame_repeats_spanned_cells():
+    table = BeautifulSoup(
+        "<table><tr><th rowspan=2>Club</th><th colspan=2>League</th></tr><tr><th>Apps</th><th>Goals</th></tr>"
+        "<tr><td rowspan=2>A</td><td>1</td><td>2</td></tr><tr><td>3</td><td>4</td></tr></table>",
+        "html.parser").table
+    frame = player_wiki.table_frame(table)
+
+    assert list(frame.columns) == ["Club", "League Apps", "League Goals"]
+    assert frame.values.tolist() == [["A", 1, 2], ["A", 3, 4]]
+
+
+def test_player_tables_from_the_server(wiki_site, tmp_path):
+    fetcher = player_wiki.WikiFetcher(wiki_site, cache=player_wiki.PageCache(str(tmp_path)), workers=4)
+    players = ["Player_One", "Player_Two", "Player_Three", "Nobody_Here"]
+
+    data, errors = player_wiki.player_tables(players, TABLE, fetcher)
+    WikiHandler.not_modified = 0
+    again, _ = player_wiki.player_tables(players[:3], TABLE, fetcher)
+
+    assert set(data["player"]) == {"Player One", "Player Two", "Player Three"}
+    assert list(errors) == ["Nobody_Here"]
+    assert again.equals(data)
+    assert WikiHandler.not_modified == 3   # revalidated, not downloaded again
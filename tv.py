@@ -1,6 +1,13 @@
+import logging
 import shutil
 import subprocess
 import sys
+import time
+
+from extract_cache import ExtractCache
+from instrument import METRICS, instrumented
+import hls_probe
+import hls_relay
 
 CHANNELS = {
     "alarabiya": (
@@ -17,28 +24,171 @@ CHANNELS = {
     ),
 }
 
-if len(sys.argv) != 2:
-    print(f"Usage: {sys.argv[0]} <channel>")
-    print("Channels:", ", ".join(sorted(CHANNELS)))
-    sys.exit(1)
-
-try:
-    stream_type, url = CHANNELS[sys.argv[1].lower()]
-except KeyError:
-    print("Unknown channel.")
-    sys.exit(1)
-
-if stream_type == "yt":
-    url = subprocess.check_output(
-        ["yt-dlp", "-g", url],
-        text=True
-    ).splitlines()[0]
-
-vlc = shutil.which("vlc") or r"C:\Program Files\VideoLAN\VLC\vlc.exe"
-
-subprocess.Popen([
-    vlc,
-    "--fullscreen",
-    "--network-caching=1000",
-    url,
-])
\ No newline at end of file
+
+@METRICS.timed("tv.resolve")
+def resolve(stream_type, url, cache):
+    """
+    Playlist URL for a channel. "yt" entries are resolved to their HLS master manifest with yt-dlp;
+    resolved live manifest URLs stay valid until their signed expiry, so they are reused until then.
+
+    Raises:
+        ValueError: The live stream is unavailable (ended, offline or private).
+    """
+    if stream_type != "yt":
+        return url
+
+    def extract(page_url):
+        try:
+            output = subprocess.check_output(["yt-dlp", "--no-warnings", "-O", "%(manifest_url,url)s", page_url],
+                                             text=True, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            lines = (e.stderr or "").strip().splitlines()
+            raise ValueError(f"live stream unavailable: {lines[-1] if lines else f'yt-dlp exited with {e.returncode}'}")
+        return {"url": output.splitlines()[0]}
+
+    return cache.get_or_extract(url, "stream", extract)["url"]
+
+
+def check(channels, cache):
+    """
+    Probe every channel at once and print how each of its variants is doing.
+
+    Returns:
+        list: Names of the dead channels.
+    """
+    urls, dead = {}, []
+    for name, (stream_type, url) in channels.items():
+        try:
+            urls[name] = resolve(stream_type, url, cache)
+        except ValueError as e:
+            print(f"❌ {name}\n  ❌ {e}")
+            dead.append(name)
+    results = hls_probe.probe_many(urls.values())
+    for name, url in sorted(urls.items()):
+        result = results[url]
+        print(f"{'✅' if result['ok'] else '❌'} {name}")
+        print(hls_probe.describe(result))
+        if not result["ok"]:
+            dead.append(name)
+    return dead
+
+
+def relay_source(cache):
+    """
+    Upstream playlist for each channel the relay is asked for: the variant that probes best from
+    here, so the one upstream copy is also the one every local client would have picked.
+    """
+    def source(name):
+        stream_type, url = CHANNELS[name.lower()]
+        url = resolve(stream_type, url, cache)
+        result = hls_probe.probe_stream(url)
+        variant = hls_probe.pick_variant(result)
+        if variant is None:
+            raise ValueError(f"{name} is down: {result['error']}")
+        logging.info(f"📡 {name}: relaying {variant['resolution'] or 'the stream'} "
+                     f"at {variant['bandwidth'] / 1e6:.2f} Mb/s")
+        return variant["url"]
+
+    return source
+
+
+def play(url, caching=1000):
+    vlc = shutil.which("vlc") or r"C:\Program Files\VideoLAN\VLC\vlc.exe"
+
+    subprocess.Popen([
+        vlc,
+        "--fullscreen",
+        f"--network-caching={caching}",
+        url,
+    ])
+
+
+def main(argv=None, prog="tv.py"):
+    """
+    Command-line entry point; returns the exit status.
+
+        python tv.py <channel> [--no-probe] [--via=http://host:port] [--timeshift]  |  python tv.py --check
+        python tv.py --relay [--host=127.0.0.1] [--port=8766] [--record=DIR] [--record-limit=N] [--metrics-port=N]
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    args = [arg for arg in argv if not arg.startswith("--")]
+    flags = dict((arg[2:].split("=", 1) + [""])[:2] for arg in argv if arg.startswith("--"))
+    with instrumented("tv", metrics_port=flags.get("metrics-port") or None):
+        return _run(args, flags, prog)
+
+
+def _run(args, flags, prog):
+    """
+    What `main` does once the arguments are split into positionals and --flags.
+    """
+    if "check" in flags:
+        with ExtractCache() as cache:
+            dead = check(CHANNELS, cache)
+        return 1 if dead else 0
+
+    if "relay" in flags:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+        host, port = flags.get("host") or hls_relay.HOST, int(flags.get("port") or hls_relay.PORT)
+        with ExtractCache() as cache:
+            relay = hls_relay.Relay(relay_source(cache), record_dir=flags.get("record") or None,
+                                    record_limit=int(flags["record-limit"]) if flags.get("record-limit") else None)
+            server = hls_relay.serve(relay, host, port)
+            print(f"Relaying on http://{host}:{port}/<channel>/live.m3u8 (status at /status), Ctrl+C to stop")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.shutdown()
+                relay.stop()
+        return 0
+
+    if len(args) != 1:
+        print(f"Usage: {prog} <channel> [--no-probe] [--via=http://host:port] [--timeshift] | --check")
+        print(f"       {prog} --relay [--host=HOST] [--port=PORT] [--record=DIR] [--record-limit=N] [--metrics-port=N]")
+        print("Channels:", ", ".join(sorted(CHANNELS)))
+        return 1
+
+    try:
+        stream_type, url = CHANNELS[args[0].lower()]
+    except KeyError:
+        print("Unknown channel.")
+        return 1
+
+    if flags.get("via"):
+        # The relay already picked the variant and keeps segments local, so a short cache is enough
+        playlist = "timeshift.m3u8" if "timeshift" in flags else "live.m3u8"
+        play(f"{flags['via'].rstrip('/')}/{args[0].lower()}/{playlist}", caching=300)
+        return 0
+
+    start = time.perf_counter()
+    with ExtractCache() as cache:
+        try:
+            url = resolve(stream_type, url, cache)
+        except ValueError as e:
+            print(f"Channel is down: {e}")
+            return 1
+
+    if "no-probe" in flags:
+        play(url)
+        return 0
+
+    # Probe before VLC opens: a dead stream is reported here, and VLC gets the variant that fits the
+    # bandwidth we just measured, instead of the master playlist and a slow adaptive ramp-up
+    result = hls_probe.probe_stream(url)
+    print(hls_probe.describe(result))
+    variant = hls_probe.pick_variant(result)
+    if variant is None:
+        print(f"Channel is down: {result['error']}")
+        return 1
+
+    caching = hls_probe.network_caching(variant)
+    print(f"Playing {variant['resolution'] or 'the stream'} at {variant['bandwidth'] / 1e6:.2f} Mb/s, "
+          f"network caching {caching} ms (resolved and probed in {time.perf_counter() - start:.2f}s)")
+    play(variant["url"], caching)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+from sys import argv
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Columns of channel sheets exported before the typed layout (catalog_export.COLUMNS); still read by import_excel
+SHEET_COLUMNS = ["Title", "URL", "Upload Date", "Duration"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id    TEXT PRIMARY KEY,   -- YouTube video id; dedupe is a lookup on this index
+    channel     TEXT NOT NULL,      -- sheet name the video is exported to
+    title       TEXT,
+    upload_date TEXT,               -- YYYY-MM-DD
+    duration    INTEGER,            -- seconds
+    added_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS videos_by_channel ON videos (channel);
+
+CREATE TABLE IF NOT EXISTS channels (
+    channel       TEXT PRIMARY KEY,
+    last_video_id TEXT,             -- newest video seen on the last poll (high-water mark)
+    last_polled   REAL,             -- UNIX time of the last poll
+    needs_export  INTEGER NOT NULL DEFAULT 0   -- has videos the exported file doesn't have yet
+);
+"""
+
+
+def video_id_from_url(url):
+    """
+    Extract the video id from a watch URL (None if the URL doesn't carry one).
+    """
+    match = re.search(r"[?&]v=([\w-]+)", str(url))
+    return match.group(1) if match else None
+
+
+def format_duration(seconds):
+    """
+    Format seconds the way the channel sheets always have, e.g. 754 -> '12m 34s'.
+    """
+    if seconds is None:
+        return None
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds}s"
+
+
+def parse_duration(text):
+    """
+    Inverse of `format_duration`. Returns None for blank or unparseable cells.
+    """
+    match = re.fullmatch(r"\s*(\d+)m\s*(\d+)s\s*", str(text))
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else None
+
+
+class VideoStore:
+    """
+    SQLite-backed video catalog keyed by video id; the system of record behind all_channels.xlsx.
+
+    The connection is shared between threads behind a lock, so channel workers can check for known
+    videos concurrently.
+
+    Args:
+        path (str): SQLite database path, created on first use.
+    """
+
+    def __init__(self, path="videos.sqlite"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(channels)")}
+            if "needs_export" not in columns:   # stores created before the flag
+                self._conn.execute("ALTER TABLE channels ADD COLUMN needs_export INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def known_ids(self, video_ids):
+        """
+        Return the subset of `video_ids` that are already stored.
+        """
+        video_ids = list(video_ids)
+        known = set()
+        with self._lock:
+            for start in range(0, len(video_ids), 500):   # stay under SQLite's bound-parameter limit
+                chunk = video_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT video_id FROM videos WHERE video_id IN ({placeholders})", chunk)
+                known.update(row[0] for row in rows)
+        return known
+
+    def add(self, channel, videos):
+        """
+        Insert videos for a channel, ignoring ids that are already stored.
+
+        The channel is flagged as needing an export in the same transaction, so videos stored by a run
+        whose export then fails are still exported by the next one.
+
+        Args:
+            channel (str): Channel (sheet) name.
+            videos (list): Dicts with `video_id`, `title`, `upload_date` (YYYY-MM-DD) and `duration` (seconds).
+
+        Returns:
+            int: Number of videos actually inserted.
+        """
+        now = time.time()
+        rows = [(v["video_id"], channel, v.get("title"), v.get("upload_date"), v.get("duration"), now) for v in videos]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO videos (video_id, channel, title, upload_date, duration, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            inserted = self._conn.total_changes - before
+            if inserted:
+                self._conn.execute(
+                    "INSERT INTO channels (channel, needs_export) VALUES (?, 1) "
+                    "ON CONFLICT (channel) DO UPDATE SET needs_export = 1", (channel,))
+            return inserted
+
+    def high_water_mark(self, channel):
+        """
+        Newest video id seen when the channel was last polled, or None if it never was.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT last_video_id FROM channels WHERE channel = ?", (channel,)).fetchone()
+        return row[0] if row else None
+
+    def mark_polled(self, channel, last_video_id=None, polled_at=None):
+        """
+        Record a poll of the channel, moving its high-water mark to `last_video_id` if given.
+        """
+        polled_at = time.time() if polled_at is None else polled_at
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO channels (channel, last_video_id, last_polled) VALUES (?, ?, ?) "
+                "ON CONFLICT (channel) DO UPDATE SET "
+                "last_video_id = COALESCE(excluded.last_video_id, last_video_id), last_polled = excluded.last_polled",
+                (channel, last_video_id, polled_at))
+
+    def pending_exports(self):
+        """
+        Channels with videos that haven't been exported yet, in the order they were first added.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT channel FROM channels WHERE needs_export "
+                "ORDER BY (SELECT MIN(rowid) FROM videos WHERE videos.channel = channels.channel)")
+            return [row[0] for row in rows]
+
+    def mark_exported(self, channels):
+        """
+        Clear the export flag of `channels` once the file holding their videos has been written.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE channels SET needs_export = 0 WHERE channel = ?",
+                                   [(channel,) for channel in channels])
+
+    def last_polled(self):
+        """
+        Channel name -> UNIX time of its last poll, for every channel polled so far.
+        """
+        with self._lock:
+            return dict(self._conn.execute("SELECT channel, last_polled FROM channels WHERE last_polled IS NOT NULL"))
+
+    def recent_upload_dates(self, channel, limit=10):
+        """
+        Upload dates (YYYY-MM-DD) of a channel's `limit` most recent videos.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_date FROM videos WHERE channel = ? AND upload_date IS NOT NULL "
+                "ORDER BY upload_date DESC LIMIT ?", (channel, limit))
+            return [row[0] for row in rows]
+
+    def count(self, channel=None):
+        with self._lock:
+            if channel is None:
+                return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM videos WHERE channel = ?", (channel,)).fetchone()[0]
+
+    def channels(self):
+        """
+        Channel names in the order they were first added.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT channel FROM videos GROUP BY channel ORDER BY MIN(rowid)")
+            return [row[0] for row in rows]
+
+    def iter_videos(self, channel, chunk_size=5000):
+        """
+        Yield a channel's videos in the order they were added, as lists of at most `chunk_size`
+        (title, video_id, upload_date, duration) tuples.
+
+        Each chunk is its own keyset query on rowid, so the lock isn't held while the caller works
+        on a chunk and memory never holds more than one.
+        """
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, title, video_id, upload_date, duration FROM videos "
+                    "WHERE channel = ? AND rowid > ? ORDER BY rowid LIMIT ?", (channel, last, chunk_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [row[1:] for row in rows]
+
+    def sheet(self, channel):
+        """
+        A channel's videos as a DataFrame in the typed export layout, in the order they were added.
+        """
+        import pandas as pd   # only the workbook side needs pandas; polling the store doesn't load it
+        from catalog_export import COLUMNS, typed_row
+
+        rows = [typed_row(*row) for chunk in self.iter_videos(channel) for row in chunk]
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+    def export(self, path, channels=None):
+        """
+        Export the catalog to an .xlsx, .csv or .parquet file, streaming rows in chunks (see catalog_export).
+
+        Args:
+            path (str): Output path; the extension picks the format.
+            channels (list): Workbook sheets to regenerate; all channels if None. Other sheets are left
+                untouched. CSV and Parquet are always written whole.
+        """
+        from catalog_export import export
+
+        export(self, path, channels)
+
+    def import_excel(self, output_excel):
+        """
+        One-time import of an existing workbook (one sheet per channel) into the store.
+
+        Returns:
+            int: Number of videos imported.
+        """
+        import pandas as pd
+
+        imported = 0
+        for channel, df in pd.read_excel(output_excel, sheet_name=None).items():
+            videos = []
+            for row in df.to_dict("records"):
+                video_id = video_id_from_url(row.get("URL"))
+                if video_id is None:
+                    continue
+                upload_date = row.get("Upload Date")
+                if "Duration (s)" in row:   # typed export
+                    duration = None if pd.isna(row["Duration (s)"]) else int(row["Duration (s)"])
+                else:
+                    duration = parse_duration(row.get("Duration"))
+                videos.append({
+                    "video_id": video_id,
+                    "title": None if pd.isna(row.get("Title")) else row.get("Title"),
+                    "upload_date": None if pd.isna(upload_date) else str(upload_date)[:10],
+                    "duration": duration,
+                })
+            imported += self.add(channel, videos)
+        return imported
+
+
+if __name__ == "__main__":
+    if len(argv) < 2 or argv[1] not in ("import", "export"):
+        print(f"Usage: {argv[0]} import|export [workbook | export.csv | export.parquet] [database]")
+        exit(1)
+
+    output_excel = argv[2] if len(argv) > 2 else "all_channels.xlsx"
+    with VideoStore(argv[3] if len(argv) > 3 else "videos.sqlite") as store:
+        if argv[1] == "import":
+            if not os.path.exists(output_excel):
+                print(f"{output_excel} not found.")
+                exit(1)
+            print(f"Imported {store.import_excel(output_excel)} videos from {output_excel}.")
+        else:
+            store.export(output_excel)
+            print(f"Exported {store.count()} videos to {output_excel}.")
@@ -1,19 +1,45 @@
-from yt_dlp import YoutubeDL
 from sys import argv
 
-if len(argv) < 2:
-    print("Please provide a URL as command line argument")
-    exit(1)   # exit(1) ensures that the program stops and doesn't try to continue and crash with an error
+from download_manager import run_downloads
+from extract_cache import ExtractCache
+from instrument import instrumented
+import postprocess
+from segmented import ydl_segment_opts
 
+# Connections per file: parallel HLS/DASH fragments, or range requests for single-file formats
+CONNECTIONS = 8
 
-link = argv[1]
+# This script's own download queue: queued items are resumed with its ydl_opts, not the playlist downloader's
+QUEUE = "yt_downloader_queue.sqlite"
 
 # ydl_opts is a dictionary that contains configuration options for the YoutubeDL instance
 ydl_opts = {
     'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
     'outtmpl': 'F:/YouTube/%(title)s.%(ext)s',        # output template
     'merge_output_format': 'mp4',                     # merge the best video and audio into a single mp4 file               
+    **ydl_segment_opts(CONNECTIONS),                  # concurrent fragments; aria2c for single files if installed
 }
 
-with YoutubeDL(ydl_opts) as ydl:
-    ydl.download(link)
\ No newline at end of file
+
+def download(links, jobs=None, rate_limit=None, post=True):
+    """
+    Download `links` in parallel (up to 4 at once unless `jobs` says otherwise). With `post` and ffmpeg
+    installed, finished files are merged, verified and checksummed while the others download.
+    """
+    with instrumented("yt_downloader"), ExtractCache() as cache, postprocess.optional(post) as post_pool:
+        run_downloads(links, ydl_opts, jobs=jobs or min(4, len(links)), rate_limit=rate_limit, cache=cache,
+                      queue_path=QUEUE, connections=CONNECTIONS, postprocessor=post_pool)
+        if post_pool:
+            print(post_pool.report())
+
+
+# The guard matters: download workers are separate processes that re-import this module on Windows
+if __name__ == "__main__":
+    if len(argv) < 2:
+        print("Please provide a URL as command line argument")
+        exit(1)   # exit(1) ensures that the program stops and doesn't try to continue and crash with an error
+
+    # Several URLs can be given; they download in parallel
+    links = argv[1:]
+
+    download(links)
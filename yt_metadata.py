@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import threading
+import time
+
+# Fields every saved video needs; anything missing from the flat listing triggers a full lookup
+REQUIRED_FIELDS = ("title", "upload_date", "duration")
+
+# Flat listings only carry relative dates ("5 hours ago", "3 days ago"), which yt-dlp turns into timestamps
+# rounded down to the unit of the text. Only hour- or minute-level ones pin down the day; from "1 day ago"
+# on the date can be a day off, so those are looked up in full.
+APPROX_DATE_MAX_AGE = 24 * 3600
+
+# Ask the YouTube tab extractor to include the approximate timestamps in flat entries
+FLAT_EXTRACTOR_ARGS = {"youtubetab": {"approximate_date": [""]}}
+
+
+def video_url(entry):
+    """
+    Canonical watch URL for a flat playlist entry.
+    """
+    return f"https://www.youtube.com/watch?v={entry['id']}"
+
+
+def approximate_upload_date(timestamp, now):
+    """
+    The upload date (YYYYMMDD, UTC) an approximate listing timestamp implies, or None if it can't be trusted.
+
+    "3 hours ago" means the upload happened up to an hour before the timestamp, so the date only counts
+    when the whole hour (a minute, for "minutes ago") falls on one day.
+    """
+    age = now - timestamp
+    if age >= APPROX_DATE_MAX_AGE:
+        return None
+    unit = 3600 if age >= 3600 else 60
+    earliest, latest = (datetime.fromtimestamp(t, timezone.utc).strftime("%Y%m%d") for t in (timestamp - unit, timestamp))
+    return latest if earliest == latest else None
+
+
+def flat_fields(entry, now=None):
+    """
+    Pull whatever required fields a flat playlist entry already carries.
+
+    Args:
+        entry (dict): An entry from an `extract_flat` listing.
+        now (float): Current UNIX time, for checking how old an approximate date is.
+
+    Returns:
+        dict: The subset of REQUIRED_FIELDS that are present (value not None).
+    """
+    fields = {key: entry[key] for key in REQUIRED_FIELDS if entry.get(key) is not None}
+
+    if "upload_date" not in fields and entry.get("timestamp") is not None:
+        upload_date = approximate_upload_date(entry["timestamp"], time.time() if now is None else now)
+        if upload_date:
+            fields["upload_date"] = upload_date
+
+    return fields
+
+
+class MetadataResolver:
+    """
+    Resolves title, upload date and duration for videos, preferring data from the flat listing.
+
+    Only entries missing a required field are looked up with `fetch`, and those lookups run as one batch.
+    The `avoided` and `fetched` counters are shared by every batch resolved with the same instance.
+
+    Args:
+        fetch (callable): Takes a video URL and returns a full yt-dlp info dict.
+        max_workers (int): Maximum concurrent lookups per batch.
+    """
+
+    def __init__(self, fetch, max_workers=4):
+        self.fetch = fetch
+        self.max_workers = max_workers
+        self.avoided = 0   # lookups skipped because the flat entry was complete
+        self.fetched = 0   # lookups actually made
+        self._lock = threading.Lock()
+
+    def resolve(self, entries):
+        """
+        Resolve a batch of flat entries.
+
+        Args:
+            entries (list): Flat playlist entries (each needs at least an `id`).
+
+        Returns:
+            list: Info dicts with the required fields, in the same order as `entries`.
+        """
+        now = time.time()
+        infos = [flat_fields(entry, now) for entry in entries]
+        missing = [i for i, info in enumerate(infos) if len(info) < len(REQUIRED_FIELDS)]
+
+        with self._lock:
+            self.avoided += len(entries) - len(missing)
+            self.fetched += len(missing)
+
+        if missing:
+            urls = [video_url(entries[i]) for i in missing]
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as pool:
+                for i, info in zip(missing, pool.map(self.fetch, urls)):
+                    # Keep fields the listing already had if the full lookup left them out
+                    infos[i] = {**infos[i], **{k: v for k, v in info.items() if v is not None}}
+
+        return infos
+
+    def summary(self):
+        """
+        One-line description of the counters, for printing at the end of a run.
+        """
+        total = self.avoided + self.fetched
+        return f"Resolved {total} videos: {self.avoided} from listing data, {self.fetched} full lookups ({self.avoided} extract_info calls avoided)."
@@ -1,9 +1,253 @@
-import pandas as pd
 from datetime import datetime
-from yt_dlp import YoutubeDL
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import importlib.util
+import random
+import threading
+import time
 import os
 
-def fetch_channel_to_sheet(channel_url, channel_name, n_videos=10, output_excel="all_channels.xlsx"):
+from catalog_export import FORMATS
+from channel_registry import due_channels, load_registry
+from extract_cache import ExtractCache
+from instrument import METRICS, instrumented
+from scheduler import SCHEDULER
+from video_store import VideoStore
+from yt_metadata import FLAT_EXTRACTOR_ARGS, REQUIRED_FIELDS, MetadataResolver
+
+YDL_OPTS = {
+    "quiet": True,
+    "extract_flat": True,
+    "skip_download": True,
+    "no_warnings": True,   # hide warnings
+    "extractor_args": FLAT_EXTRACTOR_ARGS   # approximate upload dates in the channel listing
+}
+
+def _extract(url, ydl_factory, limit):
+    """
+    Run a single `extract_info` call, each attempt holding a slot of the global concurrency limit.
+
+    A fresh YoutubeDL instance is used per call because YoutubeDL objects are not thread-safe. The call
+    goes through the scheduler, so a throttled or failed lookup is retried after a jittered backoff.
+    """
+    def extract():
+        with limit, ydl_factory(YDL_OPTS) as ydl:   # the slot is held per attempt, not while backing off
+            return ydl.extract_info(url, download=False)
+
+    with METRICS.span("youtube.extract"):
+        return SCHEDULER.call(url, extract)
+
+
+def _video_fetcher(ydl_factory, limit, cache=None):
+    """
+    Build the resolver's lookup function: a full extract_info call, answered from the cache when possible.
+
+    Only the fields the sheet needs are kept, so cached video entries stay small.
+    """
+    def fetch(url):
+        info = _extract(url, ydl_factory, limit)
+        return {key: info.get(key) for key in ("id",) + REQUIRED_FIELDS}
+
+    if cache is None:
+        return fetch
+    return lambda url: cache.get_or_extract(url, "video", fetch, YDL_OPTS)
+
+
+def _iter_channel(channel_url, ydl_factory, limit):
+    """
+    Yield a channel's flat entries newest first, fetching listing pages only as they are consumed.
+
+    Each page fetch holds a slot of the global concurrency limit, the first one per attempt like `_extract`,
+    so no slot is held while the scheduler backs off or while the caller works on an entry. The caller
+    must close() the generator when it stops early, to close the YoutubeDL instance.
+    """
+    METRICS.count("youtube.listings")
+    with ydl_factory(YDL_OPTS) as ydl:
+        def first_page():
+            with limit:
+                # process=False leaves `entries` as yt-dlp's lazy page generator; only the first page is retried
+                return ydl.extract_info(channel_url, download=False, process=False)
+
+        entries = iter(SCHEDULER.call(channel_url, first_page).get("entries") or [])
+        while True:
+            with limit:   # advancing the generator past a page boundary fetches the next page
+                entry = next(entries, None)
+            if entry is None:
+                return
+            yield entry
+
+
+def _video_record(info, entry):
+    """
+    Turn a yt-dlp info dict into a record for the video store.
+    """
+    # Format upload date
+    upload_date = info.get("upload_date")
+    if upload_date:
+        upload_date = datetime.strptime(upload_date, "%Y%m%d").strftime("%Y-%m-%d")
+
+    # Duration is stored as whole seconds
+    duration = info.get("duration")
+    if duration is not None:
+        duration = int(duration)
+
+    return {
+        "video_id": entry["id"],
+        "title": info.get("title"),
+        "upload_date": upload_date,
+        "duration": duration
+    }
+
+
+@METRICS.timed("youtube.channel")
+def fetch_channel(channel_url, n_videos, store, ydl_factory=None, limit=None, per_channel_workers=4, resolver=None,
+                  high_water_mark=None, incremental=True, cache=None):
+    """
+    Fetch metadata for the last `n_videos` of a channel that are not already in the store.
+
+    Args:
+        channel_url (str): YouTube channel URL.
+        n_videos (int): Maximum number of new videos to fetch.
+        store (VideoStore): Video catalog used to skip known videos.
+        ydl_factory (callable): Builds a YoutubeDL-compatible object from an options dict; YoutubeDL if None.
+        limit (threading.Semaphore): Global limit on concurrent extract_info calls.
+        per_channel_workers (int): Maximum concurrent video lookups for this channel.
+        resolver (MetadataResolver): Shared resolver; a new one is made if omitted.
+        high_water_mark (str): Newest video id seen on the previous poll.
+        incremental (bool): Page the listing lazily and stop at the first known video,
+            instead of listing the whole channel and slicing.
+        cache (ExtractCache): Extraction cache for video lookups and full channel listings.
+
+    Returns:
+        tuple: (new video records newest first, id of the newest video in the listing or None).
+    """
+    if ydl_factory is None:
+        from yt_dlp import YoutubeDL as ydl_factory   # deferred: yt-dlp takes longer to import than most runs need to fail
+    limit = limit or threading.BoundedSemaphore(per_channel_workers)
+    resolver = resolver or MetadataResolver(_video_fetcher(ydl_factory, limit, cache))
+
+    if incremental:
+        new_entries, newest_id = [], None
+        entries = _iter_channel(channel_url, ydl_factory, limit)
+        try:
+            for video in entries:
+                newest_id = newest_id or video["id"]
+                if video["id"] == high_water_mark or store.known_ids([video["id"]]):
+                    break   # everything from here on was seen on an earlier run
+                new_entries.append(video)
+                if len(new_entries) >= n_videos:
+                    break
+        finally:
+            entries.close()
+    else:
+        # Fetch the whole listing, keep the last n_videos
+        if cache is None:
+            data = _extract(channel_url, ydl_factory, limit)
+        else:
+            data = cache.get_or_extract(channel_url, "channel", lambda url: _extract(url, ydl_factory, limit), YDL_OPTS)
+        last_videos = data["entries"][:n_videos]
+        newest_id = last_videos[0]["id"] if last_videos else None
+
+        # skip already saved videos (an index lookup on the video id)
+        known = store.known_ids(video["id"] for video in last_videos)
+        new_entries = [video for video in last_videos if video["id"] not in known]
+
+    if not new_entries:
+        return [], newest_id
+
+    # Only entries the flat listing can't fully describe are looked up, as one batch
+    infos = resolver.resolve(new_entries)
+    return [_video_record(info, entry) for info, entry in zip(infos, new_entries)], newest_id
+
+
+def fetch_channels_to_workbook(channels, output_excel="all_channels.xlsx", max_workers=8, per_channel_workers=4,
+                               ydl_factory=None, store_path="videos.sqlite", incremental=True,
+                               cache_path="extract_cache.sqlite", spread=0):
+    """
+    Fetch several channels concurrently, record new videos in the store and export the changed sheets.
+
+    Args:
+        channels (dict): Sheet name -> (channel URL, n_videos).
+        output_excel (str): Excel workbook path, generated from the store; a .csv or .parquet path exports
+            the whole catalog as one table instead.
+        max_workers (int): Global limit on concurrent extract_info calls across all channels.
+        per_channel_workers (int): Limit on concurrent video lookups within one channel.
+        ydl_factory (callable): Builds a YoutubeDL-compatible object from an options dict; YoutubeDL if None.
+        store_path (str): SQLite video store path.
+        incremental (bool): Stop paging each channel at its first known video (see `fetch_channel`).
+        cache_path (str): Extraction cache path, or None to always hit the network.
+        spread (float): Seconds over which channel fetches are staggered, instead of starting all at once.
+
+    Returns:
+        dict: Sheet name -> list of video records that were added (empty for channels that failed).
+    """
+    if ydl_factory is None:
+        from yt_dlp import YoutubeDL as ydl_factory
+    cache = ExtractCache(cache_path) if cache_path else None
+    with VideoStore(store_path) as store:
+        # First run against an existing workbook: seed the store from it
+        if store.count() == 0 and output_excel.lower().endswith(".xlsx") and os.path.exists(output_excel):
+            with METRICS.span("excel.import"):
+                print(f"Imported {store.import_excel(output_excel)} videos from {output_excel}.")
+
+        limit = threading.BoundedSemaphore(max_workers)
+        resolver = MetadataResolver(_video_fetcher(ydl_factory, limit, cache), per_channel_workers)
+
+        # Evenly spaced, jittered start times so a run doesn't open with a burst of requests
+        slot = spread / len(channels) if channels else 0
+        start = time.monotonic()
+        start_at = {name: start + i * slot + random.uniform(0, slot) for i, name in enumerate(channels)}
+
+        def work(channel_name):
+            channel_url, n_videos = channels[channel_name]
+            time.sleep(max(0, start_at[channel_name] - time.monotonic()))
+            try:
+                return fetch_channel(channel_url, n_videos, store, ydl_factory, limit, per_channel_workers, resolver,
+                                     store.high_water_mark(channel_name), incremental, cache)
+            except Exception as e:   # retries are used up; the other channels still get saved
+                return e
+
+        # Channel threads mostly wait on the semaphore, so one per channel (up to the limit) is enough
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(channels)))) as pool:
+            polled = dict(zip(channels, pool.map(work, channels)))
+
+        results = {}
+        for channel_name, outcome in polled.items():
+            if isinstance(outcome, Exception):
+                # Not marked as polled: the channel is due again on the next run
+                print(f"Failed to fetch sheet '{channel_name}': {outcome}")
+                results[channel_name] = []
+                continue
+            new_videos, newest_id = outcome
+            results[channel_name] = new_videos
+            if new_videos:
+                store.add(channel_name, new_videos)   # flags the channel for export until the export succeeds
+                print(f"Added {len(new_videos)} new videos to sheet '{channel_name}'. Total videos: {store.count(channel_name)}")
+            else:
+                print(f"No new videos to add to sheet '{channel_name}'.")
+            # Only move the high-water mark once the videos before it are safely stored
+            store.mark_polled(channel_name, newest_id)
+        print(resolver.summary())
+        if cache is not None:
+            print(cache.summary())
+            cache.close()
+
+        # The workbook is an export: only the sheets with unexported videos are regenerated (including ones
+        # left over from a run whose export failed), streamed from the store in one atomic write
+        changed = store.pending_exports()
+        if changed:
+            try:
+                with METRICS.span("excel.export"):
+                    store.export(output_excel, changed)
+            except OSError as e:   # e.g. the workbook is open in Excel; the videos are safe in the store
+                print(f"Failed to write {output_excel}: {e}. {len(changed)} sheets will be exported on the next run.")
+            else:
+                store.mark_exported(changed)
+
+    return results
+
+
+def fetch_channel_to_sheet(channel_url, channel_name, n_videos=10, output_excel="all_channels.xlsx", **options):
     """
     Fetch last `n_videos` from a YouTube channel and save/append them to a specific sheet in an Excel workbook.
 
@@ -12,180 +256,67 @@ def fetch_channel_to_sheet(channel_url, channel_name, n_videos=10, output_excel=
         channel_name (str): Sheet name in Excel to store this channel's videos.
         n_videos (int): Number of latest videos to fetch.
         output_excel (str): Excel workbook path.
+        **options: Passed on to `fetch_channels_to_workbook` (ydl_factory, store_path, cache_path, ...).
     """
-    ydl_opts = {
-        "quiet": True,
-        "extract_flat": True,
-        "skip_download": True,
-        "no_warnings": True   # hide warnings
-    }
+    fetch_channels_to_workbook({channel_name: (channel_url, n_videos)}, output_excel, **options)
 
-    # Load existing sheet if it exists
-    if os.path.exists(output_excel):
-        try:
-            df_existing = pd.read_excel(output_excel, sheet_name=channel_name)
-            existing_urls = set(df_existing["URL"].tolist())
-        except ValueError:  # Sheet doesn't exist yet
-            df_existing = pd.DataFrame(columns=["Title", "URL", "Upload Date", "Duration"])
-            existing_urls = set()
-    else:
-        df_existing = pd.DataFrame(columns=["Title", "URL", "Upload Date", "Duration"])
-        existing_urls = set()
 
-    with YoutubeDL(ydl_opts) as ydl:
-        # Fetch last n_videos
-        data = ydl.extract_info(channel_url, download=False)
-        last_videos = data["entries"][:n_videos]
+def main(args=None, prog=None):
+    """
+    Command-line entry point: refresh all registered channels, a subset, or only the ones that are due.
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="Record the latest videos of YouTube channels in all_channels.xlsx.")
+    parser.add_argument("channels", nargs="*", help="channel names to refresh (default: all)")
+    parser.add_argument("--config", default="channels.json", help="channel registry (JSON or TOML)")
+    parser.add_argument("--due", action="store_true", help="only refresh channels due for a poll, based on their posting cadence")
+    parser.add_argument("--spread", type=float, default=0, help="seconds to spread the channel fetches over")
+    parser.add_argument("--workers", type=int, default=8, help="maximum concurrent requests")
+    parser.add_argument("--full", action="store_true", help="list whole channels instead of stopping at the first known video")
+    parser.add_argument("--output", default="all_channels.xlsx", help="file to export to: .xlsx (one sheet per channel), .csv or .parquet")
+    parser.add_argument("--store", default="videos.sqlite", help="SQLite video store")
+    parser.add_argument("--list", action="store_true", help="list registered channels and exit")
+    args = parser.parse_args(args)
 
-        new_videos = []
-        for video in last_videos:
-            video_url = f"https://www.youtube.com/watch?v={video['id']}"
-            if video_url in existing_urls:
-                continue  # skip already saved videos
-
-            info = ydl.extract_info(video_url, download=False)
-
-            # Format upload date
-            upload_date = info.get("upload_date")
-            if upload_date:
-                upload_date = datetime.strptime(upload_date, "%Y%m%d").strftime("%Y-%m-%d")
-
-            # Format duration
-            duration = info.get("duration")
-            if duration is not None:
-                minutes, seconds = divmod(duration, 60)
-                duration = f"{minutes}m {seconds}s"
-
-            new_videos.append({
-                "Title": info.get("title"),
-                "URL": video_url,
-                "Upload Date": upload_date,
-                "Duration": duration
-            })
-
-    # Append new videos
-    if new_videos:
-        df_new = pd.DataFrame(new_videos)
-        df_final = pd.concat([df_existing, df_new], ignore_index=True)
-
-        # Save to Excel with multiple sheets
-        with pd.ExcelWriter(output_excel, mode='a' if os.path.exists(output_excel) else 'w', engine='openpyxl') as writer:
-            df_final.to_excel(writer, sheet_name=channel_name, index=False)
-
-        print(f"Added {len(new_videos)} new videos to sheet '{channel_name}'. Total videos: {len(df_final)}")
-    else:
-        print(f"No new videos to add to sheet '{channel_name}'.")
-
-
-# Example usage:
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@abubakrzoud/videos",
-    channel_name="Abu Bakr Zoud",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@belal.assaad/videos",
-    channel_name="Belal Assaad",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@Arabic101/videos",
-    channel_name="Arabic 101",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@KhalidMehmoodAbbasiOfficial/videos",
-    channel_name="Khalid Mehmood Abbasi",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@yaqeeninstituteofficial/videos",
-    channel_name="Yaqeen Institute",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@tarteelai/videos",
-    channel_name="Tarteel AI",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@Ali.Hammuda/videos",
-    channel_name="Ali Hammuda",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@mohamed_hoblos/videos",
-    channel_name="Mohamed Hoblos",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@TowardsEternity/videos",
-    channel_name="Towards Eternity",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@bayyinah/videos",
-    channel_name="Bayyinah Institute",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@thehomeinstitute/videos",
-    channel_name="The Home Institute",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@SafinaSociety/videos",
-    channel_name="Safina Society",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@ZabeelulIlm/videos",
-    channel_name="Zabeel Al Ilm",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@BloggingTheology/videos",
-    channel_name="Blogging Theology",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@IPwithFrancesca/videos",
-    channel_name="Francesca Bocca-Aldaqre",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
-
-fetch_channel_to_sheet(
-    channel_url="https://www.youtube.com/@BTghazwa/videos",
-    channel_name="Syed Zaid Zaman Hamid",
-    n_videos=5,
-    output_excel="all_channels.xlsx"
-)
+    if not args.output.lower().endswith(FORMATS):
+        parser.error(f"--output must end in one of: {', '.join(FORMATS)}")
+    # Checked before any network work: the export only runs once every channel has been polled
+    if args.output.lower().endswith(".parquet") and importlib.util.find_spec("pyarrow") is None:
+        parser.error("exporting to .parquet needs pyarrow: pip install pyarrow, or use .xlsx or .csv")
+
+    registry = load_registry(args.config)
+
+    unknown = [name for name in args.channels if name not in registry]
+    if unknown:
+        print("Unknown channel:", ", ".join(unknown))
+        print("Channels:", ", ".join(registry))
+        exit(1)
+
+    if args.list:
+        for name, settings in registry.items():
+            print(f"{name}: {settings['url']}")
+        return
+
+    names = args.channels or list(registry)
+    if args.due:
+        with VideoStore(args.store) as store:
+            due = set(due_channels(registry, store))
+        names = [name for name in names if name in due]
+        if not names:
+            print("No channels are due for a poll.")
+            return
+
+    with instrumented("scrape"):
+        fetch_channels_to_workbook(
+            {name: (registry[name]["url"], registry[name]["n_videos"]) for name in names},
+            output_excel=args.output,
+            max_workers=args.workers,
+            store_path=args.store,
+            incremental=not args.full,
+            spread=args.spread,
+        )
+    print(METRICS.report())
+    print(SCHEDULER.report())
+
+
+if __name__ == "__main__":
+    main()